@@ -0,0 +1,137 @@
+"""
+Throughput of a REST list endpoint on a blocking `Session` vs an `AsyncSession`.
+
+Each request first sleeps in the database (a SQLite user function) to stand in for
+network and query latency, and N requests are fired concurrently at the ASGI app.
+
+    python benchmarks/bench_async_db.py --requests 200 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from doc81.core.database import Base
+from doc81.core.models import Template
+
+
+def _sleep_ms(ms: float) -> int:
+    time.sleep(ms / 1000)
+    return 0
+
+
+def _register_sleep(engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, _):
+        if hasattr(dbapi_connection, "run_async"):
+            # aiosqlite: register on the driver connection, from its own thread
+            dbapi_connection.run_async(
+                lambda conn: conn.create_function("sleep_ms", 1, _sleep_ms)
+            )
+        else:
+            dbapi_connection.create_function("sleep_ms", 1, _sleep_ms)
+
+
+def _seed(path: Path) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all(
+            Template(id=uuid.uuid4(), name=f"Template {i}", content=f"# {i}")
+            for i in range(50)
+        )
+        db.commit()
+    engine.dispose()
+
+
+_list_stmt = select(Template).order_by(Template.created_at).limit(20)
+
+
+def sync_app(path: Path, latency_ms: float) -> FastAPI:
+    engine = create_engine(f"sqlite:///{path}", pool_size=20)
+    _register_sleep(engine)
+    SessionLocal = sessionmaker(bind=engine)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/templates")
+    async def list_templates(db: Session = Depends(get_db)):
+        db.execute(select(func.sleep_ms(latency_ms)))
+        return [t.name for t in db.scalars(_list_stmt)]
+
+    return app
+
+
+def async_app(path: Path, latency_ms: float) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=20)
+    _register_sleep(engine.sync_engine)
+    SessionLocal = async_sessionmaker(engine)
+
+    async def get_db():
+        async with SessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/templates")
+    async def list_templates(db: AsyncSession = Depends(get_db)):
+        await db.execute(select(func.sleep_ms(latency_ms)))
+        return [t.name for t in await db.scalars(_list_stmt)]
+
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Return requests per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def one():
+            async with semaphore:
+                response = await client.get("/templates")
+                response.raise_for_status()
+
+        await one()  # warm up the pool
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        _seed(path)
+        for label, factory in (("sync Session", sync_app), ("AsyncSession", async_app)):
+            rps = asyncio.run(
+                run(factory(path, args.latency_ms), args.requests, args.concurrency)
+            )
+            print(f"{label:>14}: {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Time to first byte and throughput of streamed template generation, against the fake LLM.
+
+Serves the REST app with uvicorn on a local port, answers generations with the
+fake LLM (see `DOC81_FAKE_LLM`), and streams N concurrent requests from
+POST /templates/generate/stream.
+
+    python benchmarks/bench_generate.py --requests 100 --concurrency 50 --first-token-ms 500
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port: int) -> uvicorn.Server:
+    from doc81.rest.app import create_app
+
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(), port=port, log_level="warning", lifespan="off")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def run(
+    url: str, requests: int, concurrency: int, mode: str
+) -> tuple[list[float], float]:
+    """Return the time to first byte of every request, and requests per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+
+        async def one() -> float:
+            # A unique document each time, so no request is served from the cache
+            document = (
+                f"# Design doc {uuid.uuid4()}\n\n## Context\n\nSome text.\n\n"
+                "## Rollout\n\nShip it behind the `new-ui` flag on **Friday**.\n"
+            )
+            async with semaphore:
+                start = time.perf_counter()
+                async with client.stream(
+                    "POST",
+                    "/templates/generate/stream",
+                    json={"raw_markdown": document, "mode": mode},
+                ) as response:
+                    response.raise_for_status()
+                    ttfb = None
+                    async for _ in response.aiter_bytes():
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - start
+                return ttfb
+
+        start = time.perf_counter()
+        ttfbs = await asyncio.gather(*(one() for _ in range(requests)))
+        return ttfbs, requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--first-token-ms", type=float, default=500.0)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--mode", choices=["llm", "hybrid"], default="llm")
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Generations the server runs at once (default: --concurrency)",
+    )
+    args = parser.parse_args()
+
+    # Read by the config when the app is imported
+    os.environ["DOC81_FAKE_LLM"] = "true"
+    os.environ["DOC81_FAKE_LLM_FIRST_TOKEN_LATENCY"] = str(args.first_token_ms / 1000)
+    os.environ["DOC81_FAKE_LLM_TOKEN_INTERVAL"] = str(args.token_interval_ms / 1000)
+    os.environ["DOC81_GENERATION_MAX_CONCURRENCY"] = str(
+        args.max_concurrency or args.concurrency
+    )
+    os.environ["DOC81_GENERATION_MAX_QUEUE"] = str(args.requests)
+
+    port = _free_port()
+    server = serve(port)
+    try:
+        ttfbs, rps = asyncio.run(
+            run(f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.mode)
+        )
+    finally:
+        server.should_exit = True
+
+    ttfbs.sort()
+    p95 = ttfbs[int(0.95 * (len(ttfbs) - 1))]
+    print(f"TTFB p50: {statistics.median(ttfbs) * 1000:8.1f} ms")
+    print(f"TTFB p95: {p95 * 1000:8.1f} ms")
+    print(f"throughput: {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Scaling of templatify_many with the number of worker processes.
+
+Templatifies a synthetic corpus with the result cache off, once per worker count.
+
+    python benchmarks/bench_templatify_many.py --documents 5000
+"""
+
+import argparse
+import os
+import time
+
+from doc81.core.config import Config
+from doc81.service.templatify import templatify_many
+
+SECTION = """\
+## Section {i}
+
+A paragraph with **bold**, `code` and a [link](https://example.com/{i}).
+
+- First item
+- Second item
+  - Nested item
+
+```python
+print({i})
+```
+
+| Column | Value |
+| ------ | ----- |
+| a      | {i}   |
+"""
+
+
+def corpus(documents: int, sections: int) -> list[str]:
+    return [
+        f"# Document {d}\n\n" + "\n".join(SECTION.format(i=i) for i in range(sections))
+        for d in range(documents)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--chunksize", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = corpus(args.documents, args.sections)
+    config = Config(templatify_cache_max_bytes=0)
+
+    workers = 1
+    baseline = None
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        for _ in templatify_many(
+            texts, workers=workers, chunksize=args.chunksize, config=config
+        ):
+            pass
+        rate = args.documents / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{workers:>3} workers: {rate:8.1f} docs/s ({rate / baseline:.2f}x)")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Time of templatify's AST rewrite and render phases on one large document.
+
+The document is parsed once; since the rewriter leaves the parsed AST untouched,
+every round rewrites that same AST. As with timeit, garbage collection is off while
+timing.
+
+    python benchmarks/bench_templatify_rewrite.py --sections 2000
+"""
+
+import argparse
+import gc
+import time
+
+from bench_templatify_many import corpus
+
+from doc81.service import templatify
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    (text,) = corpus(1, args.sections)
+    ast = templatify._markdown_parser()(text)
+    print(f"{len(text)} chars, {len(ast)} top-level nodes")
+
+    rewrite = render = float("inf")
+    gc.disable()
+    for _ in range(args.rounds):
+        ctx = templatify._context("bracket", "full", None, True)
+        start = time.perf_counter()
+        templated_ast: list = []
+        for node in ast:
+            templatify._rewrite(node, ctx, templated_ast)
+        rewrite = min(rewrite, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        templatify._render(templated_ast, ctx)
+        render = min(render, time.perf_counter() - start)
+    gc.enable()
+
+    print(f"rewrite: {rewrite * 1000:7.1f} ms (best of {args.rounds})")
+    print(f" render: {render * 1000:7.1f} ms (best of {args.rounds})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Benchmark suite for templatify, the local template service and the REST API.
+
+    python benchmarks/suite.py run --output before.json
+    python benchmarks/suite.py run --output after.json
+    python benchmarks/suite.py compare before.json after.json --threshold 0.1
+
+`run` times every case on synthetic corpora and writes the results as JSON. `compare`
+prints the change per case and exits with status 1 if any case got slower by more
+than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+
+import httpx
+
+RESULTS_VERSION = 1
+
+WORDS = [
+    "template", "service", "index", "cache", "query", "latency", "document",
+    "section", "render", "parse", "token", "heading", "paragraph", "table",
+    "list", "nested", "block", "code", "link", "image", "search",
+]  # fmt: skip
+
+
+# ---------------------------------------------------------------------------
+# Corpora
+# ---------------------------------------------------------------------------
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def flat_document(rng: random.Random, sections: int) -> str:
+    parts = [f"# Document {rng.randrange(1000)}\n"]
+    for i in range(sections):
+        parts.append(
+            f"## Section {i}\n\n{sentence(rng)}\n\n"
+            f"A paragraph with **bold**, `code` and a [link](https://example.com/{i}).\n\n"
+            f"- {sentence(rng, 4)}\n- {sentence(rng, 4)}\n\n"
+            f"```python\nprint({i})\n```\n\n"
+            f"| Column | Value |\n| ------ | ----- |\n| a      | {i}   |\n"
+        )
+    return "\n".join(parts)
+
+
+def nested_document(rng: random.Random, depth: int, sections: int = 20) -> str:
+    parts = []
+    for i in range(sections):
+        parts.append(f"## Section {i}\n")
+        for level in range(depth):
+            parts.append("  " * level + f"- {sentence(rng, 5)}")
+        parts.append("")
+        parts.append(
+            "\n".join("> " * (level + 1) + sentence(rng, 5) for level in range(depth))
+        )
+        parts.append("")
+    return "\n".join(parts)
+
+
+def write_prompt_dir(root: Path, templates: int, rng: random.Random) -> list[str]:
+    paths = []
+    for i in range(templates):
+        path = root / f"team-{i % 10}" / f"template-{i}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tags = sorted(rng.sample(WORDS, 3))
+        path.write_text(
+            f"---\nname: Template {i}\ndescription: {sentence(rng, 8)}\n"
+            f"tags: [{', '.join(tags)}]\n---\n{flat_document(rng, 3)}"
+        )
+        paths.append(str(path))
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+def measure(fn: Callable[[], object], rounds: int) -> dict:
+    """Seconds per call of `fn`, via timeit (so with garbage collection off)"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=rounds, number=number)]
+    return {
+        "seconds": statistics.median(times),
+        "min": min(times),
+        "rounds": rounds,
+        "calls_per_round": number,
+    }
+
+
+async def measure_load(
+    send: Callable[[], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    rounds: int,
+) -> dict:
+    """Seconds per request, and latencies, with `concurrency` requests in flight"""
+
+    async def one_round() -> tuple[float, list[float]]:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await send()
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return (time.perf_counter() - start) / requests, latencies
+
+    await one_round()  # warm up connections and caches
+    results = [await one_round() for _ in range(rounds)]
+    per_request = [seconds for seconds, _ in results]
+    latencies = sorted(latency for _, round_ in results for latency in round_)
+    return {
+        "seconds": statistics.median(per_request),
+        "min": min(per_request),
+        "rounds": rounds,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_latency": latencies[len(latencies) // 2],
+        "p95_latency": latencies[int(len(latencies) * 0.95)],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+# Every suite takes a `wanted` predicate on case names, and checks it before
+# running a case or building what only unwanted cases need
+Wanted = Callable[[str], bool]
+
+
+def templatify_cases(
+    quick: bool, rounds: int, wanted: Wanted
+) -> Iterator[tuple[str, dict]]:
+    from doc81.core.config import Config
+    from doc81.service.templatify import templatify
+
+    config = Config(templatify_cache_max_bytes=0)
+    rng = random.Random(0)
+
+    for sections in (10, 100) if quick else (10, 100, 1000):
+        text = flat_document(rng, sections)
+        name = f"templatify/flat/{sections}-sections"
+        if wanted(name):
+            yield name, measure(partial(templatify, text, config=config), rounds)
+
+    for depth in (2, 4) if quick else (2, 4, 8):
+        text = nested_document(rng, depth)
+        name = f"templatify/nested/depth-{depth}"
+        if wanted(name):
+            yield name, measure(partial(templatify, text, config=config), rounds)
+
+
+def local_service_cases(
+    quick: bool, rounds: int, wanted: Wanted
+) -> Iterator[tuple[str, dict]]:
+    for templates in (100,) if quick else (100, 1000):
+        names = [
+            f"{case}/{templates}"
+            for case in ("template_index/cold", "list_templates", "get_template")
+        ]
+        if not any(map(wanted, names)):
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            yield from _local_service(Path(tmp), templates, rounds, wanted)
+
+
+def _local_service(
+    prompt_dir: Path, templates: int, rounds: int, wanted: Wanted
+) -> Iterator[tuple[str, dict]]:
+    from doc81.core.config import Config
+    from doc81.service import get_template, list_templates
+    from doc81.service.template_index import TemplateIndex
+
+    rng = random.Random(templates)
+    paths = write_prompt_dir(prompt_dir, templates, rng)
+    config = Config(mode="local", prompt_dir=prompt_dir)
+
+    def cold_index():
+        index = TemplateIndex(prompt_dir)
+        index.refresh()
+        index.parse_all()
+
+    # A fresh index parses every file, the warm one behind the services only stats them
+    cases = {
+        f"template_index/cold/{templates}": cold_index,
+        f"list_templates/{templates}": lambda: list_templates(config),
+        f"get_template/{templates}": lambda: get_template(rng.choice(paths), config),
+    }
+    for name, fn in cases.items():
+        if wanted(name):
+            yield name, measure(fn, rounds)
+
+
+def rest_cases(quick: bool, rounds: int, wanted: Wanted) -> Iterator[tuple[str, dict]]:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from doc81.core.database import Base
+    from doc81.core.models import Template
+    from doc81.core.search import init_template_search
+
+    templates = 200 if quick else 2000
+    requests = 100 if quick else 500
+    rng = random.Random(1)
+    if not any(wanted(f"{route}/{templates}") for route in REST_ROUTES):
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bind=engine)
+        init_template_search(engine)
+        with Session(engine) as db:
+            ids = [uuid.uuid4() for _ in range(templates)]
+            db.add_all(
+                Template(
+                    id=id_,
+                    name=f"Template {i}",
+                    description=sentence(rng, 8),
+                    content=flat_document(rng, 3),
+                    tags=sorted(rng.sample(WORDS, 3)),
+                )
+                for i, id_ in enumerate(ids)
+            )
+            db.commit()
+        engine.dispose()
+
+        yield from asyncio.run(_rest_load(db_path, ids, requests, rounds, rng, wanted))
+
+
+# The handler and database path of each route, and the response cache in front of
+# the routes it serves (`cached/`), are separate cases
+REST_ROUTES = (
+    "rest/list_templates",
+    "rest/get_template",
+    "rest/search_templates",
+    "rest/cached/list_templates",
+    "rest/cached/get_template",
+)
+
+
+async def _rest_load(
+    db_path: Path,
+    ids: list[uuid.UUID],
+    requests: int,
+    rounds: int,
+    rng: random.Random,
+    wanted: Wanted,
+) -> list[tuple[str, dict]]:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from doc81.core.database import get_async_db
+    from doc81.rest.app import create_app
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def get_db():
+        async with SessionLocal() as db:
+            yield db
+
+    def client(cached: bool) -> httpx.AsyncClient:
+        # Read by the config create_app makes
+        with _environ(DOC81_RESPONSE_CACHE_MAX_ENTRIES=None if cached else "0"):
+            app = create_app()
+        app.dependency_overrides[get_async_db] = get_db
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        )
+
+    def routes(client: httpx.AsyncClient) -> dict[str, Callable]:
+        return {
+            "list_templates": lambda: client.get("/templates/", params={"limit": 50}),
+            "get_template": lambda: client.get(f"/templates/{rng.choice(ids)}"),
+            "search_templates": lambda: client.get(
+                "/templates/search", params={"q": " ".join(rng.sample(WORDS, 2))}
+            ),
+        }
+
+    results = []
+    for prefix, cached in (("rest", False), ("rest/cached", True)):
+        async with client(cached) as http:
+            for route, send in routes(http).items():
+                name = f"{prefix}/{route}/{len(ids)}"
+                if f"{prefix}/{route}" in REST_ROUTES and wanted(name):
+                    result = await measure_load(send, requests, 20, rounds)
+                    results.append((name, result))
+    await async_engine.dispose()
+    return results
+
+
+@contextmanager
+def _environ(**values: str | None) -> Iterator[None]:
+    """Set environment variables, or unset those given as None, for the block"""
+    original = {name: os.environ.get(name) for name in values}
+    _set_environ(values)
+    try:
+        yield
+    finally:
+        _set_environ(original)
+
+
+def _set_environ(values: dict[str, str | None]) -> None:
+    for name, value in values.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+SUITES = {
+    "templatify": templatify_cases,
+    "local": local_service_cases,
+    "rest": rest_cases,
+}
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+def run(args: argparse.Namespace) -> int:
+    def wanted(name: str) -> bool:
+        return not args.filter or args.filter in name
+
+    results = {}
+    for suite in args.suite or SUITES:
+        for name, result in SUITES[suite](args.quick, args.rounds, wanted):
+            results[name] = result
+            print(f"{name:<40} {result['seconds'] * 1e3:10.3f} ms", flush=True)
+
+    output = {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(output, indent=2) + "\n")
+    print(f"Wrote {len(results)} results to {args.output}")
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    base = json.loads(args.base.read_text())["results"]
+    head = json.loads(args.head.read_text())["results"]
+
+    regressions = []
+    print(f"{'case':<40} {'base ms':>10} {'head ms':>10} {'change':>8}")
+    for name in sorted(base.keys() | head.keys()):
+        if name not in base or name not in head:
+            status = "only in head" if name in head else "only in base"
+            print(f"{name:<40} {status:>30}")
+            continue
+        before, after = base[name]["seconds"], head[name]["seconds"]
+        change = after / before - 1
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<40} {before * 1e3:10.3f} {after * 1e3:10.3f} {change:+8.1%}{flag}"
+        )
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "--output", type=Path, default=Path("benchmark-results.json")
+    )
+    run_parser.add_argument("--suite", action="append", choices=SUITES)
+    run_parser.add_argument("--filter", help="Only keep cases whose name contains this")
+    run_parser.add_argument("--rounds", type=int, default=5)
+    run_parser.add_argument("--quick", action="store_true", help="Smaller corpora")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("head", type=Path)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Largest allowed slowdown, as a fraction (default: 0.1)",
+    )
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
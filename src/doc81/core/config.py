@@ -14,14 +14,175 @@ class Config(BaseSettings):
     mode: Literal["local", "server"] = "local"
 
     prompt_dir: Path | None = Field(default=None)
+    index_cache_path: Path | None = Field(
+        default=None,
+        description="Template index snapshot for warm starts. Defaults to .doc81-index.json in prompt_dir",
+    )
+    watch_prompt_dir: bool = Field(
+        False,
+        description="Keep the local template index in sync with prompt_dir by watching it for changes",
+    )
+    watch_poll_interval: float = Field(
+        1.0,
+        description="Seconds between scans when falling back to polling prompt_dir",
+    )
+    templatify_cache_max_bytes: int = Field(
+        32 * 1024 * 1024,
+        description="Memory kept for templatify results of documents seen before, 0 to turn the cache off",
+    )
+    templatify_cache_dir: Path | None = Field(
+        None,
+        description="Also keep templatify results on disk here, shared between processes and runs",
+    )
+    generation_cache_max_entries: int = Field(
+        256,
+        description="Generated templates kept in memory, keyed by model, prompt and input",
+    )
+    generation_cache_ttl: float = Field(
+        7 * 24 * 3600.0,
+        description="Seconds a generated template is reused before the LLM is asked again, 0 to turn the cache off",
+    )
+    generation_cache_path: Path | None = Field(
+        None,
+        description="SQLite file that also keeps generated templates across restarts and processes",
+    )
+    generation_cache_max_db_entries: int = Field(
+        10_000,
+        description="Generated templates kept in generation_cache_path",
+    )
+    generation_max_concurrency: int = Field(
+        4,
+        description="LLM generations of a model running at once, per worker",
+    )
+    generation_max_queue: int = Field(
+        32,
+        description="LLM generations of a model waiting for a slot before requests are turned away",
+    )
+    hybrid_confidence_threshold: float = Field(
+        0.8,
+        description="Hybrid generation has the LLM rewrite sections whose structural confidence is below this",
+    )
+    generation_jobs_path: Path | None = Field(
+        None,
+        description="SQLite file of batch generation jobs and their results. "
+        "Defaults to doc81-jobs.db next to a SQLite database_url; required with other databases",
+    )
+    generation_job_workers: int = Field(
+        4,
+        description="Documents of batch generation jobs generated at once",
+    )
+    generation_job_max_attempts: int = Field(
+        3,
+        description="Tries per document of a batch generation job before it is marked failed",
+    )
+    generation_job_retry_backoff: float = Field(
+        2.0,
+        description="Seconds before a failed document is retried, doubled for each retry after",
+    )
+    generation_job_lease: float = Field(
+        60.0,
+        description="Seconds a worker holds a claimed document without renewing; other processes take over documents whose lease ran out",
+    )
+    fake_llm: bool = Field(
+        False,
+        description="Answer generation requests with a local stand-in instead of the LLM, for load tests",
+    )
+    fake_llm_first_token_latency: float = Field(
+        0.5,
+        description="Seconds the fake LLM waits before its first token",
+    )
+    fake_llm_token_interval: float = Field(
+        0.01,
+        description="Seconds between the fake LLM's tokens",
+    )
     database_url: str = Field(
         "sqlite:///./doc81.db",
         description="Not used for local mode",
     )
+    db_pool_size: int = Field(
+        5,
+        description="Connections kept open per engine. Size it to the number of requests one worker serves at once",
+    )
+    db_max_overflow: int = Field(
+        10,
+        description="Connections opened on top of db_pool_size under load, closed when returned",
+    )
+    db_pool_timeout: float = Field(
+        30.0,
+        description="Seconds to wait for a free connection before giving up",
+    )
+    db_pool_recycle: int = Field(
+        -1,
+        description="Replace connections older than this many seconds, -1 to keep them",
+    )
+    db_pool_pre_ping: bool = Field(
+        True,
+        description="Test connections on checkout. Turn off to rely on db_pool_recycle instead",
+    )
+    db_statement_timeout_ms: int | None = Field(
+        None,
+        description="Abort statements running longer than this. Postgres only",
+    )
+    db_echo: bool = Field(
+        False,
+        description="Log every SQL statement",
+    )
+    buffer_like_counts: bool = Field(
+        False,
+        description="Apply like_count changes in batches instead of on every like/unlike",
+    )
+    like_count_flush_interval: float = Field(
+        1.0,
+        description="Seconds between writes of buffered like_count changes",
+    )
+    like_count_reconcile_interval: float | None = Field(
+        None,
+        description="Seconds between recomputing like_count from template likes. Off by default",
+    )
+    response_cache_max_entries: int = Field(
+        4096,
+        description="Template responses kept in memory by the REST server, 0 to turn the cache off",
+    )
+    response_cache_ttl: float = Field(
+        60.0,
+        description="Seconds a cached template response is served before it is read again",
+    )
+    response_cache_url: str | None = Field(
+        None,
+        description="Redis URL of a response cache shared by every worker, instead of the in-memory one",
+    )
+    metrics_enabled: bool = Field(
+        True,
+        description="Record request, database and LLM timings and serve them at /metrics",
+    )
     server_url: str = Field(
         "https://doc81-979490649165.us-east1.run.app",  # TODO: no hardcoded url
         description="Server URL for server mode",
     )
+    server_connect_timeout: float = Field(
+        5.0,
+        description="Seconds to wait for a connection to the server",
+    )
+    server_read_timeout: float = Field(
+        30.0,
+        description="Seconds to wait for the server to respond",
+    )
+    server_retries: int = Field(
+        3,
+        description="Retries of failed connections and 429/502/503/504 responses, with backoff",
+    )
+    server_pool_size: int = Field(
+        10,
+        description="Keep-alive connections kept open to the server",
+    )
+    server_cache_ttl: float = Field(
+        30.0,
+        description="Seconds a fetched template is used before asking the server whether it changed",
+    )
+    server_cache_max_entries: int = Field(
+        1024,
+        description="Fetched templates kept in memory",
+    )
 
 
 config = Config()
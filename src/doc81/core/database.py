@@ -1,15 +1,141 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import Engine, create_engine, exc, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.functions import now
 
-from doc81.core.config import config
+from doc81.core.config import Config, config as global_config
 
 Base = declarative_base()
 
+
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has second precision and a different text format than the
+    # datetimes SQLAlchemy binds, so equality on timestamps (keyset pagination) fails
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+class _CheckoutTimingMixin:
+    """Records how long checkouts take: waiting for a free connection or opening one"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Made here, not on first checkout, so concurrent first checkouts share it
+        self._checkout_lock = threading.Lock()
+        self.checkouts = self.checkout_timeouts = 0
+        self.checkout_wait_total = self.checkout_wait_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self._record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self._record_checkout(time.perf_counter() - start)
+        return connection
+
+    def _record_checkout(self, seconds: float, timed_out: bool = False) -> None:
+        with self._checkout_lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+                return
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+
+
+class _TimedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class _TimedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(database_url: str, config: Config | None = None) -> dict[str, Any]:
+    """
+    Keyword arguments for `create_engine`/`create_async_engine` from the db_* settings.
+
+    Args:
+        database_url: The URL the engine is created for; its driver decides how the
+            statement timeout is passed.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        dict[str, Any]: Engine keyword arguments.
+    """
+    if not config:
+        config = global_config
+
+    url = make_url(database_url)
+    options: dict[str, Any] = {"echo": config.db_echo}
+
+    # In-memory SQLite lives in a single connection, so there is no pool to size
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        options.update(
+            poolclass=_TimedAsyncQueuePool
+            if url.get_dialect().is_async
+            else _TimedQueuePool,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+            pool_pre_ping=config.db_pool_pre_ping,
+        )
+
+    if (
+        config.db_statement_timeout_ms is not None
+        and url.get_backend_name() == "postgresql"
+    ):
+        timeout = str(config.db_statement_timeout_ms)
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": timeout}
+            }
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+
+    return options
+
+
+def pool_status(engine: Engine) -> dict[str, int | float]:
+    """
+    Snapshot of an engine's connection pool.
+
+    Args:
+        engine: A sync engine, or the `sync_engine` of an async one.
+
+    Returns:
+        dict[str, int | float]: Pool size and current usage, plus checkout counts and
+            wait times since the pool was created. Empty for pools that are not sized.
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        # Counts up from -size while the pool is filling
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": getattr(pool, "checkouts", 0),
+        "checkout_timeouts": getattr(pool, "checkout_timeouts", 0),
+        "checkout_wait_total": getattr(pool, "checkout_wait_total", 0.0),
+        "checkout_wait_max": getattr(pool, "checkout_wait_max", 0.0),
+    }
+
+
 engine = create_engine(
-    config.database_url,
-    pool_pre_ping=True,
-    echo=config.env == "dev",
+    global_config.database_url, **engine_options(global_config.database_url)
 )
 
 # Create session factory
@@ -18,6 +144,38 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create scoped session for thread safety
 db_session = scoped_session(SessionLocal)
 
+# Async drivers for the same database
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    Swap the driver of a database URL for its asyncio counterpart.
+
+    Args:
+        database_url: A sync SQLAlchemy URL, e.g. postgresql://... or sqlite:///./doc81.db
+
+    Returns:
+        str: The URL with the asyncpg or aiosqlite driver.
+    """
+    url = make_url(database_url)
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return database_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+async_engine = create_async_engine(
+    async_database_url(global_config.database_url),
+    **engine_options(async_database_url(global_config.database_url)),
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def get_db():
     """
@@ -33,10 +191,23 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Get an async database session, for use in async routes.
+
+    Yields:
+        AsyncSession: SQLAlchemy async session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """
     Initialize database by creating all tables.
     """
     # Import all models to ensure they are registered with Base
+    from doc81.core.search import init_template_search
 
     Base.metadata.create_all(bind=engine)
+    init_template_search(engine)
@@ -12,3 +12,11 @@ class Doc81ServiceException(Doc81Exception):
 
 class Doc81NotAllowedError(Doc81Exception):
     """Exception raised when an operation is not allowed."""
+
+
+class Doc81BusyException(Doc81ServiceException):
+    """Exception raised when a service is at capacity. Retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
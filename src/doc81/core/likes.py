@@ -0,0 +1,248 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import bindparam, case, exists, func, literal, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from doc81.core.models import Template, TemplateLike, UserProfile
+
+# Each write is one INSERT/DELETE on template_likes plus one UPDATE of like_count in
+# the same transaction. Postgres chains them in a single statement through a
+# data-modifying CTE; elsewhere they are two statements.
+#
+# With a LikeCountBuffer, only the template_likes write happens per request and the
+# like_count deltas are applied in batches, so bursts on a hot template do not queue
+# up on its row lock.
+
+
+class LikeCountBuffer:
+    """
+    Accumulates like_count deltas in memory until `flush` writes them.
+
+    Args:
+        session_factory: Makes the sessions flushes run in.
+        on_flush: Awaited with the ids of the templates each flush updated.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        on_flush: Callable[[list[uuid.UUID]], Awaitable[object]] | None = None,
+    ):
+        self.session_factory = session_factory
+        self.on_flush = on_flush
+        self._deltas: defaultdict[uuid.UUID, int] = defaultdict(int)
+        self._lock = asyncio.Lock()
+
+    def add(self, template_id: uuid.UUID, delta: int) -> None:
+        if delta:
+            self._deltas[template_id] += delta
+
+    def pending(self, template_id: uuid.UUID) -> int:
+        return self._deltas.get(template_id, 0)
+
+    async def flush(self) -> int:
+        """
+        Apply the buffered deltas, one UPDATE per template in a single transaction.
+
+        Returns:
+            int: Number of templates updated.
+        """
+        async with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            params = [
+                {"template_id": template_id, "delta": delta}
+                # Same order in every worker, so concurrent flushes cannot deadlock
+                for template_id, delta in sorted(deltas.items())
+                if delta
+            ]
+            if not params:
+                return 0
+
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        _update_like_count(
+                            bindparam("template_id"),
+                            bindparam("delta"),
+                            Template.__table__,
+                        ),
+                        params,
+                    )
+                    await db.commit()
+            except Exception:
+                for template_id, delta in deltas.items():
+                    self.add(template_id, delta)
+                raise
+
+        if self.on_flush:
+            await self.on_flush([param["template_id"] for param in params])
+        return len(params)
+
+
+async def like_template(
+    db: AsyncSession,
+    template_id: uuid.UUID,
+    user_id: uuid.UUID,
+    buffer: LikeCountBuffer | None = None,
+) -> tuple[Template | None, bool]:
+    """
+    Record that a user likes a template and bump its like count, atomically.
+
+    Liking twice is a no-op. The like is only inserted if both the template and the
+    user exist, so a missing user shows up as `liked=False`.
+
+    Args:
+        db: The database session. The change is committed.
+        template_id: The template to like.
+        user_id: The `auth_user_id` of the user.
+        buffer: Defer the like_count update to this buffer.
+
+    Returns:
+        tuple[Template | None, bool]: The updated template, or None if it does not
+            exist, and whether a new like was recorded.
+    """
+    like = (
+        _insert(db)(TemplateLike)
+        .from_select(
+            [TemplateLike.id, TemplateLike.template_id, TemplateLike.user_id],
+            select(
+                literal(uuid.uuid4(), TemplateLike.id.type),
+                Template.id,
+                UserProfile.auth_user_id,
+            )
+            .join(UserProfile, true())
+            .where(Template.id == template_id, UserProfile.auth_user_id == user_id)
+            .limit(1),
+        )
+        .on_conflict_do_nothing(index_elements=["template_id", "user_id"])
+    )
+    return await _apply(db, template_id, like, 1, buffer)
+
+
+async def unlike_template(
+    db: AsyncSession,
+    template_id: uuid.UUID,
+    user_id: uuid.UUID,
+    buffer: LikeCountBuffer | None = None,
+) -> tuple[Template | None, bool]:
+    """
+    Remove a user's like from a template and decrement its like count, atomically.
+
+    Args:
+        db: The database session. The change is committed.
+        template_id: The template to unlike.
+        user_id: The `auth_user_id` of the user.
+        buffer: Defer the like_count update to this buffer.
+
+    Returns:
+        tuple[Template | None, bool]: The updated template, or None if it does not
+            exist, and whether a like was removed.
+    """
+    unlike = TemplateLike.__table__.delete().where(
+        TemplateLike.template_id == template_id, TemplateLike.user_id == user_id
+    )
+    return await _apply(db, template_id, unlike, -1, buffer)
+
+
+async def user_exists(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    return await db.scalar(select(exists().where(UserProfile.auth_user_id == user_id)))
+
+
+async def reconcile_like_counts(
+    db: AsyncSession,
+    buffer: LikeCountBuffer | None = None,
+    on_repair: Callable[[list[uuid.UUID]], Awaitable[object]] | None = None,
+) -> int:
+    """
+    Recompute like_count from template_likes wherever the two disagree.
+
+    Buffered deltas are flushed first. A like recorded while this runs may be
+    counted twice until the next run.
+
+    Args:
+        db: The database session. The change is committed.
+        buffer: The buffer in use, if any.
+        on_repair: Awaited with the ids of the templates repaired, if any were.
+
+    Returns:
+        int: Number of templates repaired.
+    """
+    if buffer:
+        await buffer.flush()
+
+    actual = (
+        select(func.count())
+        .where(TemplateLike.template_id == Template.id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Template)
+        .where(Template.like_count.is_distinct_from(actual))
+        .values(like_count=actual)
+        .returning(Template.id)
+        .execution_options(synchronize_session=False)
+    )
+    repaired = list(result.scalars())
+    await db.commit()
+
+    if repaired and on_repair:
+        await on_repair(repaired)
+    return len(repaired)
+
+
+async def _apply(
+    db: AsyncSession,
+    template_id: uuid.UUID,
+    change,
+    delta: int,
+    buffer: LikeCountBuffer | None,
+) -> tuple[Template | None, bool]:
+    if buffer:
+        changed = (await db.execute(change)).rowcount
+        await db.commit()
+        buffer.add(template_id, delta * changed)
+
+        template = await db.get(Template, template_id)
+        if template is None:
+            return None, False
+        # Detach before adding the unflushed delta, so it is only in the response
+        db.expunge(template)
+        template.like_count += buffer.pending(template_id)
+        return template, changed > 0
+
+    if db.get_bind().dialect.name == "postgresql":
+        changed_rows = change.returning(TemplateLike.template_id).cte("changed")
+        changed = select(func.count()).select_from(changed_rows).scalar_subquery()
+        stmt = _update_like_count(template_id, delta * changed).add_cte(changed_rows)
+        row = (await db.execute(stmt.returning(Template, changed))).first()
+    else:
+        changed = (await db.execute(change)).rowcount
+        stmt = _update_like_count(template_id, literal(delta * changed))
+        stmt = stmt.returning(Template, literal(changed))
+        row = (await db.execute(stmt)).first()
+
+    await db.commit()
+    if row is None:
+        return None, False
+    return row[0], row[1] > 0
+
+
+def _update_like_count(template_id, delta, target=Template):
+    new_count = Template.like_count + delta
+    return (
+        update(target)
+        .where(Template.id == template_id)
+        # Never below zero, even if the stored count has drifted
+        .values(like_count=case((new_count > 0, new_count), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _insert(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
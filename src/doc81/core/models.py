@@ -10,6 +10,7 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
     func,
+    literal_column,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
@@ -31,6 +32,9 @@ class Company(Base):
     users = relationship("UserProfile", back_populates="company")
     templates = relationship("Template", back_populates="company")
 
+    # Indexes
+    __table_args__ = (Index("idx_companies_created_at_id", created_at, id),)
+
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -57,6 +61,23 @@ class UserProfile(Base):
     __table_args__ = (
         Index("idx_user_profiles_auth_user_id", auth_user_id),
         Index("idx_user_profiles_company_id", company_id),
+        Index("idx_user_profiles_created_at_id", created_at, id),
+    )
+
+
+def _search_vector(name, tags, description, content):
+    config = literal_column("'english'::regconfig")
+
+    def _weighted(expr, weight: str):
+        return func.setweight(
+            func.to_tsvector(config, expr), literal_column(f"'{weight}'")
+        )
+
+    return (
+        _weighted(func.coalesce(name, literal_column("''")), "A")
+        .op("||")(_weighted(func.coalesce(tags, literal_column("'[]'")), "B"))
+        .op("||")(_weighted(func.coalesce(description, literal_column("''")), "C"))
+        .op("||")(_weighted(content, "D"))
     )
 
 
@@ -100,6 +121,25 @@ class Template(Base):
     __table_args__ = (
         Index("idx_templates_creator_id", creator_id),
         Index("idx_templates_company_id", company_id),
+        Index("idx_templates_created_at_id", created_at, id),
+        Index(
+            "idx_templates_search",
+            _search_vector(name, tags, description, content),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        Index("idx_templates_tags", tags, postgresql_using="gin").ddl_if(
+            dialect="postgresql"
+        ),
+    )
+
+
+def template_search_vector():
+    """
+    Weighted tsvector over a template's searchable fields (Postgres only).
+    Queries must use this exact expression for the planner to pick idx_templates_search.
+    """
+    return _search_vector(
+        Template.name, Template.tags, Template.description, Template.content
     )
 
 
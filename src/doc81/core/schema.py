@@ -1,5 +1,6 @@
 import uuid
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -45,6 +46,47 @@ class TemplateSchema(BaseModel):
         from_attributes = True
 
 
+class TemplateSearchResultSchema(BaseModel):
+    id: uuid.UUID
+    name: str
+    description: Optional[str] = None
+    tags: List[str] = Field(default_factory=list)
+    path: Optional[str] = None
+    like_count: int = 0
+    version: int = 1
+    score: float
+
+
+class TemplateBatchRequestSchema(BaseModel):
+    refs: List[str] = Field(min_length=1, max_length=100)
+
+
+class TemplateBatchItemSchema(BaseModel):
+    ref: str
+    template: Optional[TemplateSchema] = None
+    error: Optional[str] = None
+
+
+class TemplateBatchSchema(BaseModel):
+    results: List[TemplateBatchItemSchema]
+
+
+class PoolStatusSchema(BaseModel):
+    size: int = 0
+    checked_in: int = 0
+    checked_out: int = 0
+    overflow: int = 0
+    checkouts: int = 0
+    checkout_timeouts: int = 0
+    checkout_wait_total: float = 0.0
+    checkout_wait_max: float = 0.0
+
+
+class DatabasePoolsSchema(BaseModel):
+    engine: PoolStatusSchema
+    async_engine: PoolStatusSchema
+
+
 class TemplateVersionSchema(BaseModel):
     id: uuid.UUID = Field(default_factory=uuid.uuid4)
     template_id: uuid.UUID
@@ -83,5 +125,56 @@ class TemplateUpdateSchema(BaseModel):
     change_notes: Optional[str] = None
 
 
+SUPPORTED_MODELS = Literal[
+    "openai/gpt-4o-mini",
+    "openai/gpt-4o",
+    "openai/gpt-4.1",
+    "openai/gpt-4.1-mini",
+    "anthropic/claude-3.5-sonnet",
+    "anthropic/claude-3.5-haiku",
+    "anthropic/claude-3.7-sonnet",
+    "anthropic/claude-4.0-sonnet",
+    "gemini/gemini-2.0-flash-exp",
+    "gemini/gemini-2.0-flash-lite-exp",
+]
+
+GENERATION_MODES = Literal["llm", "structural", "hybrid"]
+
+
 class TemplateGenerateSchema(BaseModel):
-    raw_markdown: str
+    raw_markdown: str = Field(min_length=1)
+    model: SUPPORTED_MODELS = "openai/gpt-4o-mini"
+    mode: GENERATION_MODES = "llm"
+
+
+class GenerationJobCreateSchema(BaseModel):
+    documents: List[str] = Field(min_length=1, max_length=1000)
+    model: SUPPORTED_MODELS = "openai/gpt-4o-mini"
+    mode: GENERATION_MODES = "llm"
+
+
+class GenerationJobSchema(BaseModel):
+    id: uuid.UUID
+    status: Literal["queued", "running", "done"]
+    model: str
+    mode: str
+    total: int
+    queued: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+
+class GenerationJobItemSchema(BaseModel):
+    index: int
+    status: Literal["queued", "running", "done", "failed"]
+    attempts: int = 0
+    template: Optional[str] = None
+    error: Optional[str] = None
+
+
+class GenerationJobResultsSchema(BaseModel):
+    job: GenerationJobSchema
+    items: List[GenerationJobItemSchema]
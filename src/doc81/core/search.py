@@ -0,0 +1,202 @@
+from sqlalchemy import (
+    ColumnElement,
+    Engine,
+    column,
+    exists,
+    func,
+    literal_column,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from doc81.core.models import Template, template_search_vector
+from doc81.core.search_index import FIELD_WEIGHTS, SearchIndex, tokenize
+
+# SQLite fallback: an FTS5 table mirrored from `templates` by triggers. Only updates of
+# searchable columns touch it, so like_count bumps stay off the FTS write path.
+_SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5(
+        template_id UNINDEXED, name, tags, description, content,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS templates_fts_insert AFTER INSERT ON templates BEGIN
+        INSERT INTO templates_fts (template_id, name, tags, description, content)
+        VALUES (new.id, new.name, new.tags, new.description, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS templates_fts_delete AFTER DELETE ON templates BEGIN
+        DELETE FROM templates_fts WHERE template_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS templates_fts_update
+    AFTER UPDATE OF name, tags, description, content ON templates BEGIN
+        DELETE FROM templates_fts WHERE template_id = old.id;
+        INSERT INTO templates_fts (template_id, name, tags, description, content)
+        VALUES (new.id, new.name, new.tags, new.description, new.content);
+    END
+    """,
+]
+
+_sqlite_fts = table("templates_fts", column("template_id"))
+
+_SQLITE_FTS_BACKFILL = """
+    INSERT INTO templates_fts (template_id, name, tags, description, content)
+    SELECT id, name, tags, description, content FROM templates
+"""
+
+
+def init_template_search(engine: Engine) -> None:
+    """
+    Create the full-text search structures for the templates table.
+
+    Postgres gets the GIN indexes declared on `Template`, created here as well so that
+    databases created before they existed pick them up. SQLite gets an FTS5 table,
+    backfilled from existing rows the first time it is created.
+    """
+    if engine.dialect.name == "postgresql":
+        for index in Template.__table__.indexes:
+            index.create(engine, checkfirst=True)
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            created = not _has_sqlite_fts(conn)
+            for ddl in _SQLITE_FTS_DDL:
+                conn.execute(text(ddl))
+            if created:
+                conn.execute(text(_SQLITE_FTS_BACKFILL))
+
+
+def search_templates(
+    db: Session, query: str, *, tags: list[str] | None = None, limit: int = 10
+) -> list[tuple[Template, float]]:
+    """
+    Rank templates against `query` in the database.
+
+    Uses Postgres full-text search or SQLite FTS5, whichever matches the session's
+    database, and falls back to ranking in-process for anything else.
+
+    Args:
+        db: The database session.
+        query: Free text. An empty query only filters by tags.
+        tags: Only templates that have all of these tags are returned.
+        limit: Maximum number of results.
+
+    Returns:
+        list[tuple[Template, float]]: Templates and scores, best first.
+    """
+    tags = tags or []
+    terms = sorted(set(tokenize(query)))
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        return _search_postgres(db, terms, tags, limit)
+    if dialect == "sqlite" and _has_sqlite_fts(db):
+        return _search_sqlite(db, terms, tags, limit)
+    return _search_in_memory(db, query, tags, limit)
+
+
+def template_tags_filter(
+    db: Session | AsyncSession, tags: list[str]
+) -> list[ColumnElement[bool]]:
+    """
+    Conditions matching templates that have all of `tags`.
+
+    Postgres uses jsonb containment, served by idx_templates_tags. Other databases
+    look the tags up with json_each.
+    """
+    if not tags:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        return [Template.tags.contains(tags)]
+
+    conditions = []
+    for tag in tags:
+        tag_values = func.json_each(Template.tags).table_valued("value")
+        conditions.append(exists().where(tag_values.c.value == tag))
+    return conditions
+
+
+def _search_postgres(
+    db: Session, terms: list[str], tags: list[str], limit: int
+) -> list[tuple[Template, float]]:
+    stmt = select(Template).where(*template_tags_filter(db, tags))
+
+    if not terms:
+        stmt = stmt.order_by(Template.name).limit(limit)
+        return [(template, 0.0) for template in db.scalars(stmt)]
+
+    vector = template_search_vector()
+    tsquery = func.to_tsquery(literal_column("'english'::regconfig"), " | ".join(terms))
+    rank = func.ts_rank(vector, tsquery)
+    stmt = (
+        stmt.add_columns(rank)
+        .where(vector.op("@@")(tsquery))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return [(template, float(score)) for template, score in db.execute(stmt)]
+
+
+def _search_sqlite(
+    db: Session, terms: list[str], tags: list[str], limit: int
+) -> list[tuple[Template, float]]:
+    stmt = select(Template).where(*template_tags_filter(db, tags))
+
+    if not terms:
+        stmt = stmt.order_by(Template.name).limit(limit)
+        return [(template, 0.0) for template in db.scalars(stmt)]
+
+    weights = ", ".join(
+        str(FIELD_WEIGHTS[field])
+        for field in ("name", "tags", "description", "content")
+    )
+    # bm25() is lower-is-better; negate it to match the other backends
+    rank = literal_column(f"-bm25(templates_fts, 0, {weights})")
+    match = " OR ".join(f'"{term}"' for term in terms)
+    stmt = (
+        stmt.add_columns(rank)
+        .join(_sqlite_fts, _sqlite_fts.c.template_id == Template.id)
+        .where(literal_column("templates_fts").op("MATCH")(match))
+        .order_by(rank.desc())
+        .limit(limit)
+    )
+    return [(template, float(score)) for template, score in db.execute(stmt)]
+
+
+def _search_in_memory(
+    db: Session, query: str, tags: list[str], limit: int
+) -> list[tuple[Template, float]]:
+    templates = {str(template.id): template for template in db.query(Template).all()}
+
+    index = SearchIndex()
+    for template_id, template in templates.items():
+        index.add(
+            template_id,
+            name=template.name,
+            description=template.description or "",
+            tags=template.tags or [],
+            content=template.content,
+        )
+
+    return [
+        (templates[template_id], score)
+        for template_id, score in index.search(query, tags=tags, limit=limit)
+    ]
+
+
+def _has_sqlite_fts(conn) -> bool:
+    return (
+        conn.execute(
+            text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'templates_fts'"
+            )
+        ).first()
+        is not None
+    )
@@ -0,0 +1,141 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# How much a term occurrence counts towards BM25 term frequency, per field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.5,
+    "description": 2.0,
+    "content": 1.0,
+}
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over templates, ranked with BM25.
+
+    Field occurrences are weighted with `FIELD_WEIGHTS` before they are summed into a
+    single term frequency, so a hit in `name` outranks the same hit in the body.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[str, float]] = {}
+        self._doc_terms: dict[str, Counter[str]] = {}
+        self._doc_lengths: dict[str, float] = {}
+        self._doc_tags: dict[str, frozenset[str]] = {}
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(
+        self,
+        doc_id: str,
+        *,
+        name: str = "",
+        description: str = "",
+        tags: list[str] | None = None,
+        content: str = "",
+    ) -> None:
+        """Index a document, replacing any previous version with the same id."""
+        tags = tags or []
+        terms: Counter[str] = Counter()
+        for field, text in (
+            ("name", name),
+            ("tags", " ".join(tags)),
+            ("description", description),
+            ("content", content),
+        ):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text or ""):
+                terms[token] += weight
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._doc_tags[doc_id] = frozenset(tag.lower() for tag in tags)
+            self._total_length += self._doc_lengths[doc_id]
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(
+        self, query: str, *, tags: list[str] | None = None, limit: int = 10
+    ) -> list[tuple[str, float]]:
+        """
+        Rank documents against `query`.
+
+        Args:
+            query: Free text. An empty query matches every document that passes the tag filter.
+            tags: Only documents carrying all of these tags are returned.
+            limit: Maximum number of results.
+
+        Returns:
+            list[tuple[str, float]]: Document ids and scores, best first.
+        """
+        required_tags = frozenset(tag.lower() for tag in tags or [])
+        query_terms = set(tokenize(query))
+
+        with self._lock:
+
+            def _allowed(doc_id: str) -> bool:
+                return required_tags <= self._doc_tags[doc_id]
+
+            if not query_terms:
+                doc_ids = sorted(d for d in self._doc_terms if _allowed(d))
+                return [(doc_id, 0.0) for doc_id in doc_ids[:limit]]
+
+            doc_count = len(self._doc_terms)
+            avg_length = self._total_length / doc_count if doc_count else 0.0
+            scores: dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(
+                    1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for doc_id, tf in postings.items():
+                    if not _allowed(doc_id):
+                        continue
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * (
+                        tf * (self.k1 + 1) / (tf + norm)
+                    )
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        del self._doc_tags[doc_id]
@@ -11,6 +11,17 @@ class Mode(str, Enum):
     CLAUDE_DESKTOP = "claude"
 
 
+class TokenStyle(str, Enum):
+    BRACKET = "bracket"
+    CURLY = "curly"
+
+
+class Verbosity(str, Enum):
+    FULL = "full"
+    COMPACT = "compact"
+    OUTLINE = "outline"
+
+
 @app.command(name="setup")
 def setup(
     mode: Mode = typer.Option(Mode.CURSOR, help="The mode to setup"),
@@ -56,6 +67,47 @@ def setup(
         typer.echo(f"Invalid mode: {mode}")
 
 
+@app.command(name="templatify")
+def templatify(
+    paths: list[Path] = typer.Argument(
+        ..., help="Markdown files, or directories to search for *.md files"
+    ),
+    output_dir: Path | None = typer.Option(
+        None, help="Write results here, mirroring the input layout. Prints if not set"
+    ),
+    workers: int | None = typer.Option(
+        None, help="Worker processes. Defaults to the number of CPUs"
+    ),
+    token_style: TokenStyle = typer.Option(TokenStyle.BRACKET),
+    verbosity: Verbosity = typer.Option(Verbosity.FULL),
+):
+    from doc81.service.templatify import templatify_many
+
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files += [(path, file) for file in sorted(path.rglob("*.md"))]
+        else:
+            files.append((path.parent, path))
+
+    results = templatify_many(
+        [file for _, file in files],
+        workers=workers,
+        token_style=token_style.value,
+        verbosity=verbosity.value,
+    )
+    for (root, file), result in zip(files, results):
+        if output_dir is None:
+            print(result, end="")
+            continue
+        out_file = output_dir / file.relative_to(root)
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        out_file.write_text(result)
+
+    if output_dir is not None:
+        print(f"Templatified {len(files)} files into {output_dir}")
+
+
 @app.command(name="list")
 def list_templates():
     print("Listing templates...")
@@ -1,3 +1,5 @@
+import asyncio
+from pathlib import Path
 from typing import Callable
 
 from doc81 import __version__
@@ -5,6 +7,10 @@ from doc81 import __version__
 from fastmcp import FastMCP
 
 from doc81 import service
+from doc81.core.config import config
+from doc81.core.schema import GENERATION_MODES
+from doc81.service.template_index import warm_template_index
+from doc81.service.template_watcher import start_template_watcher
 
 
 mcp = FastMCP(
@@ -32,27 +38,61 @@ def mcp_tool_from_service(service_func: Callable) -> Callable:
 #     return config.model_dump()
 
 
+# Tools are async so that concurrent calls wait on file and network I/O together
 @mcp_tool_from_service
-def list_templates() -> list[str]:
-    return service.list_templates()
+async def list_templates() -> list[str]:
+    return await service.list_templates_async()
 
 
 @mcp_tool_from_service
-def get_template(path_or_ref: str) -> dict[str, str | list[str] | int | float]:
-    return service.get_template(path_or_ref)
+async def get_template(path_or_ref: str) -> dict[str, str | list[str] | int | float]:
+    return await service.get_template_async(path_or_ref)
+
+
+@mcp_tool_from_service
+async def get_templates(
+    paths_or_refs: list[str],
+) -> list[dict[str, str | dict | None]]:
+    return await service.get_templates_async(paths_or_refs)
+
+
+@mcp_tool_from_service
+async def search_templates(
+    query: str, tags: list[str] | None = None, limit: int = 10
+) -> list[dict[str, str | list[str] | float]]:
+    return await service.search_templates_async(query, tags=tags, limit=limit)
+
+
+@mcp_tool_from_service
+async def generate_template(
+    raw_markdown: str, mode: GENERATION_MODES = "hybrid"
+) -> str:
+    """
+    Turn a markdown document into a reusable template.
+
+    "hybrid" templatifies the document locally and has the LLM rewrite only the
+    sections that need, "structural" makes no LLM call, "llm" has the LLM write it all.
+    """
+    return await service.generate_template_async(raw_markdown, mode=mode)
 
 
 @mcp.resource(
     "template://{path_or_ref*}/latest",
     description="Get a template by path or reference",
 )
-def get_template_resource(path_or_ref: str) -> str:
-    tpl = service.get_template(path_or_ref)
+async def get_template_resource(path_or_ref: str) -> str:
+    tpl = await service.get_template_async(path_or_ref)
 
-    return open(tpl["path"]).read()
+    return await asyncio.to_thread(Path(tpl["path"]).read_text)
 
 
 def main():
+    if config.mode == "local" and config.prompt_dir:
+        # Build the template index before the first tool call comes in
+        warm_template_index(config)
+        if config.watch_prompt_dir:
+            start_template_watcher(config)
+
     mcp.run()
 
 
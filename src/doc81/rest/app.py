@@ -1,41 +1,114 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
 from fastapi import FastAPI
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 
 from doc81.core.config import Config
-from doc81.rest.routes import health, users, templates, companies
+from doc81.core.metrics import instrument_sqlalchemy
+from doc81.rest.caching import get_response_cache
+from doc81.rest.metrics import MetricsMiddleware
+from doc81.rest.routes import (
+    companies,
+    generation_jobs,
+    health,
+    metrics,
+    templates,
+    users,
+)
+from doc81.service.generation_jobs import get_generation_job_queue
+
+logger = logging.getLogger(__name__)
 
 
 def create_app() -> FastAPI:
     config = Config()
+    response_cache = get_response_cache(config)
+    generation_job_queue = get_generation_job_queue(config)
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        from doc81.core.database import init_db
+        from doc81.core.database import AsyncSessionLocal, init_db
+        from doc81.core.likes import LikeCountBuffer, reconcile_like_counts
 
         init_db()
+
+        buffer = None
+        jobs = []
+        if config.buffer_like_counts:
+            buffer = LikeCountBuffer(
+                AsyncSessionLocal,
+                # Cached responses carry like_count, which a flush changes
+                on_flush=response_cache.invalidate if response_cache else None,
+            )
+            jobs.append(_run_every(config.like_count_flush_interval, buffer.flush))
+        if config.like_count_reconcile_interval:
+
+            async def reconcile():
+                async with AsyncSessionLocal() as db:
+                    await reconcile_like_counts(
+                        db,
+                        buffer,
+                        # Cached responses carry like_count, which a repair changes
+                        on_repair=response_cache.invalidate if response_cache else None,
+                    )
+
+            jobs.append(_run_every(config.like_count_reconcile_interval, reconcile))
+
+        app.state.like_count_buffer = buffer
+        tasks = [asyncio.create_task(job) for job in jobs]
         yield
+        # Job workers start on first use; this hands back what they were generating
+        if generation_job_queue:
+            await generation_job_queue.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if buffer:
+            await buffer.flush()
 
     app = FastAPI(
         title="Doc81 REST API", version="0.1.0", config=config, lifespan=lifespan
     )
 
+    app.state.response_cache = response_cache
+    app.state.generation_jobs = generation_job_queue
+
     app.include_router(health.router)
     app.include_router(users.router)
+    app.include_router(generation_jobs.router)
     app.include_router(templates.router)
     app.include_router(companies.router)
 
+    if config.metrics_enabled:
+        instrument_sqlalchemy()
+        app.include_router(metrics.router)
+        app.add_middleware(MetricsMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "Link", "ETag"],
     )
 
     return app
 
 
+async def _run_every(interval: float, job: Callable[[], Awaitable[object]]) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except Exception:
+            # Keep the schedule; the next run retries
+            logger.exception("Background job %s failed", job.__qualname__)
+
+
 app = create_app()
 
 
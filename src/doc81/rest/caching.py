@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Protocol
+
+from fastapi import Request, Response, status
+
+from doc81.core.config import Config, config as global_config
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+# Template reads are served from the cache until a write through this API
+# invalidates them. Each template's response is cached under its id; list pages
+# are cached under a generation token that every write replaces, so they all
+# miss at once without having to be enumerated.
+#
+# Every response carries a strong ETag derived from the template version and the
+# body, so clients revalidating with If-None-Match get a 304 without the content.
+
+_LIST_GENERATION_KEY = "templates:list-generation"
+
+Loader = Callable[[], Awaitable["CachedResponse | None"]]
+
+
+class CacheBackend(Protocol):
+    """Storage for cached responses. Implementations must be safe to share."""
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def delete(self, *keys: str) -> None: ...
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU with a per-entry TTL.
+
+    Args:
+        max_entries: Least recently used entries are evicted beyond this.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Redis-backed cache shared by every worker, so a write invalidates all of them.
+
+    Args:
+        url: Redis URL, e.g. redis://localhost:6379/0.
+        prefix: Prepended to every key.
+    """
+
+    def __init__(self, url: str, prefix: str = "doc81:"):
+        if redis is None:
+            raise ImportError("Install redis to use a Redis response cache")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+
+@dataclass
+class CachedResponse:
+    """A JSON response body with its ETag and the headers to send along."""
+
+    body: bytes
+    etag: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def build(
+        cls, body: bytes, version: int | None = None, headers: dict | None = None
+    ) -> "CachedResponse":
+        headers = dict(headers or {})
+        hasher = hashlib.sha256(body)
+        # Pagination headers are part of the representation too
+        for name, value in sorted(headers.items()):
+            hasher.update(f"\n{name}: {value}".encode())
+        digest = hasher.hexdigest()[:32]
+        etag = f'"{version}-{digest}"' if version is not None else f'"{digest}"'
+        return cls(body=body, etag=etag, headers=headers)
+
+    def to_bytes(self) -> bytes:
+        meta = json.dumps({"etag": self.etag, "headers": self.headers})
+        return meta.encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, value: bytes) -> "CachedResponse":
+        meta, body = value.split(b"\n", 1)
+        return cls(body=body, **json.loads(meta))
+
+    def to_response(self, request: Request) -> Response:
+        """The full response, or 304 Not Modified if the client has this version."""
+        headers = {**self.headers, "ETag": self.etag}
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag`, using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class ResponseCache:
+    """
+    Cache of template read responses.
+
+    Args:
+        backend: Where responses are stored.
+        ttl: Seconds a response is served without checking the database. Bounds
+            staleness for writes that bypass this API, e.g. another worker's, when
+            the backend is not shared.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._writes = 0
+
+    async def template(
+        self, template_id: uuid.UUID, load: Loader
+    ) -> CachedResponse | None:
+        """The cached response for a template, or the one `load` makes on a miss."""
+        return await self._get_or_load(_template_key(template_id), load)
+
+    async def list_page(self, query: str, load: Loader) -> CachedResponse | None:
+        """The cached list page for a query string, or the one `load` makes on a miss."""
+        return await self._get_or_load(await self._list_key(query), load)
+
+    async def invalidate(self, template_ids: Iterable[uuid.UUID] = ()) -> None:
+        """Drop the responses of these templates and every list page."""
+        self._writes += 1
+        await asyncio.gather(
+            self.backend.delete(*map(_template_key, template_ids)),
+            self.backend.set(_LIST_GENERATION_KEY, _new_generation(), _FOREVER),
+        )
+
+    async def _get_or_load(self, key: str, load: Loader) -> CachedResponse | None:
+        value = await self.backend.get(key)
+        if value is not None:
+            return CachedResponse.from_bytes(value)
+
+        writes = self._writes
+        response = await load()
+        # Do not store what `load` read if a write was invalidated in the meantime:
+        # the read may predate it
+        if response is not None and writes == self._writes:
+            await self.backend.set(key, response.to_bytes(), self.ttl)
+        return response
+
+    async def _list_key(self, query: str) -> str:
+        generation = await self.backend.get(_LIST_GENERATION_KEY)
+        if generation is None:
+            # Never fall back to a fixed value: pages cached under it before the
+            # generation was evicted could still be around
+            generation = _new_generation()
+            await self.backend.set(_LIST_GENERATION_KEY, generation, _FOREVER)
+        return f"templates:list:{generation.decode()}:{query}"
+
+
+_FOREVER = 365 * 24 * 3600.0
+
+
+def _template_key(template_id: uuid.UUID) -> str:
+    return f"templates:{template_id}"
+
+
+def _new_generation() -> bytes:
+    return uuid.uuid4().hex.encode()
+
+
+def get_response_cache(config: Config | None = None) -> ResponseCache | None:
+    """
+    Make the response cache described by a config.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        ResponseCache | None: The cache, or None if response caching is turned off.
+    """
+    if not config:
+        config = global_config
+
+    if config.response_cache_url:
+        return ResponseCache(
+            RedisCacheBackend(config.response_cache_url), config.response_cache_ttl
+        )
+    if config.response_cache_max_entries > 0 and config.response_cache_ttl > 0:
+        return ResponseCache(
+            MemoryCacheBackend(config.response_cache_max_entries),
+            config.response_cache_ttl,
+        )
+    return None
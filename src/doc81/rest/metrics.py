@@ -0,0 +1,79 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from doc81.core.metrics import RequestStats, registry, request_stats
+
+HTTP_REQUESTS = registry.counter(
+    "doc81_http_requests_total",
+    "Requests served",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "doc81_http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route"],
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "doc81_http_requests_in_flight",
+    "Requests being served",
+    ["method"],
+)
+HTTP_REQUEST_DB_QUERIES = registry.histogram(
+    "doc81_http_request_db_queries",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+HTTP_REQUEST_DB_SECONDS = registry.histogram(
+    "doc81_http_request_db_seconds",
+    "Time spent executing SQL statements per request",
+    ["method", "route"],
+)
+
+# Requests that matched no route share one label, so that scanners probing random
+# paths cannot blow up the number of series
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and database work per route.
+
+    Routes are labelled with their path template, e.g. `/templates/{template_id}`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            request_stats.reset(token)
+
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_REQUEST_SECONDS.labels(method, route).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(method, route).observe(stats.db_queries)
+            HTTP_REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_seconds)
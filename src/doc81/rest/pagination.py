@@ -0,0 +1,118 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PageParams(BaseModel):
+    cursor: str | None = None
+    limit: int = DEFAULT_PAGE_SIZE
+    fields: list[str] | None = None
+
+
+def page_params(
+    cursor: str | None = Query(
+        None, description="Cursor from the X-Next-Cursor header of the previous page"
+    ),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return, e.g. id,name,tags"
+    ),
+) -> PageParams:
+    """Query parameters shared by every paginated list endpoint"""
+    return PageParams(
+        cursor=cursor,
+        limit=limit,
+        fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+    )
+
+
+async def paginate(
+    request: Request,
+    db: AsyncSession,
+    stmt: Select,
+    model: type,
+    schema: type[BaseModel],
+    params: PageParams,
+) -> JSONResponse:
+    """
+    Return one page of `stmt`, ordered by `(created_at, id)`.
+
+    The cursor of the next page, if any, is returned in the `X-Next-Cursor` header
+    and as a `Link: <...>; rel="next"` header, so the body stays a plain list.
+    With `fields`, only those columns are loaded and serialized.
+    """
+    if params.fields is not None:
+        unknown = set(params.fields) - schema.model_fields.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+            )
+        columns = {"id", "created_at", *params.fields}
+        stmt = stmt.options(
+            load_only(*[getattr(model, c) for c in columns if hasattr(model, c)])
+        )
+
+    if params.cursor:
+        created_at, id_ = _decode_cursor(params.cursor)
+        stmt = stmt.where(
+            or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > id_),
+            )
+        )
+
+    stmt = stmt.order_by(model.created_at, model.id).limit(params.limit + 1)
+    rows = (await db.scalars(stmt)).all()
+
+    headers = {}
+    if len(rows) > params.limit:
+        rows = rows[: params.limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return JSONResponse(
+        [_serialize(row, schema, params.fields) for row in rows], headers=headers
+    )
+
+
+def _serialize(row: Any, schema: type[BaseModel], fields: list[str] | None) -> dict:
+    if fields is None:
+        return schema.model_validate(row).model_dump(mode="json")
+
+    # Skip validation: the columns left out of the projection were never loaded
+    return schema.model_construct(**{f: getattr(row, f) for f in fields}).model_dump(
+        mode="json", include=set(fields)
+    )
+
+
+def _encode_cursor(created_at: datetime, id_: uuid.UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id_)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id_ = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(id_)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Invalid cursor"},
+        )
@@ -1,25 +1,33 @@
 import uuid
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from doc81.core.database import get_db
+from doc81.core import search
+from doc81.core.database import get_async_db
 from doc81.core.models import Company, Template, UserProfile
 from doc81.core.schema import CompanySchema, TemplateSchema, UserProfileSchema
+from doc81.rest.pagination import PageParams, page_params, paginate
 
 router = APIRouter(prefix="/companies", tags=["companies"])
 
 
 @router.get("/", response_model=List[CompanySchema])
-async def list_companies(db: Session = Depends(get_db)):
+async def list_companies(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
     """List all companies"""
-    companies = db.query(Company).all()
-    return companies
+    return await paginate(request, db, select(Company), Company, CompanySchema, page)
 
 
 @router.post("/", response_model=CompanySchema, status_code=status.HTTP_201_CREATED)
-async def create_company(company_data: CompanySchema, db: Session = Depends(get_db)):
+async def create_company(
+    company_data: CompanySchema, db: AsyncSession = Depends(get_async_db)
+):
     """Create a new company"""
     company = Company(
         id=uuid.uuid4(),
@@ -27,16 +35,16 @@ async def create_company(company_data: CompanySchema, db: Session = Depends(get_
     )
 
     db.add(company)
-    db.commit()
-    db.refresh(company)
+    await db.commit()
+    await db.refresh(company)
 
     return company
 
 
 @router.get("/{company_id}", response_model=CompanySchema)
-async def get_company(company_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_company(company_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a company by ID"""
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = await db.get(Company, company_id)
 
     if not company:
         raise HTTPException(
@@ -47,32 +55,48 @@ async def get_company(company_id: uuid.UUID, db: Session = Depends(get_db)):
 
 
 @router.get("/{company_id}/templates", response_model=List[TemplateSchema])
-async def get_company_templates(company_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_company_templates(
+    company_id: uuid.UUID,
+    request: Request,
+    tags: List[str] = Query(default=[]),
+    creator_id: Optional[uuid.UUID] = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get templates owned by a specific company"""
     # Check if company exists
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = await db.get(Company, company_id)
 
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail={"error": "Company not found"}
         )
 
-    templates = db.query(Template).filter(Template.company_id == company_id).all()
+    stmt = select(Template).where(
+        Template.company_id == company_id, *search.template_tags_filter(db, tags)
+    )
+    if creator_id:
+        stmt = stmt.where(Template.creator_id == creator_id)
 
-    return templates
+    return await paginate(request, db, stmt, Template, TemplateSchema, page)
 
 
 @router.get("/{company_id}/users", response_model=List[UserProfileSchema])
-async def get_company_users(company_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_company_users(
+    company_id: uuid.UUID,
+    request: Request,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get users belonging to a specific company"""
     # Check if company exists
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = await db.get(Company, company_id)
 
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail={"error": "Company not found"}
         )
 
-    users = db.query(UserProfile).filter(UserProfile.company_id == company_id).all()
+    stmt = select(UserProfile).where(UserProfile.company_id == company_id)
 
-    return users
+    return await paginate(request, db, stmt, UserProfile, UserProfileSchema, page)
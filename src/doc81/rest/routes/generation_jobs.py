@@ -0,0 +1,92 @@
+import uuid
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from doc81.core.schema import (
+    GenerationJobCreateSchema,
+    GenerationJobResultsSchema,
+    GenerationJobSchema,
+)
+from doc81.rest.routes.templates import _sse
+from doc81.service.generation_jobs import GenerationJobQueue
+
+router = APIRouter(prefix="/templates/generate/jobs", tags=["templates"])
+
+# Seconds between progress events while nothing changes, which keep proxies from
+# closing a quiet stream
+PROGRESS_HEARTBEAT = 15.0
+
+
+@router.post(
+    "/", response_model=GenerationJobSchema, status_code=status.HTTP_202_ACCEPTED
+)
+async def create_generation_job(request: Request, job_data: GenerationJobCreateSchema):
+    """Queue templates to be generated for a batch of documents"""
+    return await _queue(request).submit(
+        job_data.documents, model=job_data.model, mode=job_data.mode
+    )
+
+
+@router.get("/{job_id}", response_model=GenerationJobSchema)
+async def get_generation_job(request: Request, job_id: uuid.UUID):
+    """Get a batch generation job's progress"""
+    return await _job(_queue(request), job_id)
+
+
+@router.get("/{job_id}/results", response_model=GenerationJobResultsSchema)
+async def get_generation_job_results(request: Request, job_id: uuid.UUID):
+    """Get the templates, or errors, of a batch generation job's documents so far"""
+    queue = _queue(request)
+    job = await _job(queue, job_id)
+    return GenerationJobResultsSchema(job=job, items=await queue.results(job_id))
+
+
+@router.get("/{job_id}/events")
+async def stream_generation_job(request: Request, job_id: uuid.UUID):
+    """
+    Stream a batch generation job's progress as server-sent events.
+
+    A `progress` event carries the job each time one of its documents finishes
+    or fails, and `done` follows once none are left.
+    """
+    queue = _queue(request)
+    await _job(queue, job_id)
+    return StreamingResponse(
+        _progress_events(queue, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _progress_events(
+    queue: GenerationJobQueue, job_id: uuid.UUID
+) -> AsyncIterator[str]:
+    while True:
+        job = await queue.get(job_id)
+        yield _sse("progress", job.model_dump(mode="json"))
+        if job.status == "done":
+            break
+        await queue.wait_for_progress(PROGRESS_HEARTBEAT)
+    yield _sse("done", {})
+
+
+async def _job(queue: GenerationJobQueue, job_id: uuid.UUID) -> GenerationJobSchema:
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Job not found"},
+        )
+    return job
+
+
+def _queue(request: Request) -> GenerationJobQueue:
+    queue = request.app.state.generation_jobs
+    if queue is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": "Batch generation jobs need DOC81_GENERATION_JOBS_PATH"},
+        )
+    return queue
@@ -1,8 +1,20 @@
 from fastapi import APIRouter
 
+from doc81.core.database import async_engine, engine, pool_status
+from doc81.core.schema import DatabasePoolsSchema
+
 router = APIRouter()
 
 
 @router.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@router.get("/health/db", response_model=DatabasePoolsSchema)
+def database_pools():
+    """Connection pool usage and checkout wait times of the sync and async engines"""
+    return {
+        "engine": pool_status(engine),
+        "async_engine": pool_status(async_engine.sync_engine),
+    }
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from doc81.core.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Request, database and LLM metrics in the Prometheus text format"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,32 +1,95 @@
+import asyncio
+import json
+import math
 import uuid
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from doc81.core.database import get_db
-from doc81.core.models import Template, TemplateVersion, TemplateLike, UserProfile
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from doc81.core import likes, search
+from doc81.core.database import get_async_db
+from doc81.core.exception import Doc81BusyException, Doc81ServiceException
+from doc81.core.models import Template, TemplateVersion
 from doc81.core.schema import (
+    TemplateBatchItemSchema,
+    TemplateBatchRequestSchema,
+    TemplateBatchSchema,
     TemplateCreateSchema,
     TemplateGenerateSchema,
     TemplateSchema,
+    TemplateSearchResultSchema,
     TemplateUpdateSchema,
 )
+from doc81.rest.caching import CachedResponse, ResponseCache
+from doc81.rest.pagination import PageParams, page_params, paginate
 import doc81.service
 
 router = APIRouter(prefix="/templates", tags=["templates"])
 
 
 @router.get("/", response_model=List[TemplateSchema])
-async def list_templates(db: Session = Depends(get_db)):
-    """List all templates"""
-    templates = db.query(Template).all()
-    return templates
+async def list_templates(
+    request: Request,
+    tags: List[str] = Query(default=[]),
+    company_id: Optional[uuid.UUID] = None,
+    creator_id: Optional[uuid.UUID] = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List templates, optionally filtered by tags, company and creator"""
+
+    async def load() -> CachedResponse:
+        stmt = select(Template).where(*search.template_tags_filter(db, tags))
+        if company_id:
+            stmt = stmt.where(Template.company_id == company_id)
+        if creator_id:
+            stmt = stmt.where(Template.creator_id == creator_id)
+
+        response = await paginate(request, db, stmt, Template, TemplateSchema, page)
+        headers = {
+            name: response.headers[name]
+            for name in ("X-Next-Cursor", "Link")
+            if name in response.headers
+        }
+        return CachedResponse.build(response.body, headers=headers)
+
+    cache = _response_cache(request)
+    if cache:
+        response = await cache.list_page(request.url.query, load)
+    else:
+        response = await load()
+    return response.to_response(request)
+
+
+@router.get("/search", response_model=List[TemplateSearchResultSchema])
+async def search_templates(
+    q: str = "",
+    tags: List[str] = Query(default=[]),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Search templates by name, description, tags and content"""
+    results = await db.run_sync(
+        lambda session: search.search_templates(session, q, tags=tags, limit=limit)
+    )
+    return [
+        TemplateSearchResultSchema.model_validate(
+            {**TemplateSchema.model_validate(template).model_dump(), "score": score}
+        )
+        for template, score in results
+    ]
 
 
 @router.post("/", response_model=TemplateSchema, status_code=status.HTTP_201_CREATED)
 async def create_template(
-    template_data: TemplateCreateSchema, db: Session = Depends(get_db)
+    template_data: TemplateCreateSchema,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Create a new template"""
     # Convert tags list to JSONB format
@@ -40,43 +103,122 @@ async def create_template(
     )
 
     db.add(template)
-    db.commit()
-    db.refresh(template)
+    await db.commit()
+    await db.refresh(template)
+    await _invalidate(request)
 
     return template
 
 
 @router.post("/generate")
-async def generate_template(
-    template_data: TemplateGenerateSchema,
-    db: Session = Depends(get_db),
-):
+async def generate_template(template_data: TemplateGenerateSchema):
     """Generate a template with variables"""
-    return doc81.service.generate_template(template_data.raw_markdown)
+    try:
+        return await doc81.service.generate_template_async(
+            template_data.raw_markdown,
+            model=template_data.model,
+            mode=template_data.mode,
+        )
+    except Doc81BusyException as e:
+        raise _busy(e)
+    except Doc81ServiceException as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"error": str(e)},
+        )
 
 
-@router.get("/{template_id}", response_model=TemplateSchema)
-async def get_template(template_id: uuid.UUID, db: Session = Depends(get_db)):
-    """Get a template by ID"""
-    template = db.query(Template).filter(Template.id == template_id).first()
+@router.post("/generate/stream")
+async def stream_generate_template(template_data: TemplateGenerateSchema):
+    """Generate a template, sent as server-sent events while it is written"""
+    if template_data.mode == "llm":
+        try:
+            stream = await doc81.service.stream_generate_template(
+                template_data.raw_markdown, model=template_data.model
+            )
+        except Doc81BusyException as e:
+            raise _busy(e)
+        events = _generation_events(stream)
+    else:
+        events = _draft_events(template_data)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    if not template:
+
+@router.post("/batch", response_model=TemplateBatchSchema)
+async def get_templates(
+    batch: TemplateBatchRequestSchema, db: AsyncSession = Depends(get_async_db)
+):
+    """Get several templates by ID in one query. Unknown IDs get an error each"""
+    ids = {}
+    for ref in batch.refs:
+        try:
+            ids[ref] = uuid.UUID(ref)
+        except ValueError:
+            continue
+
+    found = {}
+    if ids:
+        stmt = select(Template).where(Template.id.in_(set(ids.values())))
+        found = {template.id: template for template in await db.scalars(stmt)}
+
+    results = []
+    for ref in batch.refs:
+        if ref not in ids:
+            results.append(
+                TemplateBatchItemSchema(ref=ref, error="Invalid template ID")
+            )
+        elif ids[ref] not in found:
+            results.append(TemplateBatchItemSchema(ref=ref, error="Template not found"))
+        else:
+            template = TemplateSchema.model_validate(found[ids[ref]])
+            results.append(TemplateBatchItemSchema(ref=ref, template=template))
+    return TemplateBatchSchema(results=results)
+
+
+@router.get("/{template_id}", response_model=TemplateSchema)
+async def get_template(
+    template_id: uuid.UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get a template by ID. Answers 304 if If-None-Match has the current ETag"""
+
+    async def load() -> CachedResponse | None:
+        template = await db.get(Template, template_id)
+        if not template:
+            return None
+        body = TemplateSchema.model_validate(template).model_dump_json().encode()
+        return CachedResponse.build(body, version=template.version)
+
+    cache = _response_cache(request)
+    if cache:
+        response = await cache.template(template_id, load)
+    else:
+        response = await load()
+
+    if not response:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"error": "Template not found"},
         )
 
-    return template
+    return response.to_response(request)
 
 
 @router.patch("/{template_id}", response_model=TemplateSchema)
 async def update_template(
     template_id: uuid.UUID,
     template_data: TemplateUpdateSchema,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Update a template by ID"""
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template = await db.get(Template, template_id)
 
     if not template:
         raise HTTPException(
@@ -101,16 +243,21 @@ async def update_template(
         if key != "change_notes" and value is not None:
             setattr(template, key, value)
 
-    db.commit()
-    db.refresh(template)
+    await db.commit()
+    await db.refresh(template)
+    await _invalidate(request, template_id)
 
     return template
 
 
 @router.delete("/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_template(template_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_template(
+    template_id: uuid.UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
     """Delete a template by ID"""
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template = await db.get(Template, template_id)
 
     if not template:
         raise HTTPException(
@@ -118,92 +265,121 @@ async def delete_template(template_id: uuid.UUID, db: Session = Depends(get_db))
             detail={"error": "Template not found"},
         )
 
-    db.delete(template)
-    db.commit()
+    await db.delete(template)
+    await db.commit()
+    await _invalidate(request, template_id)
 
     return None
 
 
 @router.post("/{template_id}/like", response_model=TemplateSchema)
 async def like_template(
-    template_id: uuid.UUID, user_id: uuid.UUID, db: Session = Depends(get_db)
+    template_id: uuid.UUID,
+    user_id: uuid.UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Like a template"""
-    # Check if template exists
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template, liked = await likes.like_template(
+        db, template_id, user_id, _like_count_buffer(request)
+    )
     if not template:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"error": "Template not found"},
         )
 
-    # Check if user exists
-    user = db.query(UserProfile).filter(UserProfile.auth_user_id == user_id).first()
-    if not user:
+    if liked:
+        await _invalidate(request, template_id)
+    # Nothing was inserted: either a repeated like or an unknown user
+    elif not await likes.user_exists(db, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail={"error": "User not found"}
         )
 
-    # Check if user already liked this template
-    existing_like = (
-        db.query(TemplateLike)
-        .filter(
-            TemplateLike.template_id == template_id, TemplateLike.user_id == user_id
-        )
-        .first()
-    )
-
-    if existing_like:
-        print("User already liked this template")
-        return template
-
-    # Create like
-    like = TemplateLike(template_id=template_id, user_id=user_id)
-
-    # Increment like count
-    template.like_count += 1
-
-    db.add(like)
-    db.commit()
-    db.refresh(template)
-
     return template
 
 
 @router.delete("/{template_id}/like", response_model=TemplateSchema)
 async def unlike_template(
-    template_id: uuid.UUID, user_id: uuid.UUID, db: Session = Depends(get_db)
+    template_id: uuid.UUID,
+    user_id: uuid.UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Unlike a template"""
-    # Check if template exists
-    template = db.query(Template).filter(Template.id == template_id).first()
+    template, unliked = await likes.unlike_template(
+        db, template_id, user_id, _like_count_buffer(request)
+    )
     if not template:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"error": "Template not found"},
         )
 
-    # Check if like exists
-    like = (
-        db.query(TemplateLike)
-        .filter(
-            TemplateLike.template_id == template_id, TemplateLike.user_id == user_id
-        )
-        .first()
-    )
-
-    if not like:
+    if not unliked:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"error": "User has not liked this template"},
         )
+    await _invalidate(request, template_id)
 
-    # Decrement like count and ensure it doesn't go below 0
-    if template.like_count > 0:
-        template.like_count -= 1
+    return template
 
-    db.delete(like)
-    db.commit()
-    db.refresh(template)
 
-    return template
+def _like_count_buffer(request: Request) -> likes.LikeCountBuffer | None:
+    # Set up by the app lifespan when DOC81_BUFFER_LIKE_COUNTS is on
+    return getattr(request.app.state, "like_count_buffer", None)
+
+
+def _response_cache(request: Request) -> ResponseCache | None:
+    return getattr(request.app.state, "response_cache", None)
+
+
+async def _invalidate(request: Request, *template_ids: uuid.UUID) -> None:
+    cache = _response_cache(request)
+    if cache:
+        await cache.invalidate(template_ids)
+
+
+async def _generation_events(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    # A client disconnect cancels the response; closing the stream then stops the LLM
+    try:
+        async with aclosing(stream):
+            async for delta in stream:
+                yield _sse("delta", {"text": delta})
+    except Doc81ServiceException as e:
+        # The status line is already sent, so errors are reported in the stream
+        yield _sse("error", {"error": str(e)})
+        return
+    yield _sse("done", {})
+
+
+async def _draft_events(template_data: TemplateGenerateSchema) -> AsyncIterator[str]:
+    draft = await asyncio.to_thread(
+        doc81.service.draft_template, template_data.raw_markdown
+    )
+    sections = [
+        {"template": section.template, "confidence": section.confidence}
+        for section in draft
+    ]
+    yield _sse("draft", {"sections": sections})
+
+    if template_data.mode == "hybrid":
+        refined = doc81.service.refine_template(draft, model=template_data.model)
+        async with aclosing(refined):
+            async for index, template in refined:
+                yield _sse("section", {"index": index, "template": template})
+    yield _sse("done", {})
+
+
+def _busy(e: Doc81BusyException) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={"error": str(e)},
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,20 +1,25 @@
 import uuid
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from doc81.core.database import get_db
+from doc81.core import search
+from doc81.core.database import get_async_db
 from doc81.core.models import Template, UserProfile
 from doc81.core.schema import TemplateSchema, UserProfileSchema
+from doc81.rest.pagination import PageParams, page_params, paginate
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/{user_id}", response_model=UserProfileSchema)
-async def get_user(user_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_user(user_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get user profile by ID"""
-    user = db.query(UserProfile).filter(UserProfile.auth_user_id == user_id).first()
+    user = await db.scalar(
+        select(UserProfile).where(UserProfile.auth_user_id == user_id)
+    )
 
     if not user:
         raise HTTPException(
@@ -25,10 +30,19 @@ async def get_user(user_id: uuid.UUID, db: Session = Depends(get_db)):
 
 
 @router.get("/{user_id}/templates", response_model=List[TemplateSchema])
-async def get_user_templates(user_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_user_templates(
+    user_id: uuid.UUID,
+    request: Request,
+    tags: List[str] = Query(default=[]),
+    company_id: Optional[uuid.UUID] = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get templates created by a specific user"""
     # First check if user exists
-    user = db.query(UserProfile).filter(UserProfile.auth_user_id == user_id).first()
+    user = await db.scalar(
+        select(UserProfile).where(UserProfile.auth_user_id == user_id)
+    )
 
     if not user:
         raise HTTPException(
@@ -36,6 +50,10 @@ async def get_user_templates(user_id: uuid.UUID, db: Session = Depends(get_db)):
         )
 
     # Get templates created by the user
-    templates = db.query(Template).filter(Template.creator_id == user_id).all()
+    stmt = select(Template).where(
+        Template.creator_id == user_id, *search.template_tags_filter(db, tags)
+    )
+    if company_id:
+        stmt = stmt.where(Template.company_id == company_id)
 
-    return templates
+    return await paginate(request, db, stmt, Template, TemplateSchema, page)
@@ -1,5 +1,27 @@
-from .get_template import get_template
-from .list_templates import list_templates
-from .generate_template import generate_template
+from .get_template import get_template, get_template_async
+from .get_templates import get_templates, get_templates_async
+from .list_templates import list_templates, list_templates_async
+from .generate_template import (
+    generate_template,
+    generate_template_async,
+    refine_template,
+    stream_generate_template,
+)
+from .hybrid_generation import draft_template
+from .search_templates import search_templates, search_templates_async
 
-__all__ = ["get_template", "list_templates", "generate_template"]
+__all__ = [
+    "get_template",
+    "get_template_async",
+    "get_templates",
+    "get_templates_async",
+    "list_templates",
+    "list_templates_async",
+    "generate_template",
+    "generate_template_async",
+    "draft_template",
+    "refine_template",
+    "stream_generate_template",
+    "search_templates",
+    "search_templates_async",
+]
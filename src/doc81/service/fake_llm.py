@@ -0,0 +1,53 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+from doc81.service.templatify import templatify
+
+# Stand-in for the generation LLM, to measure time to first byte and concurrent
+# throughput of the generation endpoints without a provider. It answers with the
+# templatify output of the document, streamed a few characters at a time.
+
+TOKEN_CHARS = 4
+
+
+async def stream_completion(
+    raw_markdown: str, *, first_token_latency: float, token_interval: float
+) -> AsyncIterator[str]:
+    """
+    Stream a fake completion for a document.
+
+    Args:
+        raw_markdown: The document to turn into a template.
+        first_token_latency: Seconds before the first token, like a provider's queueing and prefill.
+        token_interval: Seconds between tokens.
+
+    Returns:
+        AsyncIterator[str]: Text deltas.
+    """
+    result = templatify(raw_markdown, token_style="curly")
+    await asyncio.sleep(first_token_latency)
+    for start in range(0, len(result), TOKEN_CHARS):
+        if start:
+            await asyncio.sleep(token_interval)
+        yield result[start : start + TOKEN_CHARS]
+
+
+def completion(
+    raw_markdown: str, *, first_token_latency: float, token_interval: float
+) -> str:
+    """
+    A fake completion for a document, all at once, after as long as streaming it takes.
+
+    Args:
+        raw_markdown: The document to turn into a template.
+        first_token_latency: Seconds before the first token.
+        token_interval: Seconds between tokens.
+
+    Returns:
+        str: The completion.
+    """
+    result = templatify(raw_markdown, token_style="curly")
+    tokens = -(-len(result) // TOKEN_CHARS)
+    time.sleep(first_token_latency + max(tokens - 1, 0) * token_interval)
+    return result
@@ -1,52 +1,317 @@
+import asyncio
+import hashlib
+import logging
 import pathlib
-from typing import Literal
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from functools import partial
 import litellm
 
-PROMPT = pathlib.Path(__file__).parent / "prompts" / "doc81-generate.md"
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81ServiceException
+from doc81.core.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS
+from doc81.core.schema import GENERATION_MODES, SUPPORTED_MODELS
+from doc81.service import fake_llm
+from doc81.service.generation_cache import (
+    GenerationCache,
+    generation_cache_key,
+    get_generation_cache,
+)
+from doc81.service.generation_scheduler import get_generation_scheduler
+from doc81.service.hybrid_generation import (
+    DraftSection,
+    draft_template,
+    join_sections,
+)
 
-SUPPORTED_MODELS = Literal[
-    "openai/gpt-4o-mini",
-    "openai/gpt-4o",
-    "openai/gpt-4.1",
-    "openai/gpt-4.1-mini",
-    "anthropic/claude-3.5-sonnet",
-    "anthropic/claude-3.5-haiku",
-    "anthropic/claude-3.7-sonnet",
-    "anthropic/claude-4.0-sonnet",
-    "gemini/gemini-2.0-flash-exp",
-    "gemini/gemini-2.0-flash-lite-exp",
-]
+logger = logging.getLogger(__name__)
+
+PROMPT_PATH = pathlib.Path(__file__).parent / "prompts" / "doc81-generate.md"
+# Read once; the hash is part of every cache key, so editing the prompt and
+# restarting does not serve results generated with the old one
+PROMPT = PROMPT_PATH.read_text()
+PROMPT_HASH = hashlib.sha256(PROMPT.encode()).hexdigest()
+# Rewrites one section of a hybrid template
+SECTION_PROMPT_PATH = PROMPT_PATH.with_name("doc81-refine-section.md")
+SECTION_PROMPT = SECTION_PROMPT_PATH.read_text()
+SECTION_PROMPT_HASH = hashlib.sha256(SECTION_PROMPT.encode()).hexdigest()
 
 
 def generate_template(
     raw_markdown: str,
     *,
     model: SUPPORTED_MODELS = "openai/gpt-4o-mini",
+    config: Config | None = None,
 ) -> str:
     """
     Generate a template from raw markdown.
+    Results are cached by model, prompt and input, so a repeated document costs no LLM call.
     """
-    # TODO: Implement this
-    # get user preference if exists
-    # get latest model selection if exists
+    if not config:
+        config = global_config
 
-    completion = litellm.completion(
-        model=model,
-        messages=[
-            {"role": "developer", "content": PROMPT.read_text()},
-            {"role": "user", "content": raw_markdown},
-        ],
-    )
+    label = _label(model, config)
+    cache = get_generation_cache(config)
+    key = generation_cache_key(label, PROMPT_HASH, raw_markdown)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    with LLM_REQUEST_SECONDS.labels(label).time():
+        if config.fake_llm:
+            result = fake_llm.completion(
+                raw_markdown,
+                first_token_latency=config.fake_llm_first_token_latency,
+                token_interval=config.fake_llm_token_interval,
+            )
+        else:
+            completion = litellm.completion(
+                model=model, messages=_messages(PROMPT, raw_markdown)
+            )
+            result = completion.choices[0].message.content
 
-    result = completion.choices[0].message.content
-    # TODO: check if result is valid markdown
-    # ensure result ends with a newline
     if not result.endswith("\n"):
         result += "\n"
 
+    if cache is not None:
+        cache.put(key, result)
     return result
 
 
+async def generate_template_async(
+    raw_markdown: str,
+    *,
+    model: SUPPORTED_MODELS = "openai/gpt-4o-mini",
+    mode: GENERATION_MODES = "llm",
+    config: Config | None = None,
+) -> str:
+    """
+    Generate a template from raw markdown, without blocking the event loop.
+
+    Args:
+        raw_markdown: The document to turn into a template.
+        model: The model to generate with.
+        mode: "llm" to have the LLM write the whole template. "structural" for the
+            templatify template alone, with no LLM call. "hybrid" for the templatify
+            template with only its low-confidence sections rewritten by the LLM.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        str: The generated template.
+
+    Raises:
+        Doc81BusyException: If too many generations are queued for the model.
+        Doc81ServiceException: If the LLM call fails.
+    """
+    if mode == "llm":
+        stream = await stream_generate_template(
+            raw_markdown, model=model, config=config
+        )
+        return "".join([delta async for delta in stream])
+
+    draft = await asyncio.to_thread(draft_template, raw_markdown)
+    templates = [section.template for section in draft]
+    if mode == "hybrid":
+        async with aclosing(
+            refine_template(draft, model=model, config=config)
+        ) as refined:
+            async for index, template in refined:
+                templates[index] = template
+    return join_sections(templates)
+
+
+async def stream_generate_template(
+    raw_markdown: str,
+    *,
+    model: SUPPORTED_MODELS = "openai/gpt-4o-mini",
+    config: Config | None = None,
+) -> AsyncIterator[str]:
+    """
+    Generate a template from raw markdown, yielding it as the LLM writes it.
+
+    A cached result is yielded in one piece. Generations go through the event
+    loop's scheduler, so identical concurrent requests share one LLM call. Closing
+    the iterator early, e.g. when the client disconnects, cancels the LLM call
+    unless another request is still following it.
+
+    Awaiting this checks the cache and admits the generation; iterating the
+    result streams it.
+
+    Args:
+        raw_markdown: The document to turn into a template.
+        model: The model to generate with.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        AsyncIterator[str]: Pieces of the template, in order.
+
+    Raises:
+        Doc81BusyException: If too many generations are queued for the model.
+            Raised when awaited, before anything is streamed.
+        Doc81ServiceException: If the LLM call fails, while iterating.
+    """
+    return await _scheduled(raw_markdown, model, PROMPT, PROMPT_HASH, config)
+
+
+async def refine_template(
+    draft: list[DraftSection],
+    *,
+    model: SUPPORTED_MODELS = "openai/gpt-4o-mini",
+    config: Config | None = None,
+) -> AsyncIterator[tuple[int, str]]:
+    """
+    Have the LLM rewrite the sections of a draft whose structural confidence is
+    below `hybrid_confidence_threshold`, all at once.
+
+    Sections are sent on their own, so the LLM reads and writes only those. A
+    section the LLM fails on keeps its structural template.
+
+    Args:
+        draft: The sections, from `draft_template`.
+        model: The model to generate with.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        AsyncIterator[tuple[int, str]]: The index and new template of each
+            rewritten section, as they finish.
+    """
+    if not config:
+        config = global_config
+
+    async def refine(index: int) -> tuple[int, str | None]:
+        try:
+            stream = await _scheduled(
+                draft[index].markdown,
+                model,
+                SECTION_PROMPT,
+                SECTION_PROMPT_HASH,
+                config,
+            )
+            return index, "".join([delta async for delta in stream])
+        except Doc81ServiceException as e:
+            logger.warning(
+                "Keeping the structural template of section %d: %s", index, e
+            )
+            return index, None
+
+    tasks = [
+        asyncio.create_task(refine(index))
+        for index, section in enumerate(draft)
+        if section.confidence < config.hybrid_confidence_threshold
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, template = await next_done
+            if template is not None:
+                yield index, template
+    finally:
+        # Stop the LLM calls nobody waits for any more
+        for task in tasks:
+            task.cancel()
+
+
+async def _scheduled(
+    content: str, model: str, prompt: str, prompt_hash: str, config: Config | None
+) -> AsyncIterator[str]:
+    if not config:
+        config = global_config
+
+    label = _label(model, config)
+    cache = get_generation_cache(config)
+    key = generation_cache_key(label, prompt_hash, content)
+    if cache is not None:
+        cached = await cache.get_async(key)
+        if cached is not None:
+            return _yield(cached)
+
+    return get_generation_scheduler(config).stream(
+        key,
+        label,
+        partial(_generate, content, model, prompt, label, key, cache, config),
+    )
+
+
+async def _yield(result: str) -> AsyncIterator[str]:
+    yield result
+
+
+async def _generate(
+    content: str,
+    model: str,
+    prompt: str,
+    label: str,
+    key: str,
+    cache: GenerationCache | None,
+    config: Config,
+) -> AsyncIterator[str]:
+    parts = []
+    start = time.perf_counter()
+    try:
+        async with aclosing(
+            _stream_completion(content, model, prompt, config)
+        ) as stream:
+            async for delta in stream:
+                if not parts:
+                    LLM_FIRST_TOKEN_SECONDS.labels(label).observe(
+                        time.perf_counter() - start
+                    )
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        raise Doc81ServiceException(f"Generation failed: {e}") from e
+    finally:
+        LLM_REQUEST_SECONDS.labels(label).observe(time.perf_counter() - start)
+
+    result = "".join(parts)
+    if not result.endswith("\n"):
+        result += "\n"
+        yield "\n"
+
+    if cache is not None:
+        await cache.put_async(key, result)
+
+
+async def _stream_completion(
+    content: str, model: str, prompt: str, config: Config
+) -> AsyncIterator[str]:
+    if config.fake_llm:
+        async for delta in fake_llm.stream_completion(
+            content,
+            first_token_latency=config.fake_llm_first_token_latency,
+            token_interval=config.fake_llm_token_interval,
+        ):
+            yield delta
+        return
+
+    response = await litellm.acompletion(
+        model=model, messages=_messages(prompt, content), stream=True
+    )
+    try:
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        # Stops the provider's stream early; not every litellm version has it
+        aclose = getattr(response, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def _label(model: str, config: Config) -> str:
+    # Keep fake completions apart from real ones, in the cache, metrics and slots
+    return f"fake/{model}" if config.fake_llm else model
+
+
+def _messages(prompt: str, content: str) -> list[dict[str, str]]:
+    return [
+        {"role": "developer", "content": prompt},
+        {"role": "user", "content": content},
+    ]
+
+
 if __name__ == "__main__":
     raw_markdown = open("tests/data/raw/blog.md").read()
     print(generate_template(raw_markdown))
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.metrics import registry
+
+GENERATION_CACHE_REQUESTS = registry.counter(
+    "doc81_generation_cache_requests_total",
+    "Lookups of generated templates, by cache tier and outcome",
+    ["tier", "result"],
+)
+
+
+def generation_cache_key(model: str, prompt_hash: str, raw_markdown: str) -> str:
+    """
+    Content address of a generation: what the LLM is asked, and which LLM.
+
+    Args:
+        model: The model name.
+        prompt_hash: Hash of the system prompt.
+        raw_markdown: The document to turn into a template.
+
+    Returns:
+        str: Hex sha256 digest.
+    """
+    input_hash = hashlib.sha256(raw_markdown.encode()).hexdigest()
+    return hashlib.sha256(f"{model}\0{prompt_hash}\0{input_hash}".encode()).hexdigest()
+
+
+class GenerationCache:
+    """
+    Generated templates by content address: an in-process LRU in front of an
+    optional SQLite file that survives restarts and is shared between processes.
+
+    Args:
+        max_entries: Results kept in memory.
+        ttl: Seconds a result is served before the LLM is asked again.
+        db_path: SQLite file of the persistent tier.
+        max_db_entries: Least recently used rows are deleted beyond this.
+        prune_every: Writes between deleting expired and surplus rows.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        db_path: Path | None = None,
+        max_db_entries: int = 10_000,
+        prune_every: int = 100,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self.prune_every = prune_every
+        self._results: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        # A separate lock, so memory hits never wait on SQLite
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self._db: sqlite3.Connection | None = None
+        if db_path is not None:
+            self._db = _connect(db_path)
+
+    def get(self, key: str) -> str | None:
+        result = self._get_memory(key)
+        if result is not None or self._db is None:
+            return result
+        return self._get_db(key)
+
+    async def get_async(self, key: str) -> str | None:
+        """Like `get`, with the SQLite tier read in a thread, off the event loop."""
+        result = self._get_memory(key)
+        if result is not None or self._db is None:
+            return result
+        return await asyncio.to_thread(self._get_db, key)
+
+    def put(self, key: str, result: str) -> None:
+        now = time.time()
+        self._remember(key, result, now + self.ttl)
+        if self._db is not None:
+            self._put_db(key, result, now)
+
+    async def put_async(self, key: str, result: str) -> None:
+        """Like `put`, with the SQLite tier written in a thread, off the event loop."""
+        now = time.time()
+        self._remember(key, result, now + self.ttl)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_db, key, result, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM generations")
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _get_memory(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry and entry[0] > time.time():
+                self._results.move_to_end(key)
+                GENERATION_CACHE_REQUESTS.labels("memory", "hit").inc()
+                return entry[1]
+            self._results.pop(key, None)
+        GENERATION_CACHE_REQUESTS.labels("memory", "miss").inc()
+        return None
+
+    def _get_db(self, key: str) -> str | None:
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, result FROM generations WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE generations SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._db.commit()
+        if not row:
+            GENERATION_CACHE_REQUESTS.labels("sqlite", "miss").inc()
+            return None
+
+        GENERATION_CACHE_REQUESTS.labels("sqlite", "hit").inc()
+        expires_at, result = row
+        self._remember(key, result, expires_at)
+        return result
+
+    def _put_db(self, key: str, result: str, now: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO generations (key, result, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, result, now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(now)
+            self._db.commit()
+
+    def _prune(self, now: float) -> None:
+        self._db.execute("DELETE FROM generations WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM generations WHERE key IN ("
+            "SELECT key FROM generations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_db_entries,),
+        )
+
+    def _remember(self, key: str, result: str, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._results[key] = (expires_at, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS generations ("
+        "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+        "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS generations_accessed_at ON generations (accessed_at)"
+    )
+    db.commit()
+    return db
+
+
+_caches: dict[tuple, GenerationCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_generation_cache(config: Config | None = None) -> GenerationCache | None:
+    """
+    Get the process-wide generation cache for a config.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        GenerationCache | None: The cache, or None if caching is turned off.
+    """
+    if not config:
+        config = global_config
+
+    if config.generation_cache_ttl <= 0 or (
+        config.generation_cache_max_entries <= 0
+        and config.generation_cache_path is None
+    ):
+        return None
+
+    key = (
+        config.generation_cache_max_entries,
+        config.generation_cache_ttl,
+        config.generation_cache_path,
+        config.generation_cache_max_db_entries,
+    )
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = GenerationCache(*key)
+        return _caches[key]
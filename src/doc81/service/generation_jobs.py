@@ -0,0 +1,495 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import suppress
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81BusyException
+from doc81.core.metrics import registry
+from doc81.core.schema import (
+    GENERATION_MODES,
+    SUPPORTED_MODELS,
+    GenerationJobItemSchema,
+    GenerationJobSchema,
+)
+from doc81.service.generate_template import generate_template_async
+
+logger = logging.getLogger(__name__)
+
+# A job is a batch of documents. Each document is a row of generation_job_items
+# that workers claim, generate and mark done or failed, so a restart picks up
+# where the last process stopped and results stay available afterwards.
+#
+# Several processes may share the queue file. A claim is a lease held by one
+# queue and renewed while the document is generated; only documents whose lease
+# ran out, because the process holding it died, are taken over by another. A
+# document whose lease ran out on its last attempt is marked failed instead, so
+# one that kills or hangs every worker taking it is not run forever.
+
+GENERATION_JOB_ITEMS = registry.counter(
+    "doc81_generation_job_items_total",
+    "Documents of batch generation jobs, by outcome: done, retried or failed",
+    ["result"],
+)
+
+# Seconds idle workers wait before looking for retries that came due
+POLL_INTERVAL = 1.0
+
+
+class GenerationJobQueue:
+    """
+    Batch generation jobs, worked through by a pool of background workers.
+
+    Every document is generated with `generate_template_async`, so the generation
+    cache, scheduler and modes apply to jobs as they do to single requests.
+
+    Args:
+        db_path: SQLite file of the jobs and their results.
+        workers: Documents generated at once.
+        max_attempts: Tries per document before it is marked failed.
+        retry_backoff: Seconds before the first retry, doubled for each one after.
+        lease: Seconds a claimed document stays with this queue without renewal.
+        config: The config generations use. If not provided, the global config will be used.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        workers: int = 4,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        lease: float = 60.0,
+        config: Config | None = None,
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self.config = config or global_config
+        self._db: sqlite3.Connection | None = None
+        # Lease holder name, unique to this queue and process
+        self._owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+        self._progress: asyncio.Event | None = None
+
+    async def start(self) -> None:
+        """
+        Start the workers in the running event loop. Does nothing if they run.
+
+        Called on first use, by `submit` and by reading an unfinished job, so a
+        process that never touches jobs runs no workers and opens no file.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._progress = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self) -> None:
+        """Stop the workers. Documents they were generating are queued again."""
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._release)
+
+    async def submit(
+        self,
+        documents: list[str],
+        *,
+        model: SUPPORTED_MODELS = "openai/gpt-4o-mini",
+        mode: GENERATION_MODES = "llm",
+    ) -> GenerationJobSchema:
+        """
+        Queue a batch of documents to generate templates for.
+
+        Args:
+            documents: Raw markdown of each document.
+            model: The model to generate with.
+            mode: The generation mode, see `generate_template_async`.
+
+        Returns:
+            GenerationJobSchema: The new job.
+        """
+        await self.start()
+        job_id = await asyncio.to_thread(self._insert, documents, model, mode)
+        self._wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: uuid.UUID) -> GenerationJobSchema | None:
+        """
+        The job's progress, or None if there is no such job.
+
+        Reading an unfinished job starts the workers, so jobs left by a stopped
+        process carry on once someone follows them.
+        """
+        job = await asyncio.to_thread(self._job, job_id)
+        if job is not None and job.status != "done":
+            await self.start()
+        return job
+
+    async def results(self, job_id: uuid.UUID) -> list[GenerationJobItemSchema]:
+        """The job's documents, in submission order, with their template or error."""
+        return await asyncio.to_thread(self._items, job_id)
+
+    async def wait_for_progress(self, timeout: float) -> None:
+        """Wait until a document of any job finishes or fails, or `timeout` passes."""
+        await self.start()
+        progress = self._progress
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(progress.wait(), timeout)
+
+    async def _work(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if await asyncio.to_thread(self._fail_expired):
+                self._publish_progress()
+            item = await asyncio.to_thread(self._claim)
+            if item is None:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                continue
+            await self._generate(*item)
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self._renew)
+
+    async def _generate(
+        self,
+        job_id: str,
+        index: int,
+        raw_markdown: str,
+        model: str,
+        mode: str,
+        attempts: int,
+    ) -> None:
+        try:
+            template = await generate_template_async(
+                raw_markdown, model=model, mode=mode, config=self.config
+            )
+        except Doc81BusyException as e:
+            # Not the document's fault: try again once there is room, for free
+            await asyncio.to_thread(
+                self._retry, job_id, index, e.retry_after, None, attempts - 1
+            )
+        except Exception as e:
+            if attempts < self.max_attempts:
+                GENERATION_JOB_ITEMS.labels("retried").inc()
+                delay = self.retry_backoff * 2 ** (attempts - 1)
+                await asyncio.to_thread(self._retry, job_id, index, delay, str(e))
+                self._wakeup.set()
+            else:
+                GENERATION_JOB_ITEMS.labels("failed").inc()
+                logger.warning(
+                    "Giving up on document %d of job %s: %s", index, job_id, e
+                )
+                await asyncio.to_thread(
+                    self._finish, job_id, index, "failed", None, str(e)
+                )
+        else:
+            GENERATION_JOB_ITEMS.labels("done").inc()
+            await asyncio.to_thread(self._finish, job_id, index, "done", template, None)
+
+        self._publish_progress()
+
+    def _publish_progress(self) -> None:
+        progress, self._progress = self._progress, asyncio.Event()
+        progress.set()
+
+    def _insert(self, documents: list[str], model: str, mode: str) -> uuid.UUID:
+        job_id = uuid.uuid4()
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO generation_jobs (id, model, mode, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(job_id), model, mode, now, now),
+            )
+            self._connection().executemany(
+                "INSERT INTO generation_job_items (job_id, idx, raw_markdown, status, available_at) "
+                "VALUES (?, ?, ?, 'queued', ?)",
+                (
+                    (str(job_id), index, document, now)
+                    for index, document in enumerate(documents)
+                ),
+            )
+            self._connection().commit()
+        return job_id
+
+    def _claim(self) -> tuple | None:
+        now = time.time()
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "UPDATE generation_job_items SET status = 'running', "
+                    "attempts = attempts + 1, owner = ?, lease_expires_at = ? "
+                    "WHERE rowid = (SELECT rowid FROM generation_job_items "
+                    "WHERE (status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'running' AND lease_expires_at <= ? AND attempts < ?) "
+                    "ORDER BY available_at, rowid LIMIT 1) "
+                    "RETURNING job_id, idx, raw_markdown, attempts",
+                    (self._owner, now + self.lease, now, now, self.max_attempts),
+                )
+                .fetchone()
+            )
+            if row is None:
+                self._connection().commit()
+                return None
+            job_id, index, raw_markdown, attempts = row
+            model, mode = (
+                self._connection()
+                .execute(
+                    "SELECT model, mode FROM generation_jobs WHERE id = ?", (job_id,)
+                )
+                .fetchone()
+            )
+            self._connection().commit()
+        return job_id, index, raw_markdown, model, mode, attempts
+
+    def _fail_expired(self) -> int:
+        # Leases that ran out on the last attempt: the document took its worker
+        # down with it every time, so another try would do the same
+        now = time.time()
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute(
+                    "UPDATE generation_job_items SET status = 'failed', "
+                    "error = 'Lease expired after ' || attempts || ' attempts', "
+                    "owner = NULL, lease_expires_at = NULL "
+                    "WHERE status = 'running' AND lease_expires_at <= ? AND attempts >= ? "
+                    "RETURNING job_id, idx",
+                    (now, self.max_attempts),
+                )
+                .fetchall()
+            )
+            for job_id in {job_id for job_id, _ in rows}:
+                self._touch(job_id, now)
+            self._connection().commit()
+        for job_id, index in rows:
+            GENERATION_JOB_ITEMS.labels("failed").inc()
+            logger.warning(
+                "Giving up on document %d of job %s: lease expired", index, job_id
+            )
+        return len(rows)
+
+    def _retry(
+        self,
+        job_id: str,
+        index: int,
+        delay: float,
+        error: str | None,
+        attempts: int | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                "UPDATE generation_job_items SET status = 'queued', available_at = ?, "
+                "error = COALESCE(?, error), attempts = COALESCE(?, attempts), "
+                "owner = NULL, lease_expires_at = NULL "
+                "WHERE job_id = ? AND idx = ? AND owner = ?",
+                (now + delay, error, attempts, job_id, index, self._owner),
+            )
+            self._touch(job_id, now)
+            self._connection().commit()
+
+    def _finish(
+        self,
+        job_id: str,
+        index: int,
+        status: str,
+        result: str | None,
+        error: str | None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                "UPDATE generation_job_items SET status = ?, result = ?, error = ?, "
+                "owner = NULL, lease_expires_at = NULL "
+                "WHERE job_id = ? AND idx = ? AND owner = ?",
+                (status, result, error, job_id, index, self._owner),
+            )
+            self._touch(job_id, now)
+            self._connection().commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so making an app does not create the file
+        if self._db is None:
+            self._db = _connect(self.db_path)
+        return self._db
+
+    def _touch(self, job_id: str, now: float) -> None:
+        self._connection().execute(
+            "UPDATE generation_jobs SET updated_at = ? WHERE id = ?", (now, job_id)
+        )
+
+    def _renew(self) -> None:
+        with self._lock:
+            self._connection().execute(
+                "UPDATE generation_job_items SET lease_expires_at = ? "
+                "WHERE owner = ? AND status = 'running'",
+                (time.time() + self.lease, self._owner),
+            )
+            self._connection().commit()
+
+    def _release(self) -> None:
+        # Stopped, not failed: the interrupted attempt does not count
+        with self._lock:
+            self._connection().execute(
+                "UPDATE generation_job_items SET status = 'queued', "
+                "attempts = attempts - 1, owner = NULL, lease_expires_at = NULL "
+                "WHERE owner = ? AND status = 'running'",
+                (self._owner,),
+            )
+            self._connection().commit()
+
+    def _job(self, job_id: uuid.UUID) -> GenerationJobSchema | None:
+        with self._lock:
+            job = (
+                self._connection()
+                .execute(
+                    "SELECT model, mode, created_at, updated_at FROM generation_jobs WHERE id = ?",
+                    (str(job_id),),
+                )
+                .fetchone()
+            )
+            counts = dict(
+                self._connection()
+                .execute(
+                    "SELECT status, COUNT(*) FROM generation_job_items "
+                    "WHERE job_id = ? GROUP BY status",
+                    (str(job_id),),
+                )
+                .fetchall()
+            )
+        if job is None:
+            return None
+
+        model, mode, created_at, updated_at = job
+        if counts.get("queued", 0) + counts.get("running", 0) == 0:
+            status = "done"
+        elif counts.keys() == {"queued"}:
+            status = "queued"
+        else:
+            status = "running"
+        return GenerationJobSchema(
+            id=job_id,
+            status=status,
+            model=model,
+            mode=mode,
+            total=sum(counts.values()),
+            **counts,
+            created_at=_datetime(created_at),
+            updated_at=_datetime(updated_at),
+        )
+
+    def _items(self, job_id: uuid.UUID) -> list[GenerationJobItemSchema]:
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute(
+                    "SELECT idx, status, attempts, result, error FROM generation_job_items "
+                    "WHERE job_id = ? ORDER BY idx",
+                    (str(job_id),),
+                )
+                .fetchall()
+            )
+        return [
+            GenerationJobItemSchema(
+                index=index,
+                status=status,
+                attempts=attempts,
+                template=result,
+                error=error,
+            )
+            for index, status, attempts, result, error in rows
+        ]
+
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS generation_jobs ("
+        "id TEXT PRIMARY KEY, model TEXT NOT NULL, mode TEXT NOT NULL, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS generation_job_items ("
+        "job_id TEXT NOT NULL, idx INTEGER NOT NULL, raw_markdown TEXT NOT NULL, "
+        "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+        "available_at REAL NOT NULL, owner TEXT, lease_expires_at REAL, "
+        "result TEXT, error TEXT, PRIMARY KEY (job_id, idx))"
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS generation_job_items_queued "
+        "ON generation_job_items (status, available_at)"
+    )
+    db.commit()
+    return db
+
+
+def _jobs_path(config: Config) -> Path | None:
+    if config.generation_jobs_path is not None:
+        return config.generation_jobs_path
+
+    # Next to the SQLite database, so the API and workers agree on the file
+    # whichever directory they run from
+    url = make_url(config.database_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return Path(url.database).resolve().parent / "doc81-jobs.db"
+
+
+def get_generation_job_queue(config: Config | None = None) -> GenerationJobQueue | None:
+    """
+    Make the batch generation job queue described by a config.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        GenerationJobQueue | None: The queue, whose workers start on first use, or
+            None if no jobs file is set and the database is not a SQLite file.
+    """
+    if not config:
+        config = global_config
+
+    db_path = _jobs_path(config)
+    if db_path is None:
+        return None
+
+    return GenerationJobQueue(
+        db_path,
+        workers=config.generation_job_workers,
+        max_attempts=config.generation_job_max_attempts,
+        retry_backoff=config.generation_job_retry_backoff,
+        lease=config.generation_job_lease,
+        config=config,
+    )
@@ -0,0 +1,213 @@
+import asyncio
+import math
+import threading
+import time
+import weakref
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81BusyException, Doc81ServiceException
+from doc81.core.metrics import registry
+
+# Generations of a model run at most `max_concurrency` at a time; up to
+# `max_queue` more wait for a slot and the rest are turned away, so a burst
+# queues here instead of being rate-limited by the provider.
+#
+# Requests for a generation already running (same model, prompt and input)
+# follow it instead of starting their own: they replay what it has produced so
+# far, then receive the rest as it arrives. The generation is cancelled once the
+# last follower leaves.
+
+GENERATION_REQUESTS = registry.counter(
+    "doc81_generation_requests_total",
+    "Generation requests by model and outcome: started, coalesced or rejected",
+    ["model", "result"],
+)
+GENERATIONS_RUNNING = registry.gauge(
+    "doc81_generations_running",
+    "Generations holding a slot, by model",
+    ["model"],
+)
+GENERATIONS_QUEUED = registry.gauge(
+    "doc81_generations_queued",
+    "Generations waiting for a slot, by model",
+    ["model"],
+)
+
+Generate = Callable[[], AsyncIterator[str]]
+
+
+class _Flight:
+    """One running generation and what it has produced so far."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.followers = 0
+        self.task: asyncio.Task | None = None
+        self._updated = asyncio.Event()
+
+    def publish(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def updated(self) -> None:
+        await self._updated.wait()
+
+
+class GenerationScheduler:
+    """
+    Bounds and deduplicates the generations of one event loop.
+
+    Args:
+        max_concurrency: Generations of a model running at once.
+        max_queue: Generations of a model waiting for a slot before new ones are rejected.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        # Generations started and not finished, running or waiting for a slot
+        self._admitted: defaultdict[str, int] = defaultdict(int)
+        self._flights: dict[str, _Flight] = {}
+        # Moving average of how long a generation holds its slot
+        self._duration: defaultdict[str, float] = defaultdict(lambda: 1.0)
+
+    def stream(self, key: str, model: str, generate: Generate) -> AsyncIterator[str]:
+        """
+        Join the generation running under `key`, or start one with `generate`.
+
+        Admission happens here rather than on iteration, so a rejected request can
+        still be answered with an error status.
+
+        Args:
+            key: Identifies the generation, e.g. its cache key.
+            model: The model whose slots and queue the generation uses.
+            generate: Makes the upstream stream when the generation gets a slot.
+
+        Returns:
+            AsyncIterator[str]: The generation's output, from its start.
+
+        Raises:
+            Doc81BusyException: If the model's queue is full.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            GENERATION_REQUESTS.labels(model, "coalesced").inc()
+            flight.followers += 1
+            return self._follow(key, flight)
+
+        if self._admitted[model] >= self.max_concurrency + self.max_queue:
+            GENERATION_REQUESTS.labels(model, "rejected").inc()
+            raise Doc81BusyException(
+                f"Too many generations queued for {model}",
+                retry_after=self.retry_after(model),
+            )
+
+        GENERATION_REQUESTS.labels(model, "started").inc()
+        flight = _Flight()
+        # Counted on admission, not on first iteration: a request that has its
+        # iterator but has not started reading it still wants the result. One
+        # that is dropped unread never lets go, and the generation runs to the end
+        flight.followers = 1
+        self._flights[key] = flight
+        # Counted before the task first runs, so the next admission sees it
+        self._admitted[model] += 1
+        GENERATIONS_QUEUED.labels(model).inc()
+        flight.task = asyncio.create_task(self._run(key, model, generate, flight))
+        return self._follow(key, flight)
+
+    def retry_after(self, model: str) -> int:
+        """Seconds until a queued generation of `model` is likely to get a slot."""
+        queued = max(0, self._admitted[model] - self.max_concurrency)
+        rounds = queued / self.max_concurrency + 1
+        return max(1, math.ceil(rounds * self._duration[model]))
+
+    def _slot(self, model: str) -> asyncio.Semaphore:
+        if model not in self._slots:
+            self._slots[model] = asyncio.Semaphore(self.max_concurrency)
+        return self._slots[model]
+
+    async def _run(self, key: str, model: str, generate: Generate, flight: _Flight):
+        try:
+            try:
+                await self._slot(model).acquire()
+            finally:
+                GENERATIONS_QUEUED.labels(model).dec()
+
+            GENERATIONS_RUNNING.labels(model).inc()
+            start = time.monotonic()
+            try:
+                async with aclosing(generate()) as stream:
+                    async for part in stream:
+                        flight.parts.append(part)
+                        flight.publish()
+                elapsed = time.monotonic() - start
+                self._duration[model] += 0.2 * (elapsed - self._duration[model])
+            finally:
+                GENERATIONS_RUNNING.labels(model).dec()
+                self._slot(model).release()
+        except asyncio.CancelledError:
+            flight.error = Doc81ServiceException("Generation cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._admitted[model] -= 1
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done = True
+            flight.publish()
+
+    async def _follow(self, key: str, flight: _Flight) -> AsyncIterator[str]:
+        try:
+            index = 0
+            while True:
+                if index < len(flight.parts):
+                    index += 1
+                    yield flight.parts[index - 1]
+                elif flight.done:
+                    break
+                else:
+                    await flight.updated()
+            if flight.error is not None:
+                # A fresh exception per follower, so they do not share a traceback
+                raise Doc81ServiceException(str(flight.error)) from flight.error
+        finally:
+            flight.followers -= 1
+            if not flight.followers and not flight.done:
+                # Nobody is waiting for the result any more; new requests start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+
+_schedulers: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[tuple, GenerationScheduler]
+] = weakref.WeakKeyDictionary()
+_schedulers_lock = threading.Lock()
+
+
+def get_generation_scheduler(config: Config | None = None) -> GenerationScheduler:
+    """
+    Get the running event loop's generation scheduler for a config.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        GenerationScheduler: The scheduler, created on first use in this loop.
+    """
+    if not config:
+        config = global_config
+
+    key = (config.generation_max_concurrency, config.generation_max_queue)
+    loop = asyncio.get_running_loop()
+    with _schedulers_lock:
+        schedulers = _schedulers.setdefault(loop, {})
+        if key not in schedulers:
+            schedulers[key] = GenerationScheduler(*key)
+        return schedulers[key]
@@ -1,11 +1,9 @@
-from pathlib import Path
+import asyncio
 
-import requests
 from doc81.core.config import Config, config as global_config
-from doc81.core.exception import Doc81ServiceException
 from doc81.core.schema import Doc81Template, TemplateSchema
-from pydantic import ValidationError
-import frontmatter
+from doc81.service.server_client import get_async_server_client, get_server_client
+from doc81.service.template_index import get_template_index
 
 
 def get_template(
@@ -30,42 +28,33 @@ def get_template(
         return _get_template_from_path(path_or_ref, config).model_dump()
 
 
-def _get_template_from_url(ref: str, config: Config) -> TemplateSchema:
-    url = f"{config.server_url}/templates/{ref}"
-    response = requests.get(url)
-    response.raise_for_status()
-
-    print(f"{response.json()=}")
-    try:
-        return TemplateSchema.model_validate(response.json())
-    except ValidationError as e:
-        raise Doc81ServiceException(f"Invalid template: {e}")
-
+async def get_template_async(
+    path_or_ref: str, config: Config | None = None
+) -> dict[str, str | list[str]]:
+    """
+    Get a template from a path or a URL, without blocking the event loop.
 
-def _get_template_from_path(path: str, config: Config) -> Doc81Template:
-    try:
-        ppath = Path(config.prompt_dir / path)
-    except FileNotFoundError:
-        raise Doc81ServiceException(f"Template not found: {path}")
+    Args:
+        path_or_ref: The path or URL of the template.
+        config: The config object. If not provided, the global config will be used.
 
-    with open(ppath, "r") as f:
-        content = f.read()
+    Returns:
+        dict[str, str | list[str]]: The template as a dictionary.
+    """
+    if not config:
+        config = global_config
 
-    frontmatter_data = frontmatter.loads(content)
+    if config.mode == "server":
+        template = await get_async_server_client(config).get_template(path_or_ref)
+    else:
+        # Local lookups stat and read files, so they run in a worker thread
+        template = await asyncio.to_thread(_get_template_from_path, path_or_ref, config)
+    return template.model_dump()
 
-    errors = []
-    if not frontmatter_data.get("name"):
-        errors.append(f"Template name is required in {ppath}")
 
-    if not frontmatter_data.get("description"):
-        errors.append(f"Template description is required in {ppath}")
+def _get_template_from_url(ref: str, config: Config) -> TemplateSchema:
+    return get_server_client(config).get_template(ref)
 
-    if errors:
-        raise Doc81ServiceException("\n".join(errors))
 
-    return Doc81Template(
-        name=frontmatter_data.get("name"),
-        description=frontmatter_data.get("description"),
-        tags=frontmatter_data.get("tags", []),
-        path=str(ppath.absolute()),
-    )
+def _get_template_from_path(path: str, config: Config) -> Doc81Template:
+    return get_template_index(config).get(path)
@@ -0,0 +1,67 @@
+import asyncio
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81ServiceException
+from doc81.service.server_client import get_async_server_client, get_server_client
+from doc81.service.template_index import get_template_index
+
+TemplateResult = dict[str, str | dict | None]
+
+
+def get_templates(
+    paths_or_refs: list[str], config: Config | None = None
+) -> list[TemplateResult]:
+    """
+    Get several templates at once. A template that cannot be found does not fail
+    the others; its result carries the error instead.
+
+    Args:
+        paths_or_refs: The paths or refs of the templates.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        list[TemplateResult]: In input order, `{"ref", "template", "error"}` per path or ref.
+    """
+    if not config:
+        config = global_config
+
+    if config.mode == "server":
+        items = get_server_client(config).get_templates(paths_or_refs)
+        return [item.model_dump() for item in items]
+    return [_get_template_from_path(path, config) for path in paths_or_refs]
+
+
+async def get_templates_async(
+    paths_or_refs: list[str], config: Config | None = None
+) -> list[TemplateResult]:
+    """
+    Get several templates at once, without blocking the event loop. Server mode
+    fetches them in one request, local mode reads the files concurrently.
+
+    Args:
+        paths_or_refs: The paths or refs of the templates.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        list[TemplateResult]: In input order, `{"ref", "template", "error"}` per path or ref.
+    """
+    if not config:
+        config = global_config
+
+    if config.mode == "server":
+        items = await get_async_server_client(config).get_templates(paths_or_refs)
+        return [item.model_dump() for item in items]
+    return await asyncio.gather(
+        *(
+            asyncio.to_thread(_get_template_from_path, path, config)
+            for path in paths_or_refs
+        )
+    )
+
+
+def _get_template_from_path(path: str, config: Config) -> TemplateResult:
+    try:
+        template = get_template_index(config).get(path)
+    except Doc81ServiceException as e:
+        return {"ref": path, "template": None, "error": str(e)}
+    return {"ref": path, "template": template.model_dump(), "error": None}
@@ -0,0 +1,95 @@
+import re
+from dataclasses import dataclass
+
+from doc81.service.templatify import templatify_sections
+
+# Hybrid generation starts from the structural template templatify makes locally
+# and only sends the LLM the sections that template does not generalize well.
+#
+# How well is judged per section by its structural confidence: the share of the
+# section's words templatify replaced with placeholders. Headings are kept on
+# purpose and are not counted. What remains of the rest is specific content, e.g.
+# prose around inline code, links or emphasis, which templatify keeps verbatim.
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"^ {0,3}#{1,6}(?:[ \t].*)?$", re.MULTILINE)
+_PLACEHOLDER = re.compile(r"\[[A-Z][a-z_]* \d+\]|\{\{[A-Z][a-z_]* \d+\}\}")
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class DraftSection:
+    """One section of a document with its structural template."""
+
+    markdown: str
+    template: str
+    confidence: float
+
+
+def draft_template(raw_markdown: str) -> list[DraftSection]:
+    """
+    Templatify a document section by section, scoring each section's template.
+
+    Args:
+        raw_markdown: The document to turn into a template.
+
+    Returns:
+        list[DraftSection]: The document's sections, in order. Joining their
+            templates gives the document's structural template.
+    """
+    sections = split_sections(raw_markdown)
+    templates = templatify_sections(sections)
+    return [
+        DraftSection(section, template, structural_confidence(section, template))
+        for section, template in zip(sections, templates)
+    ]
+
+
+def join_sections(templates: list[str]) -> str:
+    """Join section templates into one document, a blank line apart."""
+    return "\n".join(template.strip() + "\n" for template in templates)
+
+
+def split_sections(raw_markdown: str) -> list[str]:
+    """
+    Split a document before each ATX heading outside code blocks.
+
+    Args:
+        raw_markdown: The document.
+
+    Returns:
+        list[str]: The sections, in order. Text before the first heading is a
+            section of its own. Blank sections are dropped.
+    """
+    sections: list[list[str]] = [[]]
+    fence = None
+    for line in raw_markdown.splitlines(keepends=True):
+        if fence:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+        elif match := _FENCE.match(line):
+            fence = match.group(1)
+        elif _HEADING.match(line.rstrip("\n")) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    return [text for text in map("".join, sections) if text.strip()]
+
+
+def structural_confidence(markdown: str, template: str) -> float:
+    """
+    Share of a section's words, headings aside, that its template replaced with placeholders.
+
+    Args:
+        markdown: The section.
+        template: Its structural template.
+
+    Returns:
+        float: From 0, nothing generalized, to 1. A section with nothing but headings scores 1.
+    """
+    total = len(_WORD.findall(_HEADING.sub("", markdown)))
+    if not total:
+        return 1.0
+    kept = len(_WORD.findall(_PLACEHOLDER.sub("", _HEADING.sub("", template))))
+    return max(0.0, 1 - kept / total)
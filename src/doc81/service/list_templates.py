@@ -1,5 +1,8 @@
+import asyncio
+
 from doc81.core.config import Config, config as global_config
 from doc81.core.exception import Doc81NotAllowedError
+from doc81.service.template_index import get_template_index
 
 
 def list_templates(config: Config | None = None) -> list[str]:
@@ -18,4 +21,17 @@ def list_templates(config: Config | None = None) -> list[str]:
     if config.mode == "server":
         raise Doc81NotAllowedError("Server mode is not allowed to list templates")
 
-    return [str(path) for path in config.prompt_dir.glob("**/*.md")]
+    return get_template_index(config).list_paths()
+
+
+async def list_templates_async(config: Config | None = None) -> list[str]:
+    """
+    List all templates in the prompt directory, without blocking the event loop.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        list[str]: A list of templates.
+    """
+    return await asyncio.to_thread(list_templates, config)
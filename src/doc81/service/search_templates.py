@@ -0,0 +1,157 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import frontmatter
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.search_index import SearchIndex
+from doc81.service.server_client import get_async_server_client, get_server_client
+from doc81.service.template_index import (
+    TemplateIndex,
+    TemplateIndexEntry,
+    get_template_index,
+)
+
+
+def search_templates(
+    query: str,
+    tags: list[str] | None = None,
+    limit: int = 10,
+    config: Config | None = None,
+) -> list[dict[str, str | list[str] | float]]:
+    """
+    Search templates by name, description, tags and body text.
+
+    Args:
+        query: Free text to search for. Leave empty to only filter by tags.
+        tags: Only return templates that have all of these tags.
+        limit: Maximum number of templates to return.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        list[dict[str, str | list[str] | float]]: Matching templates, best match first, with their score.
+    """
+    if not config:
+        config = global_config
+
+    if config.mode == "server":
+        return _search_templates_from_server(query, tags, limit, config)
+    else:
+        return _search_templates_from_path(query, tags, limit, config)
+
+
+async def search_templates_async(
+    query: str,
+    tags: list[str] | None = None,
+    limit: int = 10,
+    config: Config | None = None,
+) -> list[dict[str, str | list[str] | float]]:
+    """
+    Search templates by name, description, tags and body text, without blocking the event loop.
+
+    Args:
+        query: Free text to search for. Leave empty to only filter by tags.
+        tags: Only return templates that have all of these tags.
+        limit: Maximum number of templates to return.
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        list[dict[str, str | list[str] | float]]: Matching templates, best match first, with their score.
+    """
+    if not config:
+        config = global_config
+
+    if config.mode == "server":
+        return await get_async_server_client(config).get_json(
+            "/templates/search",
+            params={"q": query, "tags": tags or [], "limit": limit},
+        )
+    return await asyncio.to_thread(
+        _search_templates_from_path, query, tags, limit, config
+    )
+
+
+def _search_templates_from_server(
+    query: str, tags: list[str] | None, limit: int, config: Config
+) -> list[dict[str, str | list[str] | float]]:
+    return get_server_client(config).get_json(
+        "/templates/search", params={"q": query, "tags": tags or [], "limit": limit}
+    )
+
+
+def _search_templates_from_path(
+    query: str, tags: list[str] | None, limit: int, config: Config
+) -> list[dict[str, str | list[str] | float]]:
+    search = _get_local_search(get_template_index(config))
+    return search.search(query, tags=tags, limit=limit)
+
+
+class _LocalTemplateSearch:
+    """
+    Keeps a `SearchIndex` in step with a `TemplateIndex`.
+    Only templates whose index entry was replaced since the last sync are re-read.
+    """
+
+    def __init__(self, template_index: TemplateIndex):
+        self.template_index = template_index
+        self.search_index = SearchIndex()
+        self._synced: dict[str, TemplateIndexEntry] = {}
+        self._lock = threading.Lock()
+
+    def search(
+        self, query: str, *, tags: list[str] | None, limit: int
+    ) -> list[dict[str, str | list[str] | float]]:
+        with self._lock:
+            entries = self._sync()
+            hits = self.search_index.search(query, tags=tags, limit=limit)
+
+        return [
+            {
+                "name": entries[key].name,
+                "description": entries[key].description,
+                "tags": entries[key].tags,
+                "path": str(Path(key).absolute()),
+                "score": score,
+            }
+            for key, score in hits
+        ]
+
+    def _sync(self) -> dict[str, TemplateIndexEntry]:
+        entries = {
+            key: entry
+            for key, entry in self.template_index.entries().items()
+            if not entry.errors
+        }
+        for key in self._synced.keys() - entries.keys():
+            self.search_index.remove(key)
+            del self._synced[key]
+
+        for key, entry in entries.items():
+            if self._synced.get(key) is entry:
+                continue
+            try:
+                content = frontmatter.loads(Path(key).read_text()).content
+            except OSError:
+                content = ""
+            self.search_index.add(
+                key,
+                name=entry.name,
+                description=entry.description,
+                tags=entry.tags,
+                content=content,
+            )
+            self._synced[key] = entry
+
+        return entries
+
+
+_local_searches: dict[int, _LocalTemplateSearch] = {}
+_local_searches_lock = threading.Lock()
+
+
+def _get_local_search(template_index: TemplateIndex) -> _LocalTemplateSearch:
+    with _local_searches_lock:
+        if id(template_index) not in _local_searches:
+            _local_searches[id(template_index)] = _LocalTemplateSearch(template_index)
+        return _local_searches[id(template_index)]
@@ -0,0 +1,392 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+import requests
+from pydantic import ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81ServiceException
+from doc81.core.schema import (
+    TemplateBatchItemSchema,
+    TemplateBatchSchema,
+    TemplateSchema,
+)
+
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_BACKOFF = 0.2
+# Largest batch POST /templates/batch accepts
+BATCH_SIZE = 100
+
+
+@dataclass
+class _CachedTemplate:
+    template: TemplateSchema
+    etag: str | None
+    fresh_until: float
+
+
+class _TemplateCache:
+    """LRU of fetched templates with their ETag and freshness deadline."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._templates: OrderedDict[str, _CachedTemplate] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ref: str) -> _CachedTemplate | None:
+        with self._lock:
+            cached = self._templates.get(ref)
+            if cached:
+                self._templates.move_to_end(ref)
+            return cached
+
+    def put(self, ref: str, template: TemplateSchema, etag: str | None) -> None:
+        if self.ttl <= 0 and not etag:
+            return
+        with self._lock:
+            self._templates[ref] = _CachedTemplate(
+                template, etag, time.monotonic() + self.ttl
+            )
+            self._templates.move_to_end(ref)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+
+class ServerClient:
+    """
+    Keep-alive HTTP client for the doc81 server, shared by the server-mode services.
+
+    Fetched templates are served from memory for `cache_ttl` seconds, then
+    revalidated with If-None-Match so an unchanged template costs a bodiless 304.
+
+    Args:
+        server_url: Base URL of the doc81 REST server.
+        connect_timeout: Seconds to wait for a connection.
+        read_timeout: Seconds to wait for a response once connected.
+        retries: Retries of connection errors and 429/502/503/504 responses, with backoff.
+        pool_size: Connections kept open to the server.
+        cache_ttl: Seconds a fetched template is used without asking the server.
+        cache_max_entries: Least recently used templates are dropped beyond this.
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        *,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        retries: int = 3,
+        pool_size: int = 10,
+        cache_ttl: float = 30.0,
+        cache_max_entries: int = 1024,
+    ):
+        self.server_url = server_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = _TemplateCache(cache_ttl, cache_max_entries)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            # The client only reads; POST is used for batch lookups
+            allowed_methods={"GET", "POST"},
+            # Hand the last response back instead of raising, so it is reported below
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_template(self, ref: str) -> TemplateSchema:
+        """
+        Get a template by id, from memory while it is fresh.
+
+        Raises:
+            Doc81ServiceException: If the template does not exist or the server cannot be reached.
+        """
+        cached = self.cache.get(ref)
+        if cached and cached.fresh_until > time.monotonic():
+            return cached.template
+
+        response = self._request(
+            "GET", f"/templates/{ref}", headers=_conditional(cached)
+        )
+        return _template_from(self.cache, ref, cached, response)
+
+    def get_templates(self, refs: list[str]) -> list[TemplateBatchItemSchema]:
+        """
+        Get several templates by id. Those not fresh in memory are fetched in batches.
+
+        Returns:
+            list[TemplateBatchItemSchema]: One item per ref, with the template or an error.
+
+        Raises:
+            Doc81ServiceException: If the server cannot be reached.
+        """
+        items, missing = _batch_from_cache(self.cache, refs)
+        for start in range(0, len(missing), BATCH_SIZE):
+            response = self._request(
+                "POST",
+                "/templates/batch",
+                json={"refs": missing[start : start + BATCH_SIZE]},
+            )
+            items.update(_batch_from(self.cache, response))
+        return [items[ref] for ref in refs]
+
+    def get_json(self, path: str, params: dict | None = None) -> Any:
+        """
+        GET a path of the server and decode its JSON body.
+
+        Raises:
+            Doc81ServiceException: If the server answers with an error or cannot be reached.
+        """
+        response = self._request("GET", path, params=params)
+        _raise_for_status(response, f"Not found: {path}")
+        return response.json()
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        try:
+            return self.session.request(
+                method, f"{self.server_url}{path}", timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            raise Doc81ServiceException(f"Could not reach {self.server_url}: {e}")
+
+
+class AsyncServerClient:
+    """
+    `ServerClient` for event loops: the same caching and retries over httpx, so
+    concurrent lookups wait on the network together instead of one by one.
+
+    Takes the same arguments as `ServerClient`. Bound to the event loop it is first used in.
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        *,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        retries: int = 3,
+        pool_size: int = 10,
+        cache_ttl: float = 30.0,
+        cache_max_entries: int = 1024,
+    ):
+        self.server_url = server_url.rstrip("/")
+        self.retries = retries
+        self.cache = _TemplateCache(cache_ttl, cache_max_entries)
+        self.client = httpx.AsyncClient(
+            base_url=self.server_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            # Retries failed connection attempts; statuses are retried in _request
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+
+    async def get_template(self, ref: str) -> TemplateSchema:
+        """
+        Get a template by id, from memory while it is fresh.
+
+        Raises:
+            Doc81ServiceException: If the template does not exist or the server cannot be reached.
+        """
+        cached = self.cache.get(ref)
+        if cached and cached.fresh_until > time.monotonic():
+            return cached.template
+
+        response = await self._request(
+            "GET", f"/templates/{ref}", headers=_conditional(cached)
+        )
+        return _template_from(self.cache, ref, cached, response)
+
+    async def get_templates(self, refs: list[str]) -> list[TemplateBatchItemSchema]:
+        """
+        Get several templates by id. Those not fresh in memory are fetched in batches.
+
+        Returns:
+            list[TemplateBatchItemSchema]: One item per ref, with the template or an error.
+
+        Raises:
+            Doc81ServiceException: If the server cannot be reached.
+        """
+        items, missing = _batch_from_cache(self.cache, refs)
+        responses = await asyncio.gather(
+            *(
+                self._request(
+                    "POST",
+                    "/templates/batch",
+                    json={"refs": missing[start : start + BATCH_SIZE]},
+                )
+                for start in range(0, len(missing), BATCH_SIZE)
+            )
+        )
+        for response in responses:
+            items.update(_batch_from(self.cache, response))
+        return [items[ref] for ref in refs]
+
+    async def get_json(self, path: str, params: dict | None = None) -> Any:
+        """
+        GET a path of the server and decode its JSON body.
+
+        Raises:
+            Doc81ServiceException: If the server answers with an error or cannot be reached.
+        """
+        response = await self._request("GET", path, params=params)
+        _raise_for_status(response, f"Not found: {path}")
+        return response.json()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                raise Doc81ServiceException(f"Could not reach {self.server_url}: {e}")
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+
+
+def _conditional(cached: _CachedTemplate | None) -> dict[str, str]:
+    return {"If-None-Match": cached.etag} if cached and cached.etag else {}
+
+
+def _template_from(
+    cache: _TemplateCache,
+    ref: str,
+    cached: _CachedTemplate | None,
+    response: requests.Response | httpx.Response,
+) -> TemplateSchema:
+    if response.status_code == 304 and cached:
+        template = cached.template
+    else:
+        _raise_for_status(response, f"Template not found: {ref}")
+        try:
+            template = TemplateSchema.model_validate_json(response.content)
+        except ValidationError as e:
+            raise Doc81ServiceException(f"Invalid template: {e}")
+
+    cache.put(ref, template, response.headers.get("ETag"))
+    return template
+
+
+def _batch_from_cache(
+    cache: _TemplateCache, refs: list[str]
+) -> tuple[dict[str, TemplateBatchItemSchema], list[str]]:
+    items, missing = {}, []
+    now = time.monotonic()
+    for ref in dict.fromkeys(refs):
+        cached = cache.get(ref)
+        if cached and cached.fresh_until > now:
+            items[ref] = TemplateBatchItemSchema(ref=ref, template=cached.template)
+        else:
+            missing.append(ref)
+    return items, missing
+
+
+def _batch_from(
+    cache: _TemplateCache, response: requests.Response | httpx.Response
+) -> dict[str, TemplateBatchItemSchema]:
+    _raise_for_status(response, "Batch lookups are not supported by the server")
+    try:
+        batch = TemplateBatchSchema.model_validate_json(response.content)
+    except ValidationError as e:
+        raise Doc81ServiceException(f"Invalid templates: {e}")
+
+    for item in batch.results:
+        if item.template:
+            cache.put(item.ref, item.template, None)
+    return {item.ref: item for item in batch.results}
+
+
+def _raise_for_status(
+    response: requests.Response | httpx.Response, not_found: str
+) -> None:
+    if response.status_code == 404:
+        raise Doc81ServiceException(not_found)
+    if response.status_code >= 400:
+        raise Doc81ServiceException(
+            f"{response.status_code} error from {response.url}: {response.text[:200]}"
+        )
+
+
+def _client_options(config: Config) -> dict[str, Any]:
+    return {
+        "connect_timeout": config.server_connect_timeout,
+        "read_timeout": config.server_read_timeout,
+        "retries": config.server_retries,
+        "pool_size": config.server_pool_size,
+        "cache_ttl": config.server_cache_ttl,
+        "cache_max_entries": config.server_cache_max_entries,
+    }
+
+
+_clients: dict[tuple, ServerClient] = {}
+_async_clients: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[tuple, AsyncServerClient]
+] = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_server_client(config: Config | None = None) -> ServerClient:
+    """
+    Get the process-wide client for the server a config points at.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        ServerClient: The client, created on first use.
+    """
+    if not config:
+        config = global_config
+
+    options = _client_options(config)
+    key = (config.server_url, *options.values())
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ServerClient(config.server_url, **options)
+        return _clients[key]
+
+
+def get_async_server_client(config: Config | None = None) -> AsyncServerClient:
+    """
+    Get the running event loop's client for the server a config points at.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        AsyncServerClient: The client, created on first use in this loop.
+    """
+    if not config:
+        config = global_config
+
+    options = _client_options(config)
+    key = (config.server_url, *options.values())
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = AsyncServerClient(config.server_url, **options)
+        return clients[key]
@@ -0,0 +1,370 @@
+import os
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Iterable
+
+import frontmatter
+import yaml
+from pydantic import BaseModel, Field
+
+from doc81.core.config import Config, config as global_config
+from doc81.core.exception import Doc81ConfigException, Doc81ServiceException
+from doc81.core.schema import Doc81Template
+
+
+class TemplateIndexEntry(BaseModel):
+    """Frontmatter of a template file, along with the stat signature it was parsed at."""
+
+    mtime_ns: int
+    size: int
+    name: str | None = None
+    description: str | None = None
+    tags: list[str] = Field(default_factory=list)
+    errors: list[str] = Field(default_factory=list)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+
+class TemplateIndexSnapshot(BaseModel):
+    """On-disk form of a `TemplateIndex`, keyed by path relative to the prompt directory."""
+
+    version: int = 1
+    entries: dict[str, TemplateIndexEntry] = Field(default_factory=dict)
+
+
+class TemplateChange(str, Enum):
+    ADDED = "added"
+    MODIFIED = "modified"
+    DELETED = "deleted"
+
+
+class TemplateIndex:
+    """
+    In-memory index of the templates under a prompt directory.
+
+    Listing walks the directory only when a directory's mtime shows that files were
+    added or removed since the last walk; frontmatter is parsed lazily on lookup and
+    re-parsed only when the file's mtime or size has changed since the last parse.
+
+    While a watcher feeds changes through `apply_changes`, the index is marked as
+    watched and lookups trust it without touching the filesystem.
+    """
+
+    def __init__(self, prompt_dir: Path):
+        self.prompt_dir = prompt_dir
+        self.watched = False
+        self._entries: dict[str, TemplateIndexEntry | None] = {}
+        self._dirty = False
+        # mtime of every directory at the last refresh, None before the first
+        self._directories: dict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """
+        Sync the set of indexed paths with the prompt directory.
+        Entries of files that are gone are dropped, new files are added unparsed.
+        """
+        paths, directories = _scan(self.prompt_dir)
+        with self._lock:
+            for key in self._entries.keys() - paths:
+                if self._entries.pop(key) is not None:
+                    self._dirty = True
+            for key in paths - self._entries.keys():
+                self._entries[key] = None
+            self._directories = directories
+
+    def refresh_if_changed(self) -> None:
+        """
+        `refresh`, unless no directory's mtime changed since the last refresh.
+        Adding, removing or renaming a file changes its directory's mtime, so
+        this costs a stat per directory instead of a walk of the tree.
+        """
+        with self._lock:
+            directories = self._directories
+        if directories is None or any(
+            _mtime_ns(directory) != mtime_ns
+            for directory, mtime_ns in directories.items()
+        ):
+            self.refresh()
+
+    def apply_changes(self, changes: Iterable[tuple[TemplateChange, str]]) -> None:
+        """
+        Apply filesystem changes under the prompt directory as deltas.
+
+        Args:
+            changes: Pairs of change kind and changed path. Paths may be files or directories.
+        """
+        with self._lock:
+            for change, path in changes:
+                key = self._key_for(path)
+                if change == TemplateChange.DELETED:
+                    prefix = key + os.sep
+                    for stale in [k for k in self._entries if k.startswith(prefix)]:
+                        del self._entries[stale]
+                    self._entries.pop(key, None)
+                    self._dirty = True
+                elif Path(key).is_dir():
+                    for child in Path(key).glob("**/*.md"):
+                        self._entries[str(child)] = None
+                elif key.endswith(".md"):
+                    self._entries[key] = None
+
+    def list_paths(self) -> list[str]:
+        if not self.watched:
+            self.refresh_if_changed()
+        with self._lock:
+            return sorted(self._entries)
+
+    def get(self, path: str) -> Doc81Template:
+        """
+        Get the template at `path`, relative to the prompt directory or absolute.
+
+        Raises:
+            Doc81ServiceException: If the template does not exist or its frontmatter is invalid.
+        """
+        ppath = Path(self.prompt_dir / path)
+        try:
+            entry = self._entry_for(ppath)
+        except (FileNotFoundError, NotADirectoryError):
+            raise Doc81ServiceException(f"Template not found: {path}")
+
+        return _to_template(entry, ppath)
+
+    def parse_all(self) -> None:
+        """Parse every indexed file that has not been parsed yet."""
+        with self._lock:
+            unparsed = [key for key, entry in self._entries.items() if entry is None]
+
+        for key in unparsed:
+            try:
+                self._entry_for(Path(key))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def entries(self) -> dict[str, TemplateIndexEntry]:
+        """
+        Get the parsed entries of every template under the prompt directory.
+
+        Entries are replaced, never mutated, when a file changes, so callers can tell
+        whether a template changed since they last saw it by identity.
+        """
+        if self.watched:
+            self.parse_all()
+        else:
+            self.refresh_if_changed()
+            with self._lock:
+                keys = list(self._entries)
+            for key in keys:
+                try:
+                    self._entry_for(Path(key))
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+
+        with self._lock:
+            return {
+                key: entry for key, entry in self._entries.items() if entry is not None
+            }
+
+    def load(self, cache_path: Path) -> None:
+        """
+        Seed the index from a snapshot written by `save`.
+        Entries whose file no longer matches the recorded mtime and size are skipped.
+        """
+        try:
+            snapshot = TemplateIndexSnapshot.model_validate_json(
+                cache_path.read_bytes()
+            )
+        except (OSError, ValueError):
+            return
+
+        entries = {}
+        for relpath, entry in snapshot.entries.items():
+            ppath = self.prompt_dir / relpath
+            try:
+                stat = ppath.stat()
+            except OSError:
+                continue
+            if entry.matches(stat):
+                entries[str(ppath)] = entry
+
+        with self._lock:
+            for key, entry in entries.items():
+                if self._entries.get(key) is None:
+                    self._entries[key] = entry
+            if len(entries) < len(snapshot.entries):
+                self._dirty = True
+
+    def save(self, cache_path: Path) -> None:
+        """Write the parsed entries to `cache_path` if anything changed since the last load or save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = TemplateIndexSnapshot(
+                entries={
+                    str(Path(key).relative_to(self.prompt_dir)): entry
+                    for key, entry in self._entries.items()
+                    if entry is not None and Path(key).is_relative_to(self.prompt_dir)
+                }
+            )
+            self._dirty = False
+
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(snapshot.model_dump_json(exclude_defaults=True))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # A read-only prompt directory only costs us the warm start
+            tmp_path.unlink(missing_ok=True)
+
+    def _entry_for(self, ppath: Path) -> TemplateIndexEntry:
+        key = str(ppath)
+        if self.watched:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+        try:
+            stat = ppath.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+            raise
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not entry.matches(stat):
+            entry = _parse_entry(ppath, stat)
+            with self._lock:
+                self._entries[key] = entry
+                self._dirty = True
+
+        return entry
+
+    def _key_for(self, path: str) -> str:
+        """Map a path reported by a watcher onto the key `refresh` would use for it."""
+        try:
+            return str(
+                self.prompt_dir / Path(path).relative_to(self.prompt_dir.absolute())
+            )
+        except ValueError:
+            return path
+
+
+def _scan(prompt_dir: Path) -> tuple[set[str], dict[str, int]]:
+    """Paths of the templates under `prompt_dir`, and the mtime of every directory."""
+    paths = set()
+    directories = {}
+    for root, _, files in os.walk(prompt_dir):
+        mtime_ns = _mtime_ns(root)
+        if mtime_ns is None:
+            continue
+        directories[root] = mtime_ns
+        paths.update(os.path.join(root, name) for name in files if name.endswith(".md"))
+    return paths, directories
+
+
+def _mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _to_template(entry: TemplateIndexEntry, ppath: Path) -> Doc81Template:
+    if entry.errors:
+        raise Doc81ServiceException("\n".join(entry.errors))
+
+    return Doc81Template(
+        name=entry.name,
+        description=entry.description,
+        tags=entry.tags,
+        path=str(ppath.absolute()),
+    )
+
+
+def _parse_entry(ppath: Path, stat: os.stat_result) -> TemplateIndexEntry:
+    with open(ppath, "r") as f:
+        content = f.read()
+
+    try:
+        frontmatter_data = frontmatter.loads(content)
+    except yaml.YAMLError as e:
+        return TemplateIndexEntry(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            errors=[f"Invalid frontmatter in {ppath}: {e}"],
+        )
+
+    errors = []
+    if not frontmatter_data.get("name"):
+        errors.append(f"Template name is required in {ppath}")
+
+    if not frontmatter_data.get("description"):
+        errors.append(f"Template description is required in {ppath}")
+
+    return TemplateIndexEntry(
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        name=frontmatter_data.get("name"),
+        description=frontmatter_data.get("description"),
+        tags=frontmatter_data.get("tags", []),
+        errors=errors,
+    )
+
+
+DEFAULT_INDEX_CACHE_NAME = ".doc81-index.json"
+
+_indexes: dict[Path, TemplateIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_template_index(config: Config | None = None) -> TemplateIndex:
+    """
+    Get the shared template index for the config's prompt directory.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        TemplateIndex: The index, created on first use.
+    """
+    if not config:
+        config = global_config
+
+    if config.prompt_dir is None:
+        raise Doc81ConfigException("prompt_dir is required in local mode")
+
+    prompt_dir = config.prompt_dir.absolute()
+    with _indexes_lock:
+        if prompt_dir not in _indexes:
+            _indexes[prompt_dir] = TemplateIndex(config.prompt_dir)
+        return _indexes[prompt_dir]
+
+
+def warm_template_index(config: Config | None = None) -> TemplateIndex:
+    """
+    Bring the shared template index fully up to date, starting from the on-disk
+    snapshot so only templates that changed since the last run are parsed.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        TemplateIndex: The warmed index.
+    """
+    if not config:
+        config = global_config
+
+    index = get_template_index(config)
+    cache_path = config.index_cache_path or (
+        config.prompt_dir / DEFAULT_INDEX_CACHE_NAME
+    )
+    index.load(cache_path)
+    index.refresh()
+    index.parse_all()
+    index.save(cache_path)
+    return index
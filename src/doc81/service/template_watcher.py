@@ -0,0 +1,157 @@
+import os
+import threading
+from pathlib import Path
+
+from doc81.core.config import Config, config as global_config
+from doc81.service.template_index import (
+    TemplateChange,
+    TemplateIndex,
+    get_template_index,
+)
+
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
+
+class TemplateIndexWatcher:
+    """
+    Keep a `TemplateIndex` in sync with its prompt directory from a background thread.
+
+    Uses `watchfiles` (inotify on Linux) when it is installed, and otherwise polls the
+    directory every `poll_interval` seconds, diffing stat signatures into the same deltas.
+    """
+
+    def __init__(
+        self,
+        index: TemplateIndex,
+        *,
+        poll_interval: float = 1.0,
+        force_polling: bool = False,
+    ):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.force_polling = force_polling or watchfiles is None
+        self._stop_event = threading.Event()
+        self._started = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._started.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="doc81-template-watcher", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+
+        self.index.watched = False
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        try:
+            if self.force_polling:
+                self._poll()
+            else:
+                self._watch()
+        finally:
+            # A watcher that died must not leave lookups trusting a stale index
+            self.index.watched = False
+            self._started.set()
+
+    def _subscribed(self) -> None:
+        # Index the current state only now: anything that changes from here on
+        # reaches the index as a delta, so nothing falls between the two
+        self.index.refresh()
+        self.index.watched = True
+        self._started.set()
+
+    def _watch(self) -> None:
+        change_kinds = {
+            watchfiles.Change.added: TemplateChange.ADDED,
+            watchfiles.Change.modified: TemplateChange.MODIFIED,
+            watchfiles.Change.deleted: TemplateChange.DELETED,
+        }
+        # watchfiles subscribes when iteration starts, and yields on timeout even
+        # without changes, so the first iteration marks the subscription
+        for changes in watchfiles.watch(
+            self.index.prompt_dir,
+            stop_event=self._stop_event,
+            yield_on_timeout=True,
+            rust_timeout=int(self.poll_interval * 1000),
+            debounce=50,
+            step=10,
+        ):
+            self.index.apply_changes(
+                (change_kinds[change], path) for change, path in changes
+            )
+            if not self._started.is_set():
+                self._subscribed()
+
+    def _poll(self) -> None:
+        snapshot = _scan(self.index.prompt_dir)
+        self._subscribed()
+        while not self._stop_event.wait(self.poll_interval):
+            current = _scan(self.index.prompt_dir)
+            changes = [
+                (TemplateChange.DELETED, path) for path in snapshot.keys() - current
+            ]
+            for path, signature in current.items():
+                if path not in snapshot:
+                    changes.append((TemplateChange.ADDED, path))
+                elif snapshot[path] != signature:
+                    changes.append((TemplateChange.MODIFIED, path))
+
+            if changes:
+                self.index.apply_changes(changes)
+            snapshot = current
+
+
+def _scan(prompt_dir: Path) -> dict[str, tuple[int, int]]:
+    signatures = {}
+    for path in prompt_dir.glob("**/*.md"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signatures[str(path)] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+_watchers: dict[int, TemplateIndexWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def start_template_watcher(config: Config | None = None) -> TemplateIndexWatcher:
+    """
+    Start watching the config's prompt directory, keeping its shared template index in sync.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        TemplateIndexWatcher: The running watcher. Starting twice returns the same watcher.
+    """
+    if not config:
+        config = global_config
+
+    index = get_template_index(config)
+    with _watchers_lock:
+        watcher = _watchers.get(id(index))
+        if watcher is None:
+            watcher = TemplateIndexWatcher(
+                index, poll_interval=config.watch_poll_interval
+            )
+            _watchers[id(index)] = watcher
+        watcher.start()
+        return watcher
@@ -1,10 +1,22 @@
-from typing import Any, Literal, Optional
+import io
+import os
+import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import cache
+from itertools import islice
+from pathlib import Path
+from typing import Any, Literal
 
 import mistune
 import mistune.renderers
 import mistune.renderers.markdown
 from pydantic import BaseModel
 
+from doc81.core.config import Config
+from doc81.service.templatify_cache import get_templatify_cache, templatify_cache_key
+
 
 class TemplatifyFrontmatter(BaseModel):
     name: str
@@ -27,177 +39,446 @@ def templatify(
     verbosity: Literal["full", "compact", "outline"] = "full",
     frontmatter_dict: dict[str, str | list[str]] | None = None,
     preserve_headings: bool = True,
+    config: Config | None = None,
 ) -> str:
     """
     Templatify a markdown file.
 
+    Results are cached by a hash of the input and the options, so templatifying a
+    document seen before does not parse it again.
+
     Args:
         md_text: The raw markdown file.
         token_style: The style of tokens to use. "bracket" for [Item 1], [Item 2], etc. "curly" for {{Item 1}}, {{Item 2}}, etc.
         verbosity: The verbosity of the output. "full" for full output, "compact" for compact output, "outline" for outline output.
         frontmatter_dict: The dictionary of frontmatter variables.
         preserve_headings: Whether to preserve heading content or replace with tokens.
+        config: The config object. If not provided, the global config will be used.
 
     Returns:
         str: The templatified markdown file.
     """
+    cache = get_templatify_cache(config)
+    if cache is None:
+        return _templatify(
+            md_text, token_style, verbosity, frontmatter_dict, preserve_headings
+        )
+
+    key = templatify_cache_key(
+        md_text,
+        token_style=token_style,
+        verbosity=verbosity,
+        frontmatter_dict=frontmatter_dict,
+        preserve_headings=preserve_headings,
+    )
+    result = cache.get(key)
+    if result is None:
+        result = _templatify(
+            md_text, token_style, verbosity, frontmatter_dict, preserve_headings
+        )
+        cache.put(key, result)
+    return result
+
+
+def templatify_many(
+    documents: Iterable[str | Path],
+    *,
+    workers: int | None = None,
+    chunksize: int = 64,
+    token_style: Literal["bracket", "curly"] = "bracket",
+    verbosity: Literal["full", "compact", "outline"] = "full",
+    preserve_headings: bool = True,
+    config: Config | None = None,
+) -> Iterator[str]:
+    """
+    Templatify many markdown documents on a process pool.
+
+    Documents are sent to the workers in chunks, and results are yielded in input
+    order as they complete. Only a few chunks per worker are in flight at a time, so
+    memory stays flat however long `documents` is.
+
+    Args:
+        documents: Markdown text, or paths of markdown files, which the workers read.
+        workers: Number of processes. Defaults to the number of CPUs; 1 runs in this
+            process.
+        chunksize: Documents sent to a worker at a time.
+        token_style: See `templatify`.
+        verbosity: See `templatify`.
+        preserve_headings: See `templatify`.
+        config: The config object. If not provided, the global config will be used.
+
+    Yields:
+        str: The templatified documents, in the order of `documents`.
+    """
+    options = {
+        "token_style": token_style,
+        "verbosity": verbosity,
+        "preserve_headings": preserve_headings,
+        "config": config,
+    }
+    documents = iter(documents)
+    chunks = iter(lambda: list(islice(documents, chunksize)), [])
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from _templatify_chunk(chunk, options)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: deque[Future[list[str]]] = deque()
+        try:
+            for chunk in chunks:
+                in_flight.append(pool.submit(_templatify_chunk, chunk, options))
+                if len(in_flight) >= 2 * workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            # Stopped early: don't wait on chunks nobody will read
+            for future in in_flight:
+                future.cancel()
+
+
+def templatify_stream(
+    md_text: str | Iterable[str],
+    *,
+    token_style: Literal["bracket", "curly"] = "bracket",
+    verbosity: Literal["full", "compact", "outline"] = "full",
+    frontmatter_dict: dict[str, str | list[str]] | None = None,
+    preserve_headings: bool = True,
+    chunk_chars: int = 64 * 1024,
+) -> Iterator[str]:
+    """
+    Templatify a markdown document piece by piece, for documents too large to hold
+    several copies of in memory.
+
+    The input is split at blank lines between top-level blocks once about
+    `chunk_chars` have been read, and each piece is parsed, rewritten and rendered on
+    its own. Token numbering carries over between pieces, so the joined output
+    matches `templatify`. Reference-style links whose definition comes in a later
+    piece are not resolved.
+
+    Args:
+        md_text: The raw markdown, or its lines, e.g. an open file.
+        token_style: See `templatify`.
+        verbosity: See `templatify`.
+        frontmatter_dict: See `templatify`.
+        preserve_headings: See `templatify`.
+        chunk_chars: Approximate size of the pieces the input is split into.
+
+    Yields:
+        str: Consecutive chunks of the templatified markdown.
+    """
+    if isinstance(md_text, str):
+        md_text = io.StringIO(md_text)
+
+    ctx = _context(token_style, verbosity, frontmatter_dict, preserve_headings)
+    yield from _templatify_blocks(_split_blocks(md_text, chunk_chars), ctx)
+
+
+def templatify_sections(
+    sections: Iterable[str],
+    *,
+    token_style: Literal["bracket", "curly"] = "bracket",
+    verbosity: Literal["full", "compact", "outline"] = "full",
+    preserve_headings: bool = True,
+) -> list[str]:
+    """
+    Templatify consecutive sections of one document, each on its own.
+
+    Token numbering carries over from one section to the next, as if the whole
+    document were templatified. Sections must split the document between blocks.
+
+    Args:
+        sections: The raw markdown of each section, in document order.
+        token_style: See `templatify`.
+        verbosity: See `templatify`.
+        preserve_headings: See `templatify`.
+
+    Returns:
+        list[str]: The templatified markdown of each section, ending in one newline.
+    """
+    ctx = _context(token_style, verbosity, None, preserve_headings)
+    return ["".join(_templatify_blocks([section], ctx)) for section in sections]
+
 
+def _templatify_chunk(
+    documents: list[str | Path], options: dict[str, Any]
+) -> list[str]:
+    return [
+        templatify(
+            document.read_text() if isinstance(document, Path) else document,
+            **options,
+        )
+        for document in documents
+    ]
+
+
+@cache
+def _markdown_parser() -> mistune.Markdown:
+    # Parsing state lives in a BlockState made per call, so one parser can be shared
+    # by every call and thread
+    return mistune.create_markdown(renderer="ast", plugins=["strikethrough", "table"])
+
+
+class _Placeholder:
+    """
+    A token such as [Paragraph 1] in the rewritten AST.
+
+    Much lighter than the block_text/text dict pair it stands for, and rendered
+    verbatim. It answers the dict lookups the markdown renderer makes on every node.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "type":
+            return "placeholder"
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return "placeholder" if key == "type" else default
+
+    # The list renderer attaches layout hints to its items; placeholders need none
+    def __setitem__(self, key: str, value: Any) -> None:
+        pass
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        return default
+
+
+class _TemplateRenderer(mistune.renderers.markdown.MarkdownRenderer):
+    def placeholder(self, token: _Placeholder, state: mistune.BlockState) -> str:
+        return token.text + "\n"
+
+
+@cache
+def _markdown_renderer() -> _TemplateRenderer:
+    # Stateless as well: rendering state is passed in
+    return _TemplateRenderer()
+
+
+def _templatify(
+    md_text: str,
+    token_style: Literal["bracket", "curly"],
+    verbosity: Literal["full", "compact", "outline"],
+    frontmatter_dict: dict[str, str | list[str]] | None,
+    preserve_headings: bool,
+) -> str:
+    ctx = _context(token_style, verbosity, frontmatter_dict, preserve_headings)
+    return "".join(_templatify_blocks([md_text], ctx))
+
+
+def _context(
+    token_style: Literal["bracket", "curly"],
+    verbosity: Literal["full", "compact", "outline"],
+    frontmatter_dict: dict[str, str | list[str]] | None,
+    preserve_headings: bool,
+) -> TemplatifyContext:
     if frontmatter_dict:
         frontmatter_dict = TemplatifyFrontmatter(**frontmatter_dict)
 
-    md = mistune.create_markdown(renderer="ast", plugins=["strikethrough", "table"])
-    ast = md(md_text)
-    ctx = TemplatifyContext(
+    return TemplatifyContext(
         token_style=token_style,
         verbosity=verbosity,
         frontmatter_dict=frontmatter_dict,
         preserve_headings=preserve_headings,
     )
 
-    templated_ast = [_rewrite(node, ctx) for node in ast if node is not None]
-    templated_ast = [node for node in templated_ast if node is not None]
-    result = _render(templated_ast, ctx)
+
+def _templatify_blocks(blocks: Iterable[str], ctx: TemplatifyContext) -> Iterator[str]:
+    # Trailing whitespace is held back until more output follows, so the last chunk
+    # ends in exactly one newline, as a whole-document render does
+    pending = ""
+    for block in blocks:
+        templated_ast: list[Any] = []
+        for node in _markdown_parser()(block):
+            _rewrite(node, ctx, templated_ast)
+
+        out = pending + _render(templated_ast, ctx)
+        content = out.rstrip()
+        pending = out[len(content) :]
+        if content:
+            yield content
 
     # Ensure result ends with a newline
-    if not result.endswith("\n"):
-        result += "\n"
+    pending += "\n"
+    yield pending[: pending.index("\n")] + "\n"
+
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+# HTML blocks that, unlike other blocks, run on past blank lines until their end marker
+_RAW_HTML = re.compile(
+    r"^ {0,3}(?:<(script|pre|style|textarea)[\s>]|<!--|<\?|<![A-Za-z]|<!\[CDATA\[)",
+    re.IGNORECASE,
+)
+_RAW_HTML_END = {"<!--": "-->", "<?": "?>", "<![CDATA[": "]]>"}
+# Lines that may continue the block before a blank line: indented content and list items
+_CONTINUATION = re.compile(r"^(\s|[-*+]\s|\d{1,9}[.)]\s)")
+
+
+def _split_blocks(lines: Iterable[str], chunk_chars: int) -> Iterator[str]:
+    block: list[str] = []
+    size = 0
+    fence = html_end = None
+    after_blank = False
+
+    for line in lines:
+        if fence:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+        elif html_end:
+            if html_end in line.lower():
+                html_end = None
+        elif line.strip():
+            if after_blank and size >= chunk_chars and not _CONTINUATION.match(line):
+                yield "".join(block)
+                block, size = [], 0
+            if match := _FENCE.match(line):
+                fence = match.group(1)
+            elif match := _RAW_HTML.match(line):
+                html_end = _raw_html_end(match)
+                # The end marker may be on the opening line itself
+                if html_end in line[match.end() :].lower():
+                    html_end = None
+        after_blank = not line.strip() and not fence and not html_end
+
+        block.append(line)
+        size += len(line)
+
+    if block:
+        yield "".join(block)
+
+
+def _raw_html_end(match: re.Match) -> str:
+    if match.group(1):
+        return f"</{match.group(1).lower()}>"
+    opening = match.group(0).lstrip()
+    for start, end in _RAW_HTML_END.items():
+        if opening.startswith(start):
+            return end
+    return ">"
+
+
+def _rewrite(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]) -> None:
+    """
+    Append the rewritten form of `node`, if any, to `out`.
 
-    return result
+    Each node is visited once. The parser's nodes are never modified: a node whose
+    children change is copied, and untouched subtrees are shared.
+    """
+    rewrite = _REWRITERS.get(node["type"])
+    if rewrite is not None:
+        rewrite(node, ctx, out)
+    elif "children" in node:
+        # Process other node types recursively
+        out.append(_with_rewritten_children(node, ctx))
+    else:
+        out.append(node)
 
 
-def _rewrite(node: dict[str, Any], ctx: TemplatifyContext) -> Optional[dict[str, Any]]:
-    if node is None:
-        return None
-
-    type_ = node["type"]
-
-    match type_:
-        case "heading":
-            level = node.get("attrs", {}).get("level", 1)
-            if ctx.verbosity == "outline" and level > 3:
-                return None  # prune deep headings
-
-            # Always preserve headings content
-            if ctx.preserve_headings:
-                node["children"] = [
-                    _rewrite(c, ctx) for c in node.get("children", []) if c is not None
-                ]
-                return node
-            else:
-                # Optional: replace heading content with tokens
-                return _make_token(f"Heading{level}", ctx)
-
-        case "paragraph":
-            # Check if paragraph contains only text or has complex content
-            has_other_than_text = any(
-                c["type"] != "text" for c in node.get("children", [])
-            )
-
-            # Replace simple paragraphs with tokens
-            if not has_other_than_text:
-                return _make_token("Paragraph", ctx)
-
-            # Process complex paragraphs recursively
-            node["children"] = [
-                _rewrite(c, ctx) for c in node.get("children", []) if c is not None
-            ]
-            return node
-
-        case "list":
-            # Process list items
-            processed_children = []
-            for child in node.get("children", []):
-                if child["type"] == "list_item":
-                    # Replace list items with tokens
-                    processed_children.append(_make_token("Item", ctx))
-                else:
-                    # Process other list elements
-                    processed_child = _rewrite(child, ctx)
-                    if processed_child:
-                        processed_children.append(processed_child)
-
-            node["children"] = processed_children
-            return node
-
-        case "list_item":
-            # Process nested lists within list items
-            has_nested_list = any(c["type"] == "list" for c in node.get("children", []))
-
-            if has_nested_list:
-                # Process children to handle nested lists
-                node["children"] = [
-                    _rewrite(c, ctx) for c in node.get("children", []) if c is not None
-                ]
-                return node
-            else:
-                # Replace simple list items with tokens
-                return _make_token("Item", ctx)
-
-        case "block_code":
-            # Create a simple block text node with code fence
-            token_text = _create_code_token_text("Code", ctx)
-            return {
-                "type": "block_text",
-                "children": [{"type": "text", "raw": f"```\n{token_text}\n```"}],
-            }
-
-        case "image":
-            return _make_token("Image", ctx)
-
-        case "link":
-            return _make_token("Link", ctx)
-
-        case "table" | "block_quote":
-            return _make_token(type_.capitalize(), ctx)
-
-        case "blank_line":
-            return {"type": "blank_line"}
-
-        case _:
-            # Process other node types recursively
-            if "children" in node:
-                node["children"] = [
-                    _rewrite(c, ctx) for c in node.get("children", []) if c is not None
-                ]
-            return node
-
-
-def _make_token(token_type: str, ctx: TemplatifyContext) -> dict[str, Any]:
-    if token_type not in ctx.counters:
-        ctx.counters[token_type] = 0
-
-    ctx.counters[token_type] += 1
-    token_text = f"{token_type} {ctx.counters[token_type]}"
+def _rewrite_heading(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+    level = node.get("attrs", {}).get("level", 1)
+    if ctx.verbosity == "outline" and level > 3:
+        return  # prune deep headings
 
-    if ctx.token_style == "curly":
-        token_text = f"{{{{{token_text}}}}}"
+    # Always preserve headings content
+    if ctx.preserve_headings:
+        out.append(_with_rewritten_children(node, ctx))
     else:
-        token_text = f"[{token_text}]"
+        # Optional: replace heading content with tokens
+        out.append(_make_token(f"Heading{level}", ctx))
 
-    return {
-        "type": "block_text",
-        "children": [
-            {"type": "text", "raw": token_text},
-        ],
-    }
+
+def _rewrite_paragraph(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+    children = node.get("children", [])
+    for i, child in enumerate(children):
+        if child["type"] != "text":
+            break
+    else:
+        # Replace simple paragraphs with tokens
+        out.append(_make_token("Paragraph", ctx))
+        return
+
+    # Process complex paragraphs recursively; the leading text nodes just seen
+    # rewrite to themselves
+    rewritten = children[:i]
+    for child in children[i:]:
+        _rewrite(child, ctx, rewritten)
+    out.append({**node, "children": rewritten})
+
+
+def _rewrite_list(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+    children: list[Any] = []
+    for child in node.get("children", []):
+        if child["type"] == "list_item":
+            # Replace list items with tokens
+            children.append(_make_token("Item", ctx))
+        else:
+            # Process other list elements
+            _rewrite(child, ctx, children)
+    out.append({**node, "children": children})
+
+
+def _rewrite_list_item(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+    # Only keep list items that contain nested lists. This looks at the children's
+    # types without visiting them, so nothing is rewritten twice.
+    if any(c["type"] == "list" for c in node.get("children", [])):
+        out.append(_with_rewritten_children(node, ctx))
+    else:
+        out.append(_make_token("Item", ctx))
+
+
+def _rewrite_block_code(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+    out.append(_Placeholder(f"```\n{_token_text('Code', ctx)}\n```"))
+
+
+def _replace_with(token_type: str):
+    def rewrite(node: dict[str, Any], ctx: TemplatifyContext, out: list[Any]):
+        out.append(_make_token(token_type, ctx))
+
+    return rewrite
 
 
-def _create_code_token_text(token_type: str, ctx: TemplatifyContext) -> str:
-    """Helper function to create code token text."""
-    if token_type not in ctx.counters:
-        ctx.counters[token_type] = 0
+_REWRITERS = {
+    "heading": _rewrite_heading,
+    "paragraph": _rewrite_paragraph,
+    "list": _rewrite_list,
+    "list_item": _rewrite_list_item,
+    "block_code": _rewrite_block_code,
+    "image": _replace_with("Image"),
+    "link": _replace_with("Link"),
+    "table": _replace_with("Table"),
+    "block_quote": _replace_with("Block_quote"),
+}
 
-    ctx.counters[token_type] += 1
 
-    # Create the token text
-    token_text = f"{token_type} {ctx.counters[token_type]}"
+def _with_rewritten_children(
+    node: dict[str, Any], ctx: TemplatifyContext
+) -> dict[str, Any]:
+    children: list[Any] = []
+    for child in node.get("children", []):
+        _rewrite(child, ctx, children)
+    return {**node, "children": children}
+
+
+def _make_token(token_type: str, ctx: TemplatifyContext) -> _Placeholder:
+    return _Placeholder(_token_text(token_type, ctx))
+
+
+def _token_text(token_type: str, ctx: TemplatifyContext) -> str:
+    count = ctx.counters.get(token_type, 0) + 1
+    ctx.counters[token_type] = count
 
     if ctx.token_style == "curly":
-        return f"{{{{{token_text}}}}}"  # → {{Code 1}}
-    else:
-        return f"[{token_text}]"  # → [Code 1]
+        return f"{{{{{token_type} {count}}}}}"  # → {{Code 1}}
+    return f"[{token_type} {count}]"  # → [Code 1]
 
 
-def _render(ast: list[dict[str, Any]], ctx: TemplatifyContext) -> str:
-    renderer = mistune.renderers.markdown.MarkdownRenderer()
-    return renderer(ast, state=mistune.BlockState())
+def _render(ast: list[Any], ctx: TemplatifyContext) -> str:
+    return _markdown_renderer().render_tokens(ast, mistune.BlockState())
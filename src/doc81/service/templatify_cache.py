@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from doc81.core.config import Config, config as global_config
+
+# Bump whenever templatify's output for the same input changes, so disk entries
+# written by older versions are not served
+TEMPLATIFY_CACHE_VERSION = 2
+
+
+def templatify_cache_key(md_text: str, **options: Any) -> str:
+    """
+    Content address of a templatify call: a hash of the input and every option.
+
+    Args:
+        md_text: The raw markdown.
+        **options: The templatify options, e.g. token_style and verbosity.
+
+    Returns:
+        str: Hex sha256 digest.
+    """
+    payload = json.dumps(
+        [TEMPLATIFY_CACHE_VERSION, md_text, options], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class TemplatifyCache:
+    """
+    Size-bounded LRU of templatify results, with an optional directory of results
+    shared between processes.
+
+    Args:
+        max_bytes: Upper bound on the size of the results kept in memory.
+        cache_dir: Also store results here and look them up on a memory miss.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: Path | None = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.size = 0
+        self._results: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        result = self._read(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: str) -> None:
+        self._remember(key, result)
+        self._write(key, result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _remember(self, key: str, result: str) -> None:
+        size = len(result.encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return
+            self._results[key] = result
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self.size -= len(evicted.encode())
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.md"
+
+    def _read(self, key: str) -> str | None:
+        if self.cache_dir is None:
+            return None
+        try:
+            return self._path(key).read_text()
+        except OSError:
+            return None
+
+    def _write(self, key: str, result: str) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(result)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is an optimization; a read-only or full disk is not an error
+            tmp_path.unlink(missing_ok=True)
+
+
+_caches: dict[tuple[int, Path | None], TemplatifyCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_templatify_cache(config: Config | None = None) -> TemplatifyCache | None:
+    """
+    Get the process-wide templatify cache for a config.
+
+    Args:
+        config: The config object. If not provided, the global config will be used.
+
+    Returns:
+        TemplatifyCache | None: The cache, or None if caching is turned off.
+    """
+    if not config:
+        config = global_config
+
+    if config.templatify_cache_max_bytes <= 0 and config.templatify_cache_dir is None:
+        return None
+
+    key = (config.templatify_cache_max_bytes, config.templatify_cache_dir)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = TemplatifyCache(*key)
+        return _caches[key]
@@ -1,7 +1,12 @@
-from doc81.service.templatify import templatify
+from doc81.core.config import Config
+from doc81.service import templatify as templatify_module
+from doc81.service.templatify import templatify, templatify_many, templatify_stream
+from doc81.service.templatify_cache import TemplatifyCache
 
 
+import copy
 import textwrap
+from itertools import islice
 
 D = textwrap.dedent
 
@@ -218,3 +223,145 @@ def test_counter_independence_between_types():
         - [Item 1]
     """)
     assert templatify(raw) == expected
+
+
+# ---------------------------------------------------------------------------
+# Result cache
+# ---------------------------------------------------------------------------
+def _count_parses(monkeypatch) -> list[str]:
+    parsed = []
+    real_templatify = templatify_module._templatify
+
+    def _templatify(md_text, *args):
+        parsed.append(md_text)
+        return real_templatify(md_text, *args)
+
+    monkeypatch.setattr(templatify_module, "_templatify", _templatify)
+    return parsed
+
+
+def test_cache_reuses_results_per_input_and_options(monkeypatch):
+    parsed = _count_parses(monkeypatch)
+    config = Config(templatify_cache_max_bytes=1024 * 1024)
+    raw = "# Title\n\nA cached paragraph.\n"
+
+    first = templatify(raw, config=config)
+    assert templatify(raw, config=config) == first
+    assert templatify(raw, token_style="curly", config=config) != first
+    assert parsed == [raw, raw]
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TemplatifyCache(max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.get("a")
+    cache.put("c", "12345")
+
+    assert cache.get("a") == "12345"
+    assert cache.get("b") is None
+    assert cache.size == 10
+
+
+def test_cache_disk_tier_is_shared(monkeypatch, tmp_path):
+    parsed = _count_parses(monkeypatch)
+    raw = "# Title\n\nA paragraph on disk.\n"
+
+    first = templatify(raw, config=Config(templatify_cache_dir=tmp_path))
+    # A different memory budget makes a separate cache, like another process would
+    other = Config(templatify_cache_dir=tmp_path, templatify_cache_max_bytes=1)
+    assert templatify(raw, config=other) == first
+    assert parsed == [raw]
+
+
+# ---------------------------------------------------------------------------
+# Batch templatify
+# ---------------------------------------------------------------------------
+def test_templatify_many_keeps_input_order(tmp_path):
+    texts = [f"# Doc {i}\n\nParagraph {i}.\n" for i in range(10)]
+    (tmp_path / "last.md").write_text("# Last\n\nFrom a file.\n")
+    documents = [*texts, tmp_path / "last.md"]
+
+    results = list(templatify_many(documents, workers=2, chunksize=3))
+
+    assert results == [templatify(text) for text in texts] + [
+        "# Last\n\n[Paragraph 1]\n"
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Streaming templatify
+# ---------------------------------------------------------------------------
+def test_templatify_stream_matches_templatify(tmp_path):
+    raw = D("""\
+        # Changelog
+
+        Intro paragraph.
+
+        ```
+        code
+
+        with a blank line
+        ```
+
+        - one
+
+        - two
+
+        <!-- a comment
+
+        spanning blank lines -->
+
+        Closing paragraph.
+    """)
+    path = tmp_path / "changelog.md"
+    path.write_text(raw)
+
+    with path.open() as f:
+        chunks = list(templatify_stream(f, chunk_chars=1))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == templatify(raw)
+
+
+def test_templatify_stream_is_lazy():
+    def endless():
+        while True:
+            yield "A paragraph.\n"
+            yield "\n"
+
+    chunks = templatify_stream(endless(), chunk_chars=1)
+    assert list(islice(chunks, 3)) == [
+        "[Paragraph 1]",
+        "\n[Paragraph 2]",
+        "\n[Paragraph 3]",
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Rewriter
+# ---------------------------------------------------------------------------
+def test_rewrite_leaves_parsed_ast_untouched():
+    raw = D("""\
+        # Title
+
+        Text with a [link](https://example.com).
+
+        - Item
+          - Nested
+
+        ```
+        code
+        ```
+    """)
+    ast = templatify_module._markdown_parser()(raw)
+    snapshot = copy.deepcopy(ast)
+
+    for _ in range(2):
+        ctx = templatify_module._context("bracket", "full", None, True)
+        out = []
+        for node in ast:
+            templatify_module._rewrite(node, ctx, out)
+        templatify_module._render(out, ctx)
+
+    assert ast == snapshot
@@ -22,3 +22,21 @@ def test_setup_should_create_claude_rule_file():
     result = runner.invoke(app, ["setup", "--mode", "claude"])
     assert result.exit_code == 0
     assert "Setting up claude..." in result.stdout
+
+
+def test_templatify_should_mirror_directory_into_output_dir(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "guides").mkdir(parents=True)
+    (docs / "readme.md").write_text("# Readme\n\nSome text.\n")
+    (docs / "guides" / "setup.md").write_text("# Setup\n\nMore text.\n")
+
+    result = runner.invoke(
+        app,
+        ["templatify", str(docs), "--output-dir", str(tmp_path / "out")],
+    )
+
+    assert result.exit_code == 0
+    assert "Templatified 2 files" in result.stdout
+    assert (tmp_path / "out" / "guides" / "setup.md").read_text() == (
+        "# Setup\n\n[Paragraph 1]\n"
+    )
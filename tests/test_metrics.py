@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from doc81.core.metrics import MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["path"])
+    in_flight = registry.gauge("in_flight", "In flight")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    in_flight.inc()
+    in_flight.dec()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a\\"b"} 3\n'
+        "# HELP in_flight In flight\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 0\n"
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+    )
+
+
+def test_registry_rejects_bad_labels_and_duplicates():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["path"])
+
+    with pytest.raises(ValueError):
+        requests.labels("/a", "extra")
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests")
+
+
+def test_middleware_settles_in_flight_when_the_app_raises():
+    from doc81.rest.metrics import HTTP_REQUESTS_IN_FLIGHT, MetricsMiddleware
+
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    in_flight = HTTP_REQUESTS_IN_FLIGHT.labels("PATCH")
+    before = in_flight.value
+    scope = {"type": "http", "method": "PATCH", "path": "/boom"}
+    with pytest.raises(RuntimeError):
+        asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+    assert in_flight.value == before == 0
+
+
+def test_failed_statements_are_timed_and_counted():
+    from sqlalchemy import create_engine, exc, text
+
+    from doc81.core.metrics import (
+        DB_QUERY_ERRORS,
+        DB_QUERY_SECONDS,
+        instrument_sqlalchemy,
+    )
+
+    instrument_sqlalchemy()
+    engine = create_engine("sqlite://")
+    selects = DB_QUERY_SECONDS.labels("SELECT")
+    errors = DB_QUERY_ERRORS.labels("SELECT")
+    before = sum(selects.counts), errors.value
+
+    with engine.connect() as conn:
+        with pytest.raises(exc.OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        conn.execute(text("SELECT 1"))
+
+    assert sum(selects.counts) - before[0] == 2
+    assert errors.value - before[1] == 1
@@ -1,7 +1,21 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 
+from doc81.core.database import Base, get_async_db
+from doc81.core.likes import LikeCountBuffer, reconcile_like_counts
+from doc81.core.models import Template, UserProfile
 from doc81.core.schema import Doc81Template
+from doc81.core.search import init_template_search
 from doc81.rest.app import create_app
 from tests.utils import override_env
 
@@ -13,6 +27,29 @@ def client() -> TestClient:
         return TestClient(create_app())
 
 
+@pytest.fixture
+def db_client(tmp_path) -> TestClient:
+    """Client backed by a fresh SQLite database"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'doc81.db'}")
+    Base.metadata.create_all(bind=engine)
+    init_template_search(engine)
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'doc81.db'}")
+    TestingSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def _get_async_db():
+        async with TestingSessionLocal() as db:
+            yield db
+
+    with override_env(DOC81_MODE="server"):
+        app = create_app()
+    app.dependency_overrides[get_async_db] = _get_async_db
+    return TestClient(app)
+
+
 @pytest.fixture
 def mock_template():
     return Doc81Template(
@@ -258,6 +295,354 @@ class TestTemplateGenerationEndpoints:
         assert "Generation failed" in error["error"]
 
 
+class TestTemplatePaginationEndpoints:
+    """Tests for pagination, projection and filtering of list endpoints"""
+
+    def test_list_templates_pages_with_cursor(self, db_client: TestClient):
+        """Test GET /templates walks every template exactly once"""
+        for i in range(5):
+            template_data = {"name": f"Template {i}", "content": f"# {i}"}
+            assert db_client.post("/templates", json=template_data).status_code == 201
+
+        names = []
+        params = {"limit": 2}
+        while True:
+            response = db_client.get("/templates", params=params)
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            names += [template["name"] for template in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+
+        assert sorted(names) == [f"Template {i}" for i in range(5)]
+
+    def test_list_templates_fields_and_filters(self, db_client: TestClient):
+        """Test GET /templates with fields projection and tag filter"""
+        for name, tags in [("Runbook", ["ops"]), ("ADR", ["design", "ops"])]:
+            template_data = {"name": name, "content": "# Body", "tags": tags}
+            assert db_client.post("/templates", json=template_data).status_code == 201
+
+        response = db_client.get(
+            "/templates", params={"fields": "id,name", "tags": ["design"]}
+        )
+
+        assert response.status_code == 200
+        templates = response.json()
+        assert [template["name"] for template in templates] == ["ADR"]
+        assert set(templates[0]) == {"id", "name"}
+
+    def test_list_templates_unknown_field(self, db_client: TestClient):
+        """Test GET /templates with a field that does not exist"""
+        response = db_client.get("/templates", params={"fields": "name,secret"})
+
+        assert response.status_code == 400
+        assert "secret" in response.json()["detail"]["error"]
+
+    def test_list_templates_invalid_cursor(self, db_client: TestClient):
+        """Test GET /templates with a malformed cursor"""
+        response = db_client.get("/templates", params={"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
+
+
+class TestTemplateSearchEndpoints:
+    """Tests for template search endpoints"""
+
+    def test_search_templates(self, db_client: TestClient):
+        """Test GET /templates/search ranks by relevance and filters by tags"""
+        for template_data in [
+            {
+                "name": "Runbook",
+                "description": "Operational runbook for on-call engineers",
+                "tags": ["ops"],
+                "content": "# Runbook\n\nSteps to mitigate an incident.",
+            },
+            {
+                "name": "Design Doc",
+                "description": "Technical design proposal",
+                "tags": ["design"],
+                "content": "# Design\n\nMention the runbook for rollout.",
+            },
+        ]:
+            assert db_client.post("/templates", json=template_data).status_code == 201
+
+        response = db_client.get("/templates/search", params={"q": "runbook"})
+
+        assert response.status_code == 200
+        results = response.json()
+        assert [result["name"] for result in results] == ["Runbook", "Design Doc"]
+        assert "content" not in results[0]
+
+        response = db_client.get(
+            "/templates/search", params={"q": "runbook", "tags": ["design"]}
+        )
+
+        assert [result["name"] for result in response.json()] == ["Design Doc"]
+
+        design_doc_id = results[1]["id"]
+        response = db_client.patch(
+            f"/templates/{design_doc_id}", json={"content": "# Design\n\nNo rollout."}
+        )
+        assert response.status_code == 200
+
+        response = db_client.get("/templates/search", params={"q": "runbook"})
+
+        assert [result["name"] for result in response.json()] == ["Runbook"]
+
+
+def _add_users(tmp_path, count: int) -> list[str]:
+    """Insert user profiles straight into the db_client database"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'doc81.db'}")
+    users = [UserProfile(auth_user_id=uuid.uuid4()) for _ in range(count)]
+    with Session(engine) as db:
+        db.add_all(users)
+        db.commit()
+        user_ids = [str(user.auth_user_id) for user in users]
+    engine.dispose()
+    return user_ids
+
+
+class TestTemplateLikeEndpoints:
+    """Tests for liking and unliking templates"""
+
+    def test_like_and_unlike_template(self, db_client: TestClient, tmp_path):
+        """Test likes are counted once per user and can be taken back"""
+        (user_id,) = _add_users(tmp_path, 1)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+        like_url = f"/templates/{template_id}/like"
+
+        response = db_client.post(like_url, params={"user_id": user_id})
+        assert response.status_code == 200
+        assert response.json()["like_count"] == 1
+
+        response = db_client.post(like_url, params={"user_id": user_id})
+        assert response.status_code == 200
+        assert response.json()["like_count"] == 1
+
+        response = db_client.delete(like_url, params={"user_id": user_id})
+        assert response.status_code == 200
+        assert response.json()["like_count"] == 0
+
+        response = db_client.delete(like_url, params={"user_id": user_id})
+        assert response.status_code == 404
+        assert response.json()["detail"]["error"] == "User has not liked this template"
+
+    def test_like_unknown_template_or_user(self, db_client: TestClient, tmp_path):
+        """Test liking reports which of the template and the user is missing"""
+        (user_id,) = _add_users(tmp_path, 1)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+
+        response = db_client.post(
+            f"/templates/{uuid.uuid4()}/like", params={"user_id": user_id}
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"]["error"] == "Template not found"
+
+        response = db_client.post(
+            f"/templates/{template_id}/like", params={"user_id": str(uuid.uuid4())}
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"]["error"] == "User not found"
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 0
+
+    def test_concurrent_likes_keep_count_exact(self, db_client: TestClient, tmp_path):
+        """Test concurrent likes, including repeats, neither lose nor double count"""
+        user_ids = _add_users(tmp_path, 20)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+
+        async def like_all():
+            transport = httpx.ASGITransport(app=db_client.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                responses = await asyncio.gather(
+                    *(
+                        client.post(
+                            f"/templates/{template_id}/like",
+                            params={"user_id": user_id},
+                        )
+                        for user_id in user_ids * 3
+                    )
+                )
+            assert all(response.status_code == 200 for response in responses)
+
+        asyncio.run(like_all())
+
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 20
+
+
+class TestBufferedLikeCounts:
+    """Tests for write-behind like counts"""
+
+    def test_like_counts_are_written_on_flush(self, db_client: TestClient, tmp_path):
+        """Test likes are recorded at once while like_count waits for a flush"""
+        user_ids = _add_users(tmp_path, 3)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+        like_url = f"/templates/{template_id}/like"
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'doc81.db'}")
+        buffer = LikeCountBuffer(
+            async_sessionmaker(engine),
+            on_flush=db_client.app.state.response_cache.invalidate,
+        )
+        db_client.app.state.like_count_buffer = buffer
+
+        counts = [
+            db_client.post(like_url, params={"user_id": user_id}).json()["like_count"]
+            for user_id in user_ids
+        ]
+        assert counts == [1, 2, 3]
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 0
+
+        assert asyncio.run(buffer.flush()) == 1
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 3
+
+        response = db_client.delete(like_url, params={"user_id": user_ids[0]})
+        assert response.json()["like_count"] == 2
+        asyncio.run(buffer.flush())
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 2
+
+    def test_reconcile_like_counts(self, db_client: TestClient, tmp_path):
+        """Test reconciliation recomputes drifted counts from the likes"""
+        (user_id,) = _add_users(tmp_path, 1)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+        db_client.post(f"/templates/{template_id}/like", params={"user_id": user_id})
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'doc81.db'}")
+        with Session(engine) as db:
+            db.get(Template, uuid.UUID(template_id)).like_count = 7
+            db.commit()
+        engine.dispose()
+        # Cached with the drifted count
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 7
+
+        repaired = []
+
+        async def on_repair(template_ids):
+            repaired.extend(template_ids)
+            await db_client.app.state.response_cache.invalidate(template_ids)
+
+        async def reconcile():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'doc81.db'}")
+            async with async_sessionmaker(engine)() as db:
+                return await reconcile_like_counts(db, on_repair=on_repair)
+
+        assert asyncio.run(reconcile()) == 1
+        assert repaired == [uuid.UUID(template_id)]
+        assert db_client.get(f"/templates/{template_id}").json()["like_count"] == 1
+
+
+class TestTemplateBatchEndpoint:
+    """Tests for POST /templates/batch"""
+
+    def test_get_templates_batch(self, db_client: TestClient):
+        """Test results come back in request order with per-item errors"""
+        ids = [
+            db_client.post(
+                "/templates", json={"name": name, "content": f"# {name}"}
+            ).json()["id"]
+            for name in ("Runbook", "Postmortem")
+        ]
+        missing = str(uuid.uuid4())
+
+        response = db_client.post(
+            "/templates/batch", json={"refs": [ids[1], "not-an-id", missing, ids[0]]}
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [r["ref"] for r in results] == [ids[1], "not-an-id", missing, ids[0]]
+        assert results[0]["template"]["name"] == "Postmortem"
+        assert results[1]["error"] == "Invalid template ID"
+        assert results[2]["error"] == "Template not found"
+        assert results[3]["template"]["name"] == "Runbook"
+
+    def test_get_templates_batch_limits(self, db_client: TestClient):
+        """Test empty and oversized batches are rejected"""
+        assert db_client.post("/templates/batch", json={"refs": []}).status_code == 422
+        refs = [str(uuid.uuid4()) for _ in range(101)]
+        assert (
+            db_client.post("/templates/batch", json={"refs": refs}).status_code == 422
+        )
+
+
+class TestTemplateResponseCache:
+    """Tests for ETags and the template read cache"""
+
+    def test_get_template_not_modified(self, db_client: TestClient):
+        """Test If-None-Match with the current ETag gets a bodiless 304"""
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+
+        response = db_client.get(f"/templates/{template_id}")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert etag.startswith('"1-')
+
+        response = db_client.get(
+            f"/templates/{template_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        response = db_client.get(
+            f"/templates/{template_id}", headers={"If-None-Match": '"stale"'}
+        )
+        assert response.status_code == 200
+        assert response.json()["name"] == "Runbook"
+
+    def test_writes_invalidate_cached_template(self, db_client: TestClient, tmp_path):
+        """Test PATCH, like and DELETE are reflected by the next read"""
+        (user_id,) = _add_users(tmp_path, 1)
+        template_id = db_client.post(
+            "/templates", json={"name": "Runbook", "content": "# Runbook"}
+        ).json()["id"]
+        url = f"/templates/{template_id}"
+        etag = db_client.get(url).headers["etag"]
+
+        db_client.patch(url, json={"content": "# Runbook v2"})
+        response = db_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["content"] == "# Runbook v2"
+        assert response.headers["etag"].startswith('"2-')
+
+        db_client.post(f"{url}/like", params={"user_id": user_id})
+        assert db_client.get(url).json()["like_count"] == 1
+
+        db_client.delete(url)
+        assert db_client.get(url).status_code == 404
+
+    def test_list_templates_cached_until_write(self, db_client: TestClient):
+        """Test list pages get ETags and are dropped when a template is created"""
+        db_client.post("/templates", json={"name": "Runbook", "content": "# Runbook"})
+
+        response = db_client.get("/templates/", params={"limit": 1})
+        assert len(response.json()) == 1
+        etag = response.headers["etag"]
+        response = db_client.get(
+            "/templates/", params={"limit": 1}, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        db_client.post("/templates", json={"name": "Postmortem", "content": "# PM"})
+        response = db_client.get("/templates/", params={"limit": 1})
+        assert response.headers["etag"] != etag
+        assert "X-Next-Cursor" in response.headers
+
+
 class TestHealthEndpoints:
     """Tests for health endpoints"""
 
@@ -266,3 +651,352 @@ class TestHealthEndpoints:
         response = client.get("/health")
         assert response.status_code == 200
         assert response.json() == {"status": "ok"}
+
+    def test_database_pools(self, client: TestClient):
+        """Test GET /health/db reports both engines' pools"""
+        response = client.get("/health/db")
+        assert response.status_code == 200
+        pools = response.json()
+        assert set(pools) == {"engine", "async_engine"}
+        assert pools["engine"]["size"] == 5
+        assert pools["engine"]["checked_out"] == 0
+
+
+class TestMetricsEndpoint:
+    """Tests for the Prometheus metrics endpoint"""
+
+    @staticmethod
+    def _sample(db_client: TestClient, line_prefix: str) -> float:
+        response = db_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        for line in response.text.splitlines():
+            if line.startswith(line_prefix + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_requests_are_counted_per_route(self, db_client: TestClient):
+        """Test requests are labelled with their route template and status"""
+        requests = (
+            'doc81_http_requests_total{method="GET",'
+            'route="/templates/{template_id}",status="404"}'
+        )
+        queries = (
+            'doc81_http_request_db_queries_count{method="GET",'
+            'route="/templates/{template_id}"}'
+        )
+        unmatched = (
+            'doc81_http_requests_total{method="GET",route="<unmatched>",status="404"}'
+        )
+        before = [
+            self._sample(db_client, name) for name in (requests, queries, unmatched)
+        ]
+
+        for _ in range(2):
+            assert db_client.get(f"/templates/{uuid.uuid4()}").status_code == 404
+        assert db_client.get("/no-such-route").status_code == 404
+
+        after = [
+            self._sample(db_client, name) for name in (requests, queries, unmatched)
+        ]
+        assert [b - a for a, b in zip(before, after)] == [2, 2, 1]
+
+    def test_database_time_is_recorded(self, db_client: TestClient):
+        """Test SQL statements made while serving a request are attributed to it"""
+        db_client.get("/templates/")
+        response = db_client.get("/metrics")
+        sums = [
+            line
+            for line in response.text.splitlines()
+            if line.startswith(
+                'doc81_http_request_db_queries_sum{method="GET",route="/templates/"}'
+            )
+        ]
+        assert sums and float(sums[0].rsplit(" ", 1)[1]) >= 1
+        assert (
+            'doc81_db_query_duration_seconds_count{operation="SELECT"}' in response.text
+        )
+
+
+def test_engine_options_reads_pool_settings(tmp_path):
+    """Test the db_* settings reach the engine and its pool"""
+    from sqlalchemy import create_engine, text
+
+    from doc81.core.config import Config
+    from doc81.core.database import engine_options, pool_status
+
+    url = "postgresql+asyncpg://doc81@localhost/doc81"
+    with override_env(DOC81_DB_POOL_SIZE="2", DOC81_DB_STATEMENT_TIMEOUT_MS="500"):
+        options = engine_options(url, Config())
+    assert options["pool_size"] == 2
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "500"}}
+
+    with override_env(DOC81_DB_POOL_SIZE="2", DOC81_DB_MAX_OVERFLOW="1"):
+        engine = create_engine("sqlite:///", **engine_options("sqlite:///", Config()))
+    assert pool_status(engine) == {}
+
+    with override_env(DOC81_DB_POOL_SIZE="2", DOC81_DB_MAX_OVERFLOW="1"):
+        url = f"sqlite:///{tmp_path / 'doc81.db'}"
+        engine = create_engine(url, **engine_options(url, Config()))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert pool_status(engine)["checked_out"] == 1
+    status = pool_status(engine)
+    assert status["size"] == 2
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 1
+
+    def check_out():
+        for _ in range(50):
+            with engine.connect():
+                pass
+
+    threads = [threading.Thread(target=check_out) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool_status(engine)["checkouts"] == 201
+
+
+def test_memory_cache_backend_evicts_and_expires():
+    """Test the in-memory response cache is an LRU with per-entry TTL"""
+    from doc81.rest.caching import MemoryCacheBackend
+
+    async def scenario():
+        backend = MemoryCacheBackend(max_entries=2)
+        await backend.set("a", b"1", ttl=60)
+        await backend.set("b", b"2", ttl=60)
+        assert await backend.get("a") == b"1"
+        await backend.set("c", b"3", ttl=60)
+        assert await backend.get("b") is None
+        assert await backend.get("a") == b"1"
+
+        await backend.set("d", b"4", ttl=-1)
+        assert await backend.get("d") is None
+        assert len(backend) == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Answer generation requests with the fake LLM, uncached"""
+    from doc81.core.config import config
+
+    monkeypatch.setattr(config, "fake_llm", True)
+    monkeypatch.setattr(config, "fake_llm_first_token_latency", 0.2)
+    monkeypatch.setattr(config, "fake_llm_token_interval", 0.001)
+    monkeypatch.setattr(config, "generation_cache_ttl", 0)
+    return config
+
+
+def _sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestTemplateGenerationStream:
+    """Tests for non-blocking and streamed template generation"""
+
+    def test_stream_matches_generate(self, client: TestClient, fake_llm):
+        """Test the streamed deltas add up to the template POST /generate returns"""
+        generate_data = {"raw_markdown": "# Test Document\n\nThis is a test document."}
+
+        response = client.post("/templates/generate/stream", json=generate_data)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _sse_events(response.text)
+        assert events[-1] == ("done", {})
+        assert len(events) > 2
+        streamed = "".join(data["text"] for event, data in events if event == "delta")
+
+        response = client.post("/templates/generate", json=generate_data)
+        assert response.status_code == 200
+        assert response.json() == streamed
+        assert "{{" in streamed and streamed.endswith("\n")
+
+    def test_generation_does_not_block_other_routes(self, fake_llm):
+        """Test other requests are served while a generation waits on the LLM"""
+        app = create_app()
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                start = time.perf_counter()
+
+                async def health():
+                    await asyncio.sleep(0.02)
+                    response = await client.get("/health")
+                    return response, time.perf_counter() - start
+
+                generated, (health_response, health_elapsed) = await asyncio.gather(
+                    client.post("/templates/generate", json={"raw_markdown": "# Doc"}),
+                    health(),
+                )
+            assert generated.status_code == 200
+            assert health_response.status_code == 200
+            assert health_elapsed < fake_llm.fake_llm_first_token_latency
+
+        asyncio.run(scenario())
+
+    def test_client_disconnect_stops_generation(self, fake_llm, monkeypatch):
+        """Test a client that goes away cancels the generation before it finishes"""
+        from doc81.service.generate_template import PROMPT_HASH
+        from doc81.service.generation_cache import (
+            generation_cache_key,
+            get_generation_cache,
+        )
+
+        monkeypatch.setattr(fake_llm, "fake_llm_first_token_latency", 0.01)
+        monkeypatch.setattr(fake_llm, "fake_llm_token_interval", 0.2)
+        monkeypatch.setattr(fake_llm, "generation_cache_ttl", 60)
+        raw_markdown = f"# Disconnect {uuid.uuid4()}\n\n" + "A sentence. " * 20
+        app = create_app()
+
+        async def scenario():
+            first_body = asyncio.Event()
+            messages = []
+            body = json.dumps({"raw_markdown": raw_markdown}).encode()
+            requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                await first_body.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+                if message["type"] == "http.response.body" and message["body"]:
+                    first_body.set()
+
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "POST",
+                "scheme": "http",
+                "path": "/templates/generate/stream",
+                "raw_path": b"/templates/generate/stream",
+                "query_string": b"",
+                "root_path": "",
+                "headers": [(b"content-type", b"application/json")],
+                "client": ("test", 1),
+                "server": ("test", 80),
+            }
+            start = time.perf_counter()
+            await app(scope, receive, send)
+            return messages, time.perf_counter() - start
+
+        messages, elapsed = asyncio.run(scenario())
+        bodies = [m["body"] for m in messages if m["type"] == "http.response.body"]
+        assert b"event: done" not in b"".join(bodies)
+        assert elapsed < 0.5
+        key = generation_cache_key("fake/openai/gpt-4o-mini", PROMPT_HASH, raw_markdown)
+        assert get_generation_cache(fake_llm).get(key) is None
+
+    def test_full_generation_queue_answers_429(self, fake_llm, monkeypatch):
+        """Test generations beyond the model's slots and queue are turned away"""
+        monkeypatch.setattr(fake_llm, "generation_max_concurrency", 1)
+        monkeypatch.setattr(fake_llm, "generation_max_queue", 1)
+        app = create_app()
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await asyncio.gather(
+                    *(
+                        client.post(
+                            "/templates/generate", json={"raw_markdown": f"# Doc {i}"}
+                        )
+                        for i in range(3)
+                    ),
+                    # Identical to a running generation, so it follows that one
+                    client.post(
+                        "/templates/generate", json={"raw_markdown": "# Doc 0"}
+                    ),
+                )
+
+        responses = asyncio.run(scenario())
+        assert sorted(r.status_code for r in responses) == [200, 200, 200, 429]
+        rejected = next(r for r in responses if r.status_code == 429)
+        assert int(rejected.headers["Retry-After"]) >= 1
+        assert "Too many generations" in rejected.json()["detail"]["error"]
+
+    def test_hybrid_stream_sends_draft_first(self, client: TestClient, fake_llm):
+        """Test hybrid mode streams the structural draft, then rewritten sections"""
+        raw_markdown = (
+            "# Handoff\n\nIntro text here.\n\n"
+            "## Deploy\n\nMerges to `main` deploy to **Vercel**.\n"
+        )
+        response = client.post(
+            "/templates/generate/stream",
+            json={"raw_markdown": raw_markdown, "mode": "hybrid"},
+        )
+        assert response.status_code == 200
+        events = _sse_events(response.text)
+        assert [event for event, _ in events] == ["draft", "section", "done"]
+
+        sections = events[0][1]["sections"]
+        assert sections[0] == {
+            "template": "# Handoff\n\n[Paragraph 1]\n",
+            "confidence": 1.0,
+        }
+        assert sections[1]["confidence"] < 0.8
+        assert events[1][1]["index"] == 1
+
+
+class TestGenerationJobs:
+    def test_job_streams_progress_and_returns_results(self, tmp_path):
+        """Test a submitted batch reports progress until every document has a template"""
+        with override_env(
+            DOC81_FAKE_LLM="true",
+            DOC81_FAKE_LLM_FIRST_TOKEN_LATENCY="0",
+            DOC81_FAKE_LLM_TOKEN_INTERVAL="0",
+            DOC81_GENERATION_CACHE_TTL="0",
+            DOC81_GENERATION_JOBS_PATH=str(tmp_path / "jobs.db"),
+        ):
+            app = create_app()
+        # Nothing runs or is written until the job API is used
+        assert not (tmp_path / "jobs.db").exists()
+        documents = [f"# Doc {i}\n\nSome text." for i in range(5)]
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                created = await client.post(
+                    "/templates/generate/jobs/", json={"documents": documents}
+                )
+                job_id = created.json()["id"]
+                events = await client.get(f"/templates/generate/jobs/{job_id}/events")
+                results = await client.get(f"/templates/generate/jobs/{job_id}/results")
+                missing = await client.get(f"/templates/generate/jobs/{uuid.uuid4()}")
+            await app.state.generation_jobs.stop()
+            return created, events, results, missing
+
+        created, events, results, missing = asyncio.run(scenario())
+        assert created.status_code == 202
+        assert created.json()["total"] == 5
+
+        events = _sse_events(events.text)
+        assert events[-1] == ("done", {})
+        progress = [data for event, data in events if event == "progress"]
+        assert progress[-1]["status"] == "done"
+        assert progress[-1]["done"] == 5
+
+        items = results.json()["items"]
+        assert [item["index"] for item in items] == list(range(5))
+        assert all(item["template"].startswith("# Doc") for item in items)
+
+        assert missing.status_code == 404
+        assert missing.json()["detail"] == {"error": "Job not found"}
@@ -1,4 +1,10 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
@@ -6,6 +12,10 @@ from doc81.core.config import Config
 from doc81.core.exception import Doc81NotAllowedError, Doc81ServiceException
 from doc81.service.get_template import get_template
 from doc81.service.list_templates import list_templates
+from doc81.service.search_templates import search_templates
+from doc81.service import template_index
+from doc81.service.template_index import TemplateIndex, TemplateIndexSnapshot
+from doc81.service.template_watcher import TemplateIndexWatcher
 from tests.utils import override_env
 
 
@@ -64,3 +74,775 @@ def test_get_template_from_path_raise_error_if_description_are_not_in_frontmatte
             )
 
         assert "Template description is required" in str(e.value)
+
+
+def _write_template(path: Path, name: str, description: str = "A template") -> None:
+    path.write_text(f"---\nname: {name}\ndescription: {description}\n---\n# {name}\n")
+
+
+def test_template_index_reparses_only_changed_files(tmp_path, monkeypatch):
+    _write_template(tmp_path / "a.md", "A")
+    _write_template(tmp_path / "b.md", "B")
+    index = TemplateIndex(tmp_path)
+
+    parsed = []
+    original_parse_entry = template_index._parse_entry
+
+    def _spy(ppath, stat):
+        parsed.append(ppath.name)
+        return original_parse_entry(ppath, stat)
+
+    monkeypatch.setattr(template_index, "_parse_entry", _spy)
+
+    assert index.list_paths() == [str(tmp_path / "a.md"), str(tmp_path / "b.md")]
+    assert index.get("a.md").name == "A"
+    assert index.get("a.md").name == "A"
+    assert parsed == ["a.md"]
+
+    _write_template(tmp_path / "a.md", "A2", description="Changed size")
+    assert index.get("a.md").name == "A2"
+    assert parsed == ["a.md", "a.md"]
+
+    (tmp_path / "b.md").unlink()
+    assert index.list_paths() == [str(tmp_path / "a.md")]
+    with pytest.raises(Doc81ServiceException):
+        index.get("b.md")
+
+
+def test_template_index_walks_only_when_directories_change(tmp_path, monkeypatch):
+    _write_template(tmp_path / "a.md", "A")
+    (tmp_path / "sub").mkdir()
+    index = TemplateIndex(tmp_path)
+
+    walks = []
+    original_walk = template_index.os.walk
+
+    def _spy(top, *args, **kwargs):
+        walks.append(top)
+        return original_walk(top, *args, **kwargs)
+
+    monkeypatch.setattr(template_index.os, "walk", _spy)
+
+    for _ in range(3):
+        assert index.list_paths() == [str(tmp_path / "a.md")]
+    assert len(walks) == 1
+
+    # Editing a file leaves its directory alone
+    _write_template(tmp_path / "a.md", "A2", description="Changed size")
+    assert index.get("a.md").name == "A2"
+    index.list_paths()
+    assert len(walks) == 1
+
+    _write_template(tmp_path / "sub" / "b.md", "B")
+    assert index.list_paths() == [
+        str(tmp_path / "a.md"),
+        str(tmp_path / "sub" / "b.md"),
+    ]
+    assert len(walks) == 2
+
+
+@pytest.mark.parametrize("force_polling", [True, False])
+def test_template_watcher_applies_changes_to_index(tmp_path, force_polling):
+    _write_template(tmp_path / "a.md", "A")
+    index = TemplateIndex(tmp_path)
+    watcher = TemplateIndexWatcher(
+        index, poll_interval=0.05, force_polling=force_polling
+    )
+    watcher.start()
+    try:
+        assert index.watched
+        assert index.get("a.md").name == "A"
+
+        _write_template(tmp_path / "b.md", "B")
+        _write_template(tmp_path / "a.md", "A2", description="Changed size")
+        _wait_for(lambda: len(index.list_paths()) == 2)
+        _wait_for(lambda: index.get("a.md").name == "A2")
+
+        (tmp_path / "b.md").unlink()
+        _wait_for(lambda: index.list_paths() == [str(tmp_path / "a.md")])
+    finally:
+        watcher.stop()
+
+    assert not index.watched
+
+
+@pytest.mark.parametrize("force_polling", [True, False])
+def test_template_watcher_sees_changes_made_while_starting(
+    tmp_path, monkeypatch, force_polling
+):
+    _write_template(tmp_path / "a.md", "A")
+    index = TemplateIndex(tmp_path)
+    refresh = index.refresh
+
+    def refresh_then_write():
+        refresh()
+        # Lands right after the watcher indexed the directory
+        _write_template(tmp_path / "b.md", "B")
+
+    monkeypatch.setattr(index, "refresh", refresh_then_write)
+    watcher = TemplateIndexWatcher(
+        index, poll_interval=0.05, force_polling=force_polling
+    )
+    watcher.start()
+    try:
+        _wait_for(lambda: len(index.list_paths()) == 2)
+        assert index.get("b.md").name == "B"
+    finally:
+        watcher.stop()
+
+
+def test_template_watcher_that_dies_stops_trusting_the_index(tmp_path, monkeypatch):
+    _write_template(tmp_path / "a.md", "A")
+    index = TemplateIndex(tmp_path)
+
+    def apply_changes(changes):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(index, "apply_changes", apply_changes)
+    watcher = TemplateIndexWatcher(index, poll_interval=0.05, force_polling=True)
+    watcher.start()
+    try:
+        assert index.watched
+        _write_template(tmp_path / "b.md", "B")
+        _wait_for(lambda: not index.watched)
+        assert len(index.list_paths()) == 2
+    finally:
+        watcher.stop()
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the index"
+        time.sleep(0.05)
+
+
+def test_template_index_snapshot_reparses_only_stale_entries(tmp_path, monkeypatch):
+    _write_template(tmp_path / "a.md", "A")
+    _write_template(tmp_path / "b.md", "B")
+    cache_path = tmp_path / ".doc81-index.json"
+
+    index = TemplateIndex(tmp_path)
+    index.refresh()
+    index.parse_all()
+    index.save(cache_path)
+    assert cache_path.exists()
+
+    _write_template(tmp_path / "b.md", "B2", description="Changed size")
+
+    parsed = []
+    original_parse_entry = template_index._parse_entry
+
+    def _spy(ppath, stat):
+        parsed.append(ppath.name)
+        return original_parse_entry(ppath, stat)
+
+    monkeypatch.setattr(template_index, "_parse_entry", _spy)
+
+    warm_index = TemplateIndex(tmp_path)
+    warm_index.load(cache_path)
+    warm_index.refresh()
+    warm_index.parse_all()
+    assert parsed == ["b.md"]
+    assert warm_index.get("a.md").name == "A"
+    assert warm_index.get("b.md").name == "B2"
+
+    warm_index.save(cache_path)
+    snapshot = TemplateIndexSnapshot.model_validate_json(cache_path.read_text())
+    assert snapshot.entries["b.md"].name == "B2"
+
+
+def test_search_templates_in_local_mode(tmp_path):
+    (tmp_path / "runbook.md").write_text(
+        "---\nname: Runbook\ndescription: Incident response steps\ntags: [ops]\n---\n"
+        "# Runbook\n\nHow to roll back a deployment.\n"
+    )
+    (tmp_path / "adr.md").write_text(
+        "---\nname: ADR\ndescription: Architecture decision record\ntags: [design]\n---\n"
+        "# Decision\n\nWhy we chose to roll back to the old queue.\n"
+    )
+    (tmp_path / "broken.md").write_text("# No frontmatter, roll back\n")
+
+    with override_env(DOC81_MODE="local", DOC81_PROMPT_DIR=str(tmp_path)):
+        config = Config()
+        results = search_templates("roll back runbook", config=config)
+        assert [result["name"] for result in results] == ["Runbook", "ADR"]
+        assert results[0]["score"] > results[1]["score"]
+
+        assert [
+            result["name"] for result in search_templates("", ["design"], config=config)
+        ] == ["ADR"]
+
+        (tmp_path / "adr.md").unlink()
+        assert [
+            result["name"] for result in search_templates("roll", config=config)
+        ] == ["Runbook"]
+
+
+@pytest.fixture
+def template_server():
+    """A stand-in doc81 server with one template, answering after `delay` seconds"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    template_id = str(uuid.uuid4())
+    body = json.dumps(
+        {
+            "id": template_id,
+            "name": "Runbook",
+            "content": "# Runbook",
+            "tags": [],
+            "like_count": 0,
+            "version": 1,
+            "created_at": "2025-01-01T00:00:00Z",
+            "updated_at": "2025-01-01T00:00:00Z",
+        }
+    ).encode()
+    state = SimpleNamespace(template_id=template_id, seen=[], delay=0.0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            state.seen.append((self.path, self.headers.get("If-None-Match")))
+            time.sleep(state.delay)
+            if not self.path.endswith(template_id):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def do_POST(self):
+            refs = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state.seen.append((self.path, refs["refs"]))
+            results = [
+                {"ref": ref, "template": json.loads(body)}
+                if ref == template_id
+                else {"ref": ref, "error": "Template not found"}
+                for ref in refs["refs"]
+            ]
+            payload = json.dumps({"results": results}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state.url = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_client_revalidates_cached_templates(template_server):
+    """Templates are reused while fresh, then revalidated with If-None-Match"""
+    from doc81.service.server_client import ServerClient
+
+    template_id = template_server.template_id
+    client = ServerClient(template_server.url, cache_ttl=60)
+    assert client.get_template(template_id).name == "Runbook"
+    assert client.get_template(template_id).name == "Runbook"
+    assert len(template_server.seen) == 1
+
+    client.cache.ttl = 0
+    client.cache.clear()
+    client.get_template(template_id)
+    assert client.get_template(template_id).name == "Runbook"
+    assert template_server.seen[-1] == (f"/templates/{template_id}", '"v1"')
+
+    with pytest.raises(Doc81ServiceException, match="Template not found"):
+        client.get_template("missing")
+
+
+def test_get_template_async_runs_concurrently(template_server):
+    """N concurrent server-mode lookups take about as long as one"""
+    from doc81.service import get_template_async
+
+    template_server.delay = 0.3
+    config = Config(mode="server", server_url=template_server.url, server_cache_ttl=0)
+
+    async def lookups(n: int) -> float:
+        start = time.perf_counter()
+        templates = await asyncio.gather(
+            *(get_template_async(template_server.template_id, config) for _ in range(n))
+        )
+        assert all(t["name"] == "Runbook" for t in templates)
+        return time.perf_counter() - start
+
+    async def scenario():
+        one = await lookups(1)
+        many = await lookups(8)
+        return one, many
+
+    one, many = asyncio.run(scenario())
+    assert many < one * 2
+    assert len(template_server.seen) == 9
+
+
+def test_get_templates_returns_partial_results(template_server):
+    """Batch lookups report a missing template without failing the rest"""
+    from doc81.service import get_templates, get_templates_async
+
+    runbook = str(Path(__file__).parent / "data/pass/runbook.template.md")
+    with override_env(DOC81_MODE="local", DOC81_PROMPT_DIR=str(Path(__file__).parent)):
+        config = Config()
+    results = asyncio.run(get_templates_async([runbook, "missing.md"], config))
+    assert [r["ref"] for r in results] == [runbook, "missing.md"]
+    assert results[0]["template"]["path"] == runbook
+    assert results[1]["template"] is None
+    assert "Template not found" in results[1]["error"]
+
+    config = Config(mode="server", server_url=template_server.url)
+    refs = [template_server.template_id, "missing"]
+    results = get_templates(refs, config)
+    assert [r["template"] is not None for r in results] == [True, False]
+    assert results[1]["error"] == "Template not found"
+
+    # The found template is now cached; only the missing one is asked for again
+    get_templates(refs, config)
+    assert template_server.seen[-1] == ("/templates/batch", ["missing"])
+
+
+def test_generation_cache_tiers_and_ttl(tmp_path):
+    """Results survive in the SQLite tier and expire after the TTL"""
+    from doc81.service.generation_cache import GenerationCache, generation_cache_key
+
+    key = generation_cache_key("openai/gpt-4o-mini", "prompt-hash", "# Doc")
+    assert key != generation_cache_key("openai/gpt-4o", "prompt-hash", "# Doc")
+
+    cache = GenerationCache(max_entries=1, ttl=60, db_path=tmp_path / "gen.db")
+    cache.put(key, "# {{title}}\n")
+    cache.put("other", "# Other\n")
+    assert len(cache) == 1
+
+    # Evicted from memory, served from SQLite, even by a fresh process
+    restarted = GenerationCache(max_entries=1, ttl=60, db_path=tmp_path / "gen.db")
+    assert restarted.get(key) == "# {{title}}\n"
+    assert len(restarted) == 1
+
+    expired = GenerationCache(max_entries=8, ttl=-1, db_path=tmp_path / "expired.db")
+    expired.put(key, "# {{title}}\n")
+    assert expired.get(key) is None
+
+
+def test_generation_cache_async_tier_prunes_in_batches(tmp_path):
+    """The async API reaches SQLite off the event loop and prunes every N writes"""
+    import sqlite3
+
+    from doc81.service.generation_cache import GenerationCache
+
+    db_path = tmp_path / "gen.db"
+    cache = GenerationCache(
+        max_entries=0, ttl=60, db_path=db_path, max_db_entries=2, prune_every=4
+    )
+
+    def rows() -> int:
+        with sqlite3.connect(db_path) as db:
+            return db.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    async def scenario():
+        for i in range(3):
+            await cache.put_async(f"key-{i}", f"# Doc {i}\n")
+        assert rows() == 3
+        assert await cache.get_async("key-0") == "# Doc 0\n"
+        await cache.put_async("key-3", "# Doc 3\n")
+
+    asyncio.run(scenario())
+    assert rows() == 2
+
+
+def test_generate_template_serves_cached_result():
+    """A cached generation is returned without calling the LLM"""
+    from doc81.service.generate_template import PROMPT_HASH, generate_template
+    from doc81.service.generation_cache import (
+        generation_cache_key,
+        get_generation_cache,
+    )
+
+    config = Config(generation_cache_max_entries=8)
+    key = generation_cache_key("openai/gpt-4o", PROMPT_HASH, "# Cached doc")
+    get_generation_cache(config).put(key, "# {{title}}\n")
+
+    assert generate_template("# Cached doc", model="openai/gpt-4o", config=config) == (
+        "# {{title}}\n"
+    )
+
+
+@pytest.fixture
+def fake_llm_config() -> Config:
+    """A config that generates with the instant fake LLM and caches nothing"""
+    return Config(
+        fake_llm=True,
+        fake_llm_first_token_latency=0,
+        fake_llm_token_interval=0,
+        generation_cache_ttl=0,
+    )
+
+
+def test_generate_template_answers_with_fake_llm(fake_llm_config):
+    """The sync path honours fake_llm, like the async one"""
+    from doc81.service.generate_template import (
+        generate_template,
+        generate_template_async,
+    )
+    from doc81.service.templatify import templatify
+
+    expected = templatify(HANDOFF, token_style="curly")
+    assert generate_template(HANDOFF, config=fake_llm_config) == expected
+    assert (
+        asyncio.run(generate_template_async(HANDOFF, config=fake_llm_config))
+        == expected
+    )
+
+
+def test_generation_scheduler_coalesces_and_bounds():
+    """Identical generations share one call; a model runs at most max_concurrency"""
+    from doc81.core.exception import Doc81BusyException
+    from doc81.service.generation_scheduler import GenerationScheduler
+
+    calls, running, peak = [], {"m": 0, "other": 0}, {"m": 0, "other": 0}
+
+    def upstream(name: str, model: str = "m"):
+        async def generate():
+            calls.append(name)
+            running[model] += 1
+            peak[model] = max(peak[model], running[model])
+            try:
+                for part in ("# ", name, "\n"):
+                    await asyncio.sleep(0.02)
+                    yield part
+            finally:
+                running[model] -= 1
+
+        return generate
+
+    async def collect(stream) -> str:
+        return "".join([part async for part in stream])
+
+    async def scenario():
+        scheduler = GenerationScheduler(max_concurrency=2, max_queue=2)
+        same = [scheduler.stream("same", "m", upstream("same")) for _ in range(3)]
+        assert await asyncio.gather(*map(collect, same)) == ["# same\n"] * 3
+        assert calls == ["same"]
+
+        streams = [scheduler.stream(f"k{i}", "m", upstream(f"k{i}")) for i in range(4)]
+        with pytest.raises(Doc81BusyException) as e:
+            scheduler.stream("k4", "m", upstream("k4"))
+        assert e.value.retry_after >= 1
+        streams.append(scheduler.stream("k4", "other", upstream("k4", "other")))
+
+        await asyncio.gather(*map(collect, streams))
+        assert peak == {"m": 2, "other": 1}
+
+    asyncio.run(scenario())
+
+
+def test_generation_scheduler_cancels_when_followers_leave():
+    """The upstream call is closed once nobody follows the generation"""
+    from doc81.service.generation_scheduler import GenerationScheduler
+
+    async def scenario():
+        upstream_closed = asyncio.Event()
+
+        async def generate():
+            try:
+                while True:
+                    await asyncio.sleep(0.01)
+                    yield "."
+            finally:
+                upstream_closed.set()
+
+        scheduler = GenerationScheduler(max_concurrency=1, max_queue=0)
+        first = scheduler.stream("key", "m", generate)
+        second = scheduler.stream("key", "m", generate)
+        assert await anext(first) == "."
+        assert await anext(second) == "."
+        await first.aclose()
+        assert await anext(second) == "."
+        await second.aclose()
+        await asyncio.wait_for(upstream_closed.wait(), 1)
+
+        # The slot is free again for a new generation of the same input
+        restarted = scheduler.stream("key", "m", generate)
+        assert await anext(restarted) == "."
+        await restarted.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_generation_scheduler_keeps_followers_that_have_not_started():
+    """A joined request that has not read yet keeps the generation alive"""
+    from doc81.service.generation_scheduler import GenerationScheduler
+
+    async def scenario():
+        async def generate():
+            for part in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield part
+
+        scheduler = GenerationScheduler(max_concurrency=1, max_queue=0)
+        first = scheduler.stream("key", "m", generate)
+        second = scheduler.stream("key", "m", generate)
+        assert await anext(first) == "a"
+        await first.aclose()
+        return "".join([part async for part in second])
+
+    assert asyncio.run(scenario()) == "abc"
+
+
+def test_generation_scheduler_raises_a_fresh_error_per_follower():
+    from doc81.service.generation_scheduler import GenerationScheduler
+
+    async def scenario():
+        async def generate():
+            await asyncio.sleep(0.01)
+            raise Doc81ServiceException("Generation failed: boom")
+            yield
+
+        scheduler = GenerationScheduler(max_concurrency=1, max_queue=0)
+        errors = []
+        for stream in [scheduler.stream("key", "m", generate) for _ in range(2)]:
+            with pytest.raises(Doc81ServiceException) as error:
+                async for _ in stream:
+                    pass
+            errors.append(error.value)
+        return errors
+
+    first, second = asyncio.run(scenario())
+    assert first is not second
+    assert first.__cause__ is second.__cause__
+    assert str(first) == "Generation failed: boom"
+
+
+HANDOFF = """# Handoff
+
+Intro text here.
+
+## Deploy
+
+Merges to `main` deploy to **Vercel** through GitHub Actions.
+
+- Ping the on-call engineer
+- Watch the dashboards
+"""
+
+
+def test_draft_template_scores_sections():
+    """Sections whose prose templatify keeps verbatim score low"""
+    from doc81.service.hybrid_generation import draft_template, join_sections
+
+    intro, deploy = draft_template(HANDOFF)
+    assert intro.template == "# Handoff\n\n[Paragraph 1]\n"
+    assert intro.confidence == 1.0
+    # Token numbering carries over between sections
+    assert "[Item 1]" in deploy.template
+    assert deploy.confidence < 0.5
+
+    assert join_sections([intro.template, deploy.template]).startswith(
+        "# Handoff\n\n[Paragraph 1]\n\n## Deploy\n"
+    )
+
+
+def test_hybrid_generation_sends_only_low_confidence_sections(
+    monkeypatch, fake_llm_config
+):
+    """Hybrid mode asks the LLM about the sections templatify handles poorly"""
+    from doc81.service import fake_llm
+    from doc81.service.generate_template import generate_template_async
+
+    sent = []
+    stream_completion = fake_llm.stream_completion
+
+    def recording(raw_markdown: str, **kwargs):
+        sent.append(raw_markdown)
+        return stream_completion(raw_markdown, **kwargs)
+
+    monkeypatch.setattr(fake_llm, "stream_completion", recording)
+
+    structural = asyncio.run(
+        generate_template_async(HANDOFF, mode="structural", config=fake_llm_config)
+    )
+    assert sent == []
+    assert "Merges to `main`" in structural
+
+    hybrid = asyncio.run(
+        generate_template_async(HANDOFF, mode="hybrid", config=fake_llm_config)
+    )
+    assert sent == [HANDOFF[HANDOFF.index("## Deploy") :]]
+    assert hybrid.startswith("# Handoff\n\n[Paragraph 1]\n\n## Deploy\n")
+
+
+def test_generation_job_queue_retries_and_persists(
+    tmp_path, monkeypatch, fake_llm_config
+):
+    """Job documents are retried until they succeed or run out of attempts"""
+    from doc81.service import fake_llm
+    from doc81.service.generation_jobs import GenerationJobQueue
+
+    calls = []
+    stream_completion = fake_llm.stream_completion
+
+    async def flaky(raw_markdown: str, **kwargs):
+        calls.append(raw_markdown)
+        # Broken always fails, Flaky only the first time
+        if raw_markdown.startswith("# Broken") or calls == ["# Flaky\n\nSome text."]:
+            raise RuntimeError("provider hiccup")
+        async for delta in stream_completion(raw_markdown, **kwargs):
+            yield delta
+
+    monkeypatch.setattr(fake_llm, "stream_completion", flaky)
+    documents = ["# Flaky\n\nSome text.", HANDOFF, "# Broken\n\nMore text."]
+
+    def make_queue() -> GenerationJobQueue:
+        return GenerationJobQueue(
+            tmp_path / "jobs.db",
+            workers=2,
+            max_attempts=2,
+            retry_backoff=0,
+            config=fake_llm_config,
+        )
+
+    async def scenario():
+        queue = make_queue()
+        job = await queue.submit(documents)
+        assert job.total == 3
+
+        while (job := await queue.get(job.id)).status != "done":
+            await queue.wait_for_progress(1)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert (job.total, job.done, job.failed) == (3, 2, 1)
+
+    # Results are read back from the file by a queue that never ran the job
+    items = asyncio.run(make_queue().results(job.id))
+    assert [(item.status, item.attempts) for item in items] == [
+        ("done", 2),
+        ("done", 1),
+        ("failed", 2),
+    ]
+    assert items[1].template.startswith("# Handoff")
+    assert items[2].template is None
+    assert "provider hiccup" in items[2].error
+
+
+def test_generation_job_workers_survive_idling(tmp_path, monkeypatch, fake_llm_config):
+    """Workers that found nothing to do keep polling and take later jobs"""
+    from doc81.service import generation_jobs
+    from doc81.service.generation_jobs import GenerationJobQueue
+
+    monkeypatch.setattr(generation_jobs, "POLL_INTERVAL", 0.05)
+    queue = GenerationJobQueue(tmp_path / "jobs.db", workers=2, config=fake_llm_config)
+
+    async def scenario():
+        await queue.start()
+        await asyncio.sleep(0.2)
+        assert not any(task.done() for task in queue._tasks)
+
+        job = await queue.submit(["# Late\n\nSome text."])
+        while (job := await queue.get(job.id)).status != "done":
+            await queue.wait_for_progress(0.1)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.done == 1
+
+
+def test_generation_job_leases_are_taken_over_only_when_expired(
+    tmp_path, monkeypatch, fake_llm_config
+):
+    """A sibling process leaves a live claim alone and takes over an expired one"""
+    from doc81.service import generation_jobs
+    from doc81.service.generation_jobs import GenerationJobQueue
+
+    monkeypatch.setattr(generation_jobs, "POLL_INTERVAL", 0.05)
+    crashed = GenerationJobQueue(
+        tmp_path / "jobs.db", lease=0.5, config=fake_llm_config
+    )
+    sibling = GenerationJobQueue(
+        tmp_path / "jobs.db", workers=1, lease=0.5, config=fake_llm_config
+    )
+
+    async def scenario():
+        job_id = crashed._insert(["# Doc\n\nSome text."], "openai/gpt-4o-mini", "llm")
+        # Claim it but never finish, like a process that died mid-generation
+        assert crashed._claim() is not None
+
+        job = await sibling.get(job_id)
+        assert job.running == 1
+        await asyncio.sleep(0.2)
+        assert (await sibling.get(job.id)).running == 1
+
+        while (job := await sibling.get(job.id)).status != "done":
+            await sibling.wait_for_progress(0.1)
+        await sibling.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    items = asyncio.run(sibling.results(job.id))
+    assert (items[0].status, items[0].attempts) == ("done", 2)
+
+
+def test_generation_job_leases_expiring_on_the_last_attempt_fail(
+    tmp_path, monkeypatch, fake_llm_config
+):
+    """A document that took its worker down on every attempt is not run again"""
+    from doc81.service import generation_jobs
+    from doc81.service.generation_jobs import GenerationJobQueue
+
+    monkeypatch.setattr(generation_jobs, "POLL_INTERVAL", 0.05)
+    crashed = GenerationJobQueue(
+        tmp_path / "jobs.db", max_attempts=1, lease=0.2, config=fake_llm_config
+    )
+    sibling = GenerationJobQueue(
+        tmp_path / "jobs.db", workers=1, max_attempts=1, config=fake_llm_config
+    )
+
+    async def scenario():
+        job_id = crashed._insert(["# Doc\n\nSome text."], "openai/gpt-4o-mini", "llm")
+        assert crashed._claim() is not None
+
+        while (job := await sibling.get(job_id)).status != "done":
+            await sibling.wait_for_progress(0.1)
+        await sibling.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert (job.done, job.failed) == (0, 1)
+    items = asyncio.run(sibling.results(job.id))
+    assert (items[0].status, items[0].attempts) == ("failed", 1)
+    assert items[0].error == "Lease expired after 1 attempts"
+
+
+def test_generation_jobs_path_defaults_next_to_the_database(tmp_path):
+    """Without a jobs path the queue sits beside a SQLite database, or is off"""
+    from doc81.service.generation_jobs import get_generation_job_queue
+
+    queue = get_generation_job_queue(
+        Config(database_url=f"sqlite:///{tmp_path / 'data' / 'doc81.db'}")
+    )
+    assert queue.db_path == tmp_path / "data" / "doc81-jobs.db"
+
+    config = Config(database_url="postgresql://localhost/doc81")
+    assert get_generation_job_queue(config) is None
+    config = Config(
+        database_url="postgresql://localhost/doc81",
+        generation_jobs_path=tmp_path / "jobs.db",
+    )
+    assert get_generation_job_queue(config).db_path == tmp_path / "jobs.db"